@@ -1,5 +1,6 @@
 import digitalio
 import board
+import json
 import time
 import adafruit_ssd1306
 import adafruit_bme680
@@ -8,28 +9,99 @@ import adafruit_sdcard
 import storage
 import busio
 import gfx  # graphics and shape rendering module
+import warm_boot  # persisted driver state and boot timing
+import block_cache  # keeps the FAT and directory sectors off the SPI bus
 from digitalio import DigitalInOut
+from adafruit_bus_device.spi_bus import SPIBus
+
+boot_profiler = warm_boot.BootProfiler()
+# Calibration and card parameters saved by the previous boot, if any
+boot_state = warm_boot.load()
+
+# Log the raw BME680 ADC words instead of compensated values. plot_logged_data.py
+# compensates them on the host with the calibration written at the top of the log.
+RAW_LOGGING = False
+
+# Pin wired to the INT output of an LTR-303 light sensor, or None for the LTR-329 fitted
+# on Kairos V1. With it, light is only read when the level leaves a window around the
+# last reading, or every LIGHT_HEARTBEAT seconds.
+LIGHT_INT_PIN = None
+LIGHT_HEARTBEAT = 60
+
+# Time each SPI device's use of the bus, printed with the boot report
+SPI_OCCUPANCY = False
+
+# Reliability option: check a CRC16 on every SD card block, so corruption at high SPI
+# clocks is retried instead of logged. Off by default, as it costs a few milliseconds
+# per block; turn it on for long cable runs or cards that log corrupt data.
+SD_CRC = False
+
+# Profile every bus transaction per driver method, dumped to the console and to
+# /sd/bus_profile.txt every BUS_PROFILE_EVERY samples. Costs nothing when False.
+BUS_PROFILE = False
+BUS_PROFILE_EVERY = 100
+if BUS_PROFILE:
+    import bus_profiler
+
+    profiler = bus_profiler.BusProfiler()
+    profiler.install()
 
 # Initialize I2C, SPI, and sensors
 i2c = busio.I2C(scl=board.PA13, sda=board.PA12)
-light_sensor = adafruit_ltr329_ltr303.LTR329(i2c)
+if LIGHT_INT_PIN is None:
+    light_sensor = adafruit_ltr329_ltr303.LTR329(i2c)
+    light_int = None
+else:
+    light_sensor = adafruit_ltr329_ltr303.LTR303(i2c)
+    light_sensor.int_persistence = 2  # ignore single-integration flickers
+    light_sensor.enable_int = True
+    # INT is open drain and active low, and stays low until the status is read, so
+    # checking its level once per loop does not miss an event
+    light_int = DigitalInOut(LIGHT_INT_PIN)
+    light_int.switch_to_input(pull=digitalio.Pull.UP)
+light = None
+light_read_at = 0
+# The threshold window is armed around a sample taken with the current light settings
+light_armed = False
+light_unsettled = None
+boot_profiler.mark("ltr329")
 
-spi = busio.SPI(board.PA17, MOSI=board.PB23, MISO=board.PB22)  # init the SPI bus
+# init the SPI bus, shared so it is only reconfigured when the next device needs it
+spi = SPIBus(busio.SPI(board.PA17, MOSI=board.PB23, MISO=board.PB22), track_occupancy=SPI_OCCUPANCY)
 reset_pin = DigitalInOut(board.PA19)
 cs_pin = DigitalInOut(board.PA16)
 dc_pin = DigitalInOut(board.PA18)
 oled = adafruit_ssd1306.SSD1306_SPI(128, 64, spi, dc_pin, reset_pin, cs_pin)  # 128 x 64 pixel SSD1306 display
 
 graphics = gfx.GFX(128, 64, oled.pixel)  # initiate gfx class
+boot_profiler.mark("ssd1306")
 
 AQI_cs_pin = DigitalInOut(board.PA22)
-AQI_sensor = adafruit_bme680.Adafruit_BME680_SPI(spi, AQI_cs_pin)
+AQI_sensor = adafruit_bme680.Adafruit_BME680_SPI(spi, AQI_cs_pin, integer_compensation=True, calibration=boot_state.get("bme680"))
 AQI_sensor.sea_level_pressure = 1013.25
+# "fast" for walking routes, "balanced" (default) or "low-noise" for stationary units
+AQI_sensor.set_preset("balanced")
+# Run the gas heater on every 5th conversion only; the others measure T/P/H alone
+AQI_sensor.set_gas_cadence(cycles=5)
+boot_profiler.mark("bme680")
 
 SD_card_CS = DigitalInOut(board.PA23)
-SD_card = adafruit_sdcard.SDCard(spi, SD_card_CS)
-vfs = storage.VfsFat(SD_card)
+# Leave the card programming each logged block while the next sample is taken
+SD_card = adafruit_sdcard.SDCard(spi, SD_card_CS, card_info=boot_state.get("sdcard"), defer_busy=True, crc=SD_CRC)
+if BUS_PROFILE:
+    # Before VfsFat, which keeps the block device methods
+    profiler.watch(SD_card, "readblocks", "writeblocks")
+    profiler.watch(oled, "write_framebuf")
+    profiler.watch(AQI_sensor, "start_measurement", "collect", "collect_raw")
+    profiler.watch(light_sensor, "read_sample", "auto_range")
+# Every append rereads and rewrites the same FAT and directory sectors; serve them from RAM
+SD_cache = block_cache.BlockCache(SD_card, blocks=8)
+vfs = storage.VfsFat(SD_cache)
 storage.mount(vfs, "/sd")
+boot_profiler.mark("sdcard")
+
+# Keep what was detected for the next boot; only written to NVM when it changed
+warm_boot.save({"bme680": AQI_sensor.calibration, "sdcard": SD_card.card_info})
 
 pin_D10 = digitalio.DigitalInOut(board.PA20)
 pin_D10.direction = digitalio.Direction.OUTPUT
@@ -39,32 +111,82 @@ pin_NEO.direction = digitalio.Direction.OUTPUT
 
 # Open CSV file before the loop
 with open("/sd/data_log.csv", "w") as f:
-    # Write the header row
-    f.write("Timestamp,Temperature,Gas,Humidity,Pressure,Altitude,Visible Light,IR Light\n")
+    if RAW_LOGGING:
+        # One-time dump of the calibration coefficients, then the header row
+        calibration = AQI_sensor.calibration
+        calibration["sea_level_pressure"] = AQI_sensor.sea_level_pressure
+        f.write(f"# BME680 calibration: {json.dumps(calibration)}\n")
+        f.write("Timestamp,ADC Temperature,ADC Pressure,ADC Humidity,ADC Gas,Gas Range,Visible Light,IR Light,Gas Age,Light Gain,Light Integration\n")
+    else:
+        # Write the header row
+        f.write("Timestamp,Temperature,Gas,Humidity,Pressure,Altitude,Visible Light,IR Light,Gas Age,Light Gain,Light Integration\n")
 
 # Initialize a counter for timestamp
 log_counter = 0
+profile_countdown = BUS_PROFILE_EVERY
+
+# Start the first BME680 conversion; each loop collects it and starts the next one
+AQI_sensor.start_measurement()
 
 while True:
-    # Get sensor readings
-    temperature = AQI_sensor.temperature
-    gas = AQI_sensor.gas
-    relative_humidity = AQI_sensor.relative_humidity
-    pressure = AQI_sensor.pressure
-    altitude = AQI_sensor.altitude
-    IR = light_sensor.ir_light
-    vis_plus_IR = light_sensor.visible_plus_ir_light
-    vis = vis_plus_IR - IR
+    # Get sensor readings, all BME680 channels from a single conversion. The next
+    # conversion runs while this sample is displayed and logged.
+    if RAW_LOGGING:
+        raw = AQI_sensor.collect_raw()
+    else:
+        # The integer compensation gives scaled ints, converted once here for display
+        reading = AQI_sensor.float_reading(AQI_sensor.collect())
+        temperature, gas, relative_humidity, pressure, altitude, gas_age = reading
+    AQI_sensor.start_measurement()
+    # Both light channels from the same integration, read in one burst. With an INT pin,
+    # only when the level left the threshold window or the heartbeat is due.
+    if (
+        light_int is None
+        or not light_armed
+        or not light_int.value
+        or time.monotonic() - light_read_at >= LIGHT_HEARTBEAT
+    ):
+        try:
+            light = light_sensor.read_sample()
+        except ValueError:
+            # Saturated: drop to the least sensitive range and keep the last sample
+            if light_sensor.auto_range(None):
+                light_armed = False
+                light_unsettled = light
+        else:
+            light_read_at = time.monotonic()
+            # Keep the counts in range, with the shortest integration that resolves them
+            if light_sensor.auto_range(light):
+                # Later samples are on a new scale, so the window waits for the first
+                light_armed = False
+                light_unsettled = light
+            elif light_int is not None and light is not light_unsettled:
+                light_sensor.set_threshold_window(light.visible_plus_ir)
+                light_armed = True
+    if light is None:
+        # Saturated before the first good sample
+        IR = vis = float("nan")
+        light_gain = light_integration = 0
+    else:
+        IR = light.ir
+        vis = light.visible_plus_ir - IR
+        light_gain = light.gain
+        light_integration = light.integration_time
 
     # Display readings on OLED
     oled.fill(0)
-    oled.text(f"Temp: {temperature:.1f}C", 0, 0, 1)
-    oled.text(f"Gas: {gas}ohms", 0, 10, 1)
-    oled.text(f"Humidity: {relative_humidity:.1f}%", 0, 20, 1)
-    oled.text(f"Pressure: {pressure:.1f}hPa", 0, 30, 1)
-    oled.text(f"Altitude: {altitude:.1f}m", 0, 40, 1)
+    if RAW_LOGGING:
+        oled.text("Raw BME680 log", 0, 0, 1)
+        oled.text(f"Time: {log_counter:.1f}s", 0, 10, 1)
+    else:
+        oled.text(f"Temp: {temperature:.1f}C", 0, 0, 1)
+        oled.text(f"Gas: {gas}ohms", 0, 10, 1)
+        oled.text(f"Humidity: {relative_humidity:.1f}%", 0, 20, 1)
+        oled.text(f"Pressure: {pressure:.1f}hPa", 0, 30, 1)
+        oled.text(f"Altitude: {altitude:.1f}m", 0, 40, 1)
     oled.text(f"Vis:{vis:.1f}|IR:{IR:.1f}lux", 0, 50, 1)
-    oled.show()
+    with spi.hold():  # one bus lock for all the display transactions
+        oled.show()
 
     # Create a simplified timestamp based on log_counter
     log_counter += 0.3 # this is in seconds
@@ -72,11 +194,36 @@ while True:
     # Log readings to SD card
     try:
         with open("/sd/data_log.csv", "a") as f:
-            f.write(f"{log_counter},{temperature:.1f},{gas},{relative_humidity:.1f},{pressure:.1f},{altitude:.1f},{vis:.1f},{IR:.1f}\n")
+            if RAW_LOGGING:
+                f.write(f"{log_counter},{raw.adc_temp},{raw.adc_pres},{raw.adc_hum},{raw.adc_gas},{raw.gas_range},{vis:.1f},{IR:.1f},{raw.gas_age:.1f},{light_gain},{light_integration}\n")
+            else:
+                f.write(f"{log_counter},{temperature:.1f},{gas},{relative_humidity:.1f},{pressure:.1f},{altitude:.1f},{vis:.1f},{IR:.1f},{gas_age:.1f},{light_gain},{light_integration}\n")
             f.flush()  # Ensure data is written to the SD card
     except OSError as e:
         print(f"Error writing to SD card: {e}")
 
+    if boot_profiler is not None:
+        # Time from reset to the first logged sample
+        boot_profiler.mark("first sample")
+        print(boot_profiler.report())
+        print(spi.report({cs_pin: "ssd1306", AQI_cs_pin: "bme680", SD_card_CS: "sdcard"}))
+        # Clock negotiated from the card's CSD, and what it gives for block reads
+        print(f"SD card {SD_card.baudrate // 1000} kHz, {SD_card.measure_throughput() / 1024:.0f} KiB/s read")
+        boot_profiler = None
+    if BUS_PROFILE:
+        profile_countdown -= 1
+        if not profile_countdown:
+            profile_countdown = BUS_PROFILE_EVERY
+            profiler.dump()
+            print(f"SD cache {SD_cache.hits} hits, {SD_cache.misses} misses, {SD_cache.writebacks} writebacks")
+            print(f"SD busy hidden {SD_card.busy_hidden_ns // 1000000} ms, waited {SD_card.busy_waited_ns // 1000000} ms")
+            print(f"SD {SD_card.transfer_errors} failed transfers, {SD_card.crc_errors} CRC errors, {SD_card.transfers_retried} retried, now {SD_card.baudrate // 1000} kHz")
+            try:
+                with open("/sd/bus_profile.txt", "a") as f:
+                    profiler.dump(f)
+            except OSError as e:
+                print(f"Error writing to SD card: {e}")
+
     # Blink LEDs
     pin_D10.value = True
     pin_NEO.value = True
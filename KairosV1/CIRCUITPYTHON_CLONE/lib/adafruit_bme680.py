@@ -33,6 +33,7 @@ Implementation Notes
 import struct
 import time
 import math
+from collections import namedtuple
 from micropython import const
 
 
@@ -45,8 +46,9 @@ try:
     # Used only for type annotations.
 
     import typing  # pylint: disable=unused-import
+    from typing import List, Optional, Sequence, Tuple, Union
 
-    from circuitpython_typing import ReadableBuffer
+    from circuitpython_typing import ReadableBuffer, WriteableBuffer
     from busio import I2C, SPI
     from digitalio import DigitalInOut
 
@@ -66,6 +68,8 @@ _BME68X_ENABLE_GAS_MEAS_L = const(0x01)
 _BME68X_ENABLE_GAS_MEAS_H = const(0x02)
 _BME68X_SLEEP_MODE = const(0)
 _BME68X_FORCED_MODE = const(1)
+_BME68X_PARALLEL_MODE = const(2)
+_BME68X_SEQUENTIAL_MODE = const(3)
 _BME68X_VARIANT_GAS_LOW = const(0x00)
 _BME68X_VARIANT_GAS_HIGH = const(0x01)
 _BME68X_HCTRL_MSK = const(0x08)
@@ -77,6 +81,14 @@ _BME68X_MODE_MSK = const(0x03)
 _BME68X_PERIOD_POLL = const(10000)
 _BME68X_REG_CTRL_GAS_0 = const(0x70)
 _BME68X_REG_CTRL_GAS_1 = const(0x71)
+_BME68X_GASM_VALID_MSK = const(0x20)
+_BME68X_NEW_DATA_MSK = const(0x80)
+_BME68X_GAS_INDEX_MSK = const(0x0F)
+_BME68X_REG_SHD_HEATR_DUR = const(0x6E)
+_BME68X_LEN_FIELD = const(17)
+_BME68X_N_FIELD = const(3)
+_BME68X_MAX_PROFILE_LEN = const(10)
+_BME680_WRITE_BATCH_LEN = const(32)  # Register/value pairs held by a write batch
 
 #    I2C ADDRESS/BITS/SETTINGS
 #    -----------------------------------------------------------------------
@@ -106,6 +118,13 @@ _BME680_FILTERSIZES = (0, 1, 3, 7, 15, 31, 63, 127)
 
 _BME680_RUNGAS = const(0x10)
 
+# (temperature, pressure, humidity oversampling, filter size, heater deg C, heater msec)
+_BME680_PRESETS = {
+    "fast": (1, 1, 1, 0, 320, 50),
+    "balanced": (8, 4, 2, 3, 320, 150),
+    "low-noise": (8, 16, 4, 15, 320, 150),
+}
+
 _LOOKUP_TABLE_1 = (
     2147483647.0,
     2147483647.0,
@@ -144,6 +163,32 @@ _LOOKUP_TABLE_2 = (
     125000.0,
 )
 
+BME680Reading = namedtuple(
+    "BME680Reading",
+    ("temperature", "gas", "relative_humidity", "pressure", "altitude", "gas_age"),
+)
+"""One compensated sample, every channel taken from the same conversion. ``gas_age`` is
+the number of seconds since ``gas`` was measured, 0 when it came from this conversion
+and NaN when gas was never measured. With ``integer_compensation`` the channels are
+ints: ``temperature`` in hundredths of a degree Celsius, ``relative_humidity`` in
+thousandths of a percent and ``pressure`` in Pascals, with ``altitude`` None; see
+:meth:`Adafruit_BME680.float_reading`."""
+
+BME680RawReading = namedtuple(
+    "BME680RawReading",
+    ("adc_temp", "adc_pres", "adc_hum", "adc_gas", "gas_range", "gas_age"),
+)
+"""The uncompensated ADC words of one conversion, to compensate later with
+:attr:`Adafruit_BME680.calibration`. ``gas_age`` is as in `BME680Reading`, NaN until gas
+is first measured, so raw log rows always format."""
+
+# The BME680 lookup tables for the integer gas algorithm, split so that every part and
+# every product with it stays within the 31-bit small int range
+_LOOKUP_TABLE_1_HIGH = tuple(int(i) >> 16 for i in _LOOKUP_TABLE_1)
+_LOOKUP_TABLE_1_LOW = tuple(int(i) & 0xFFFF for i in _LOOKUP_TABLE_1)
+_LOOKUP_TABLE_2_HIGH = tuple(int(i) >> 9 for i in _LOOKUP_TABLE_2)
+_LOOKUP_TABLE_2_LOW = tuple(int(i) & 0x1FF for i in _LOOKUP_TABLE_2)
+
 
 def bme_set_bits(reg_data, bitname_msk, bitname_pos, data):
     """
@@ -162,6 +207,55 @@ def bme_set_bits_pos_0(reg_data, bitname_msk, data):
     return (reg_data & ~bitname_msk) | (data & bitname_msk)
 
 
+def _div_trunc(dividend: int, divisor: int) -> int:
+    """Integer division rounding toward zero like C, for a positive divisor"""
+    if dividend < 0:
+        return -(-dividend // divisor)
+    return dividend // divisor
+
+
+def _mul_divmod(factor: int, multiplier: int, divisor: int) -> Tuple[int, int]:
+    """``divmod(factor * multiplier, divisor)`` without the product, which can leave the
+    small int range. Valid for ``factor`` below 2**24 and ``multiplier`` below
+    ``divisor``, itself below 2**26."""
+    quotient = remainder = 0
+    # Long multiplication, three bits of factor at a time
+    for shift in range(21, -1, -3):
+        remainder = (remainder << 3) + ((factor >> shift) & 7) * multiplier
+        quotient = (quotient << 3) + remainder // divisor
+        remainder %= divisor
+    return quotient, remainder
+
+
+class _WriteBatch:
+    """Context manager that queues the register writes of a BME680 and sends them as
+    one burst write when the outermost batch exits"""
+
+    def __init__(self, sensor: "Adafruit_BME680") -> None:
+        self._sensor = sensor
+
+    def __enter__(self) -> "Adafruit_BME680":
+        self._sensor._batch_depth += 1  # pylint: disable=protected-access
+        return self._sensor
+
+    def __exit__(self, *exc) -> bool:
+        sensor = self._sensor
+        sensor._batch_depth -= 1  # pylint: disable=protected-access
+        if not sensor._batch_depth:  # pylint: disable=protected-access
+            sensor._flush_writes()  # pylint: disable=protected-access
+        return False
+
+
+def _crc8(buffer: ReadableBuffer) -> int:
+    """CRC-8 (polynomial 0x31, initial value 0xFF) of ``buffer``"""
+    crc = 0xFF
+    for byte in buffer:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else crc << 1
+    return crc
+
+
 def _read24(arr: ReadableBuffer) -> float:
     """Parse an unsigned 24-bit value as a floating point and return it."""
     ret = 0.0
@@ -176,13 +270,40 @@ class Adafruit_BME680:
     """Driver from BME680 air quality sensor
 
     :param int refresh_rate: Maximum number of readings per second. Faster property reads
-      will be from the previous reading."""
+      will be from the previous reading.
+    :param bool integer_compensation: Compensate readings with the Bosch fixed-point integer
+      algorithms instead of floats, which allocates far less on CircuitPython. The
+      readings are then scaled ints, see `BME680Reading`.
+    :param dict calibration: The :attr:`calibration` of this sensor saved on a previous
+      boot. It is used instead of reading the coefficients again when the chip variant
+      and the CRC of the coefficients at 0xE1, read in one burst, match this sensor."""
 
-    def __init__(self, *, refresh_rate: int = 10) -> None:
+    def __init__(
+        self,
+        *,
+        refresh_rate: int = 10,
+        integer_compensation: bool = False,
+        calibration: Optional[dict] = None
+    ) -> None:
         """Check the BME680 was found, read the coefficients and enable the sensor for continuous
         reads."""
+        self._integer_compensation = integer_compensation
+        self.bus_transactions = 0
+        """Number of register read/write transactions issued on the bus."""
+        # Interleaved register/value pairs waiting to be written
+        self._write_buffer = bytearray(2 * _BME680_WRITE_BATCH_LEN)
+        self._write_len = 0
+        self._batch_depth = 0
+        self._write_batch = _WriteBatch(self)
+        # Read targets reused on every conversion, so the hot path does not allocate
+        self._register_buffer = bytearray(1)
+        self._byte_buffer = bytearray(1)
+        self._field_buffer = bytearray(_BME68X_LEN_FIELD * _BME68X_N_FIELD)
+
         self._write(_BME680_REG_SOFTRESET, [0xB6])
         time.sleep(0.005)
+        # Shadow copy of the registers only the driver writes, filled as they are used
+        self._shadow = {}
 
         # Check device ID.
         chip_id = self._read_byte(_BME680_REG_CHIPID)
@@ -192,11 +313,19 @@ class Adafruit_BME680:
         # Get variant
         self._chip_variant = self._read_byte(_BME68X_REG_VARIANT)
 
-        self._read_calibration()
+        if (
+            calibration
+            and calibration.get("variant") == self._chip_variant
+            and calibration.get("crc")
+            == _crc8(self._read(_BME680_BME680_COEFF_ADDR2, 16))
+        ):
+            self._load_calibration(calibration)
+        else:
+            self._read_calibration()
 
         # set up heater
-        self._write(_BME680_BME680_RES_HEAT_0, [0x73])
-        self._write(_BME680_BME680_GAS_WAIT_0, [0x65])
+        self._write_cached(_BME680_BME680_RES_HEAT_0, [0x73])
+        self._write_cached(_BME680_BME680_GAS_WAIT_0, [0x65])
 
         self.sea_level_pressure = 1013.25
         """Pressure in hectoPascals at sea level. Used to calibrate :attr:`altitude`."""
@@ -216,6 +345,21 @@ class Adafruit_BME680:
         self._adc_gas = None
         self._gas_range = None
         self._t_fine = None
+        self._measurement_ready_at = None
+        self._heater_time = 0
+        self._conversion_duration = 0
+        self._conversion_gas = False
+        self._gas_cycles = 1
+        self._gas_interval = None
+        self._gas_skipped = 0
+        self._last_gas = None
+        self._profile_mode = _BME68X_SEQUENTIAL_MODE
+        self._profile_len = 0
+        self._profile_temps = []
+        self._profile_times = []
+        self._profile_shared_time = 0
+        # Forced-mode heater, restored after each profile sweep
+        self._forced_heater = (0, 0, False)
 
         self._last_reading = 0
         self._min_refresh_time = 1 / refresh_rate
@@ -272,16 +416,278 @@ class Adafruit_BME680:
             raise RuntimeError("Invalid size")
 
     @property
-    def temperature(self) -> float:
-        """The compensated temperature in degrees Celsius."""
+    def measurement_duration(self) -> float:
+        """The time in seconds a TPHG conversion takes with the current oversampling and
+        gas heater settings, from the Bosch BME68x API ``bme68x_get_meas_dur``. The IIR
+        filter does not add to it."""
+        return self._tph_duration() + self._heater_time / 1000
+
+    def _tph_duration(self) -> float:
+        """The part of :attr:`measurement_duration` spent outside the gas heater"""
+        meas_cycles = (
+            _BME680_SAMPLERATES[self._temp_oversample]
+            + _BME680_SAMPLERATES[self._pressure_oversample]
+            + _BME680_SAMPLERATES[self._humidity_oversample]
+        )
+        meas_dur = meas_cycles * 1963  # TPH measurement duration in microseconds
+        meas_dur += 477 * 4  # TPH switching duration
+        meas_dur += 477 * 5  # gas measurement duration
+        meas_dur += 1000  # wake up duration of 1ms
+        return meas_dur / 1000000
+
+    @property
+    def max_sample_rate(self) -> float:
+        """The highest number of conversions per second the current settings allow"""
+        return 1 / self.measurement_duration
+
+    def set_preset(self, preset: str) -> float:
+        """
+        Set oversampling, IIR filter and gas heater together from a named preset
+
+        * ``"fast"``: 1x oversampling, no filter, 320 degrees C heater for 50 msec
+        * ``"balanced"``: the power-on defaults, 8x temperature, 4x pressure and 2x
+          humidity oversampling, filter size 3, 320 degrees C heater for 150 msec
+        * ``"low-noise"``: 8x temperature, 16x pressure and 4x humidity oversampling,
+          filter size 15, 320 degrees C heater for 150 msec
+
+        :param str preset: One of ``"fast"``, ``"balanced"`` or ``"low-noise"``
+        :return: The resulting :attr:`max_sample_rate` in conversions per second
+        """
+        if preset not in _BME680_PRESETS:
+            raise RuntimeError("Invalid preset")
+        (
+            self.temperature_oversample,
+            self.pressure_oversample,
+            self.humidity_oversample,
+            self.filter_size,
+            heater_temp,
+            heater_time,
+        ) = _BME680_PRESETS[preset]
+        self.set_gas_heater(heater_temp, heater_time)
+        return self.max_sample_rate
+
+    def set_gas_cadence(self, cycles: int = 1, interval: Optional[float] = None) -> None:
+        """
+        Run the gas heater on only some conversions. The others measure temperature,
+        pressure and humidity alone, which is much faster and saves the heater power, and
+        report the last valid gas resistance together with its age.
+
+        :param int cycles: Measure gas on every ``cycles``-th conversion. Defaults to 1,
+          gas on every conversion.
+        :param float interval: Measure gas once at least ``interval`` seconds have passed
+          since the last gas measurement. Overrides ``cycles`` when set.
+        """
+        if cycles < 1:
+            raise RuntimeError("Invalid gas cadence")
+        self._gas_cycles = cycles
+        self._gas_interval = interval
+        self._gas_skipped = 0
+
+    @property
+    def gas_age(self) -> float:
+        """Seconds since the gas resistance was last measured, NaN if it never was"""
+        if self._last_gas is None:
+            return float("nan")
+        return time.monotonic() - self._last_gas
+
+    @property
+    def temperature(self) -> Union[float, int]:
+        """The compensated temperature in degrees Celsius, or in hundredths of a degree
+        with ``integer_compensation``."""
         self._perform_reading()
-        calc_temp = ((self._t_fine * 5) + 128) / 256
-        return calc_temp / 100
+        return self._compensate_temperature()
+
+    @property
+    def pressure(self) -> Union[float, int]:
+        """The barometric pressure in hectoPascals, or in Pascals with
+        ``integer_compensation``"""
+        self._perform_reading()
+        return self._compensate_pressure()
+
+    @property
+    def relative_humidity(self) -> Union[float, int]:
+        """The relative humidity in RH %, or in thousandths of a percent with
+        ``integer_compensation``"""
+        return self.humidity
+
+    @property
+    def humidity(self) -> Union[float, int]:
+        """The relative humidity in RH %, or in thousandths of a percent with
+        ``integer_compensation``"""
+        self._perform_reading()
+        return self._compensate_humidity()
+
+    @property
+    def altitude(self) -> float:
+        """The altitude based on current :attr:`pressure` vs the sea level pressure
+        (:attr:`sea_level_pressure`) - which you must enter ahead of time)"""
+        if self._integer_compensation:
+            return self._altitude(self.pressure / 100)
+        return self._altitude(self.pressure)
 
     @property
-    def pressure(self) -> float:
-        """The barometric pressure in hectoPascals"""
+    def gas(self) -> int:
+        """The gas resistance in ohms"""
         self._perform_reading()
+        return self._compensate_gas()
+
+    def read_all(self) -> BME680Reading:
+        """Take a single forced-mode conversion and return every channel from it.
+
+        The 17-byte data burst is read once and each channel is compensated once, so
+        temperature, gas, humidity, pressure and altitude always come from the same
+        conversion. Reading the five properties one after another can instead trigger
+        up to five conversions, since each one that outlasts the refresh window starts
+        a new one. ``bus_profiler.BusProfiler.watch`` measures the bus transactions of
+        each way.
+
+        :return: A `BME680Reading` of (temperature, gas, relative_humidity, pressure,
+          altitude, gas_age)
+        """
+        self.start_measurement()
+        return self.collect()
+
+    def start_measurement(self) -> float:
+        """Start a forced-mode conversion and return without waiting for it.
+
+        Use :meth:`collect` to read the result, which lets other work (display updates,
+        SD card writes) run while the sensor is converting.
+
+        :return: The `time.monotonic` time at which the conversion is expected to complete
+        """
+        self._start_conversion()
+        self._measurement_ready_at = time.monotonic() + self._conversion_duration
+        return self._measurement_ready_at
+
+    def collect(self, wait: bool = True) -> Optional[BME680Reading]:
+        """Read the conversion started by :meth:`start_measurement`.
+
+        :param bool wait: Sleep until the predicted completion time and poll for the data if
+          it is not ready yet. When `False`, return `None` instead of blocking.
+        :return: A `BME680Reading` from that conversion, or `None` if ``wait`` is `False`
+          and the conversion has not finished
+        """
+        if not self._collect(wait):
+            return None
+        return self._compensated_reading(self._collected_gas_age())
+
+    def read_raw(self) -> BME680RawReading:
+        """Take a single forced-mode conversion and return its ADC words without
+        compensating them, which leaves the floating point work to the host.
+
+        :return: A `BME680RawReading` of (adc_temp, adc_pres, adc_hum, adc_gas, gas_range,
+          gas_age)
+        """
+        self.start_measurement()
+        return self.collect_raw()
+
+    def collect_raw(self, wait: bool = True) -> Optional[BME680RawReading]:
+        """Like :meth:`collect`, but return the ADC words of the conversion started by
+        :meth:`start_measurement` without compensating them.
+
+        :param bool wait: Sleep until the predicted completion time and poll for the data if
+          it is not ready yet. When `False`, return `None` instead of blocking.
+        :return: A `BME680RawReading` from that conversion, or `None` if ``wait`` is `False`
+          and the conversion has not finished
+        """
+        if not self._collect(wait):
+            return None
+        return BME680RawReading(
+            int(self._adc_temp),
+            int(self._adc_pres),
+            int(self._adc_hum),
+            self._adc_gas,
+            self._gas_range,
+            self._collected_gas_age(),
+        )
+
+    @property
+    def calibration(self) -> dict:
+        """The calibration coefficients the float compensation uses, read once at start
+        up. Log them with :meth:`read_raw` readings to compensate those on a host, or
+        save them to pass as ``calibration`` on the next boot. ``crc`` tells this sensor
+        from another one of the same variant."""
+        return {
+            "variant": self._chip_variant,
+            "crc": self._calibration_crc,
+            "temperature": self._temp_calibration,
+            "pressure": self._pressure_calibration,
+            "humidity": self._humidity_calibration,
+            "gas": self._gas_calibration,
+            "heat_range": self._heat_range,
+            "heat_val": self._heat_val,
+            "sw_err": self._sw_err,
+        }
+
+    def _collect(self, wait: bool) -> bool:
+        """Read the conversion started by :meth:`start_measurement` into the internal data
+        structure, see :meth:`collect`"""
+        if self._measurement_ready_at is None:
+            raise RuntimeError("No measurement in progress")
+        remaining = self._measurement_ready_at - time.monotonic()
+        if remaining > 0:
+            if not wait:
+                return False
+            time.sleep(remaining)
+        if not self._read_conversion(wait):
+            return False
+        self._measurement_ready_at = None
+        return True
+
+    def _collected_gas_age(self) -> float:
+        """Age of the gas reading at the time of the last conversion, NaN if gas was
+        never measured"""
+        if self._last_gas is None:
+            return float("nan")
+        return self._last_reading - self._last_gas
+
+    snapshot = read_all
+
+    def float_reading(self, reading: BME680Reading) -> BME680Reading:
+        """Convert a reading taken with ``integer_compensation`` to the units and floats
+        of the float compensation, adding the altitude. Readings of the float
+        compensation are returned as they are.
+
+        :param BME680Reading reading: A reading from :meth:`read_all`, :meth:`collect` or
+          :meth:`read_profile`
+        """
+        if not self._integer_compensation:
+            return reading
+        pressure = reading.pressure / 100
+        return BME680Reading(
+            reading.temperature / 100,
+            reading.gas,
+            reading.relative_humidity / 1000,
+            pressure,
+            self._altitude(pressure),
+            reading.gas_age,
+        )
+
+    def _compensated_reading(self, gas_age: float) -> BME680Reading:
+        """Compensate every channel of the last parsed data once"""
+        pressure = self._compensate_pressure()
+        return BME680Reading(
+            self._compensate_temperature(),
+            self._compensate_gas(),
+            self._compensate_humidity(),
+            pressure,
+            None if self._integer_compensation else self._altitude(pressure),
+            gas_age,
+        )
+
+    def _compensate_temperature(self) -> Union[float, int]:
+        """Temperature in degrees Celsius from the last conversion, in hundredths of a
+        degree with ``integer_compensation``"""
+        if self._integer_compensation:
+            return self._calc_temperature_int()
+        calc_temp = ((self._t_fine * 5) + 128) / 256
+        return calc_temp / 100
+
+    def _compensate_pressure(self) -> Union[float, int]:
+        """Pressure in hectoPascals from the last conversion, in Pascals with
+        ``integer_compensation``"""
+        if self._integer_compensation:
+            return self._calc_pressure_int()
         var1 = (self._t_fine / 2) - 64000
         var2 = ((var1 / 4) * (var1 / 4)) / 2048
         var2 = (var2 * self._pressure_calibration[5]) / 4
@@ -305,15 +711,11 @@ class Adafruit_BME680:
         calc_pres += (var1 + var2 + var3 + (self._pressure_calibration[6] * 128)) / 16
         return calc_pres / 100
 
-    @property
-    def relative_humidity(self) -> float:
-        """The relative humidity in RH %"""
-        return self.humidity
-
-    @property
-    def humidity(self) -> float:
-        """The relative humidity in RH %"""
-        self._perform_reading()
+    def _compensate_humidity(self) -> Union[float, int]:
+        """Relative humidity in RH % from the last conversion, in thousandths of a
+        percent with ``integer_compensation``"""
+        if self._integer_compensation:
+            return self._calc_humidity_int()
         temp_scaled = ((self._t_fine * 5) + 128) / 256
         var1 = (self._adc_hum - (self._humidity_calibration[0] * 16)) - (
             (temp_scaled * self._humidity_calibration[2]) / 200
@@ -347,17 +749,10 @@ class Adafruit_BME680:
         calc_hum = max(calc_hum, 0)
         return calc_hum
 
-    @property
-    def altitude(self) -> float:
-        """The altitude based on current :attr:`pressure` vs the sea level pressure
-        (:attr:`sea_level_pressure`) - which you must enter ahead of time)"""
-        pressure = self.pressure  # in Si units for hPascal
-        return 44330 * (1.0 - math.pow(pressure / self.sea_level_pressure, 0.1903))
-
-    @property
-    def gas(self) -> int:
-        """The gas resistance in ohms"""
-        self._perform_reading()
+    def _compensate_gas(self) -> int:
+        """Gas resistance in ohms from the last conversion"""
+        if self._integer_compensation:
+            return self._calc_gas_int()
         if self._chip_variant == 0x01:
             # taken from https://github.com/BoschSensortec/BME68x-Sensor-API
             var1 = 262144 >> self._gas_range
@@ -375,45 +770,201 @@ class Adafruit_BME680:
             calc_gas_res = (var3 + (var2 / 2)) / var2
         return int(calc_gas_res)
 
-    def _perform_reading(self) -> None:
+    def _calc_temperature_int(self) -> int:
+        """Temperature in hundredths of a degree Celsius, Bosch integer algorithm"""
+        return ((self._t_fine * 5) + 128) >> 8
+
+    def _calc_pressure_int(self) -> int:
+        """Pressure in Pascals, Bosch integer algorithm. Products that would leave the
+        31-bit small int range are split into exact shift and divmod steps."""
+        par_p = self._pressure_calibration_int
+        var1 = (self._t_fine >> 1) - 64000
+        var2 = ((((var1 >> 2) * (var1 >> 2)) >> 11) * par_p[5]) >> 2
+        var2 = var2 + ((var1 * par_p[4]) << 1)
+        # (var2 >> 2) + (par_p4 << 16), already shifted right by 12
+        var2 = (var2 >> 14) + (par_p[3] << 4)
+        var1 = (
+            ((((var1 >> 2) * (var1 >> 2)) >> 13) * (par_p[2] << 5)) >> 3
+        ) + ((par_p[1] * var1) >> 1)
+        var1 = var1 >> 18
+        # ((32768 + var1) * par_p1) >> 15
+        var1 = par_p[0] + ((var1 * par_p[0]) >> 15)
+        # ((1048576 - adc - var2) * 3125 << 1) // var1
+        quotient, remainder = divmod(1048576 - self._adc_pres - var2, var1)
+        calc_pres = quotient * 6250 + (remainder * 6250) // var1
+        var1 = (par_p[8] * (((calc_pres >> 3) * (calc_pres >> 3)) >> 13)) >> 12
+        var2 = ((calc_pres >> 2) * par_p[7]) >> 13
+        # ((calc_pres >> 8) ** 3 * par_p10) >> 17
+        quotient, remainder = divmod(
+            (calc_pres >> 8) * (calc_pres >> 8) * (calc_pres >> 8), 131072
+        )
+        var3 = quotient * par_p[9] + ((remainder * par_p[9]) >> 17)
+        return calc_pres + ((var1 + var2 + var3 + (par_p[6] << 7)) >> 4)
+
+    def _calc_humidity_int(self) -> int:
+        """Relative humidity in thousandths of a percent, Bosch integer algorithm"""
+        par_h = self._humidity_calibration_int
+        temp_scaled = ((self._t_fine * 5) + 128) >> 8
+        var1 = (self._adc_hum - par_h[0]) - (
+            _div_trunc(temp_scaled * par_h[2], 100) >> 1
+        )
+        var2 = (
+            par_h[1]
+            * (
+                _div_trunc(temp_scaled * par_h[3], 100)
+                + _div_trunc(
+                    (temp_scaled * _div_trunc(temp_scaled * par_h[4], 100)) >> 6, 100
+                )
+                + 16384
+            )
+        ) >> 10
+        var3 = var1 * var2
+        var4 = par_h[5] << 7
+        var4 = (var4 + _div_trunc(temp_scaled * par_h[6], 100)) >> 4
+        var5 = ((var3 >> 14) * (var3 >> 14)) >> 10
+        var6 = (var4 * var5) >> 1
+        calc_hum = (((var3 + var6) >> 10) * 1000) >> 12
+        return min(max(calc_hum, 0), 100000)
+
+    def _calc_gas_int(self) -> int:
+        """Gas resistance in ohms, Bosch integer algorithm. The steps and truncations are
+        those of ``calc_gas_resistance_high`` and ``calc_gas_resistance_low`` in the
+        Bosch BME68x API, with the products that need 64 bits there split so every
+        intermediate is a small int."""
+        gas_range = self._gas_range
+        if self._chip_variant == 0x01:
+            var1 = 262144 >> gas_range
+            var2 = self._adc_gas - 512
+            var2 *= 3
+            var2 = 4096 + var2
+            # calc_gas_res = (10000 * var1) / var2, as quotient and remainder of var1
+            quotient, remainder = divmod(var1, var2)
+            calc_gas_res = quotient * 10000 + (remainder * 10000) // var2
+            return calc_gas_res * 100
+        # var1 = ((1340 + 5 * range_sw_err) * lookup_table1[gas_range]) >> 16
+        var1 = 1340 + (5 * self._sw_err_int)
+        var1 = var1 * _LOOKUP_TABLE_1_HIGH[gas_range] + (
+            (var1 * _LOOKUP_TABLE_1_LOW[gas_range]) >> 16
+        )
+        var2 = ((self._adc_gas << 15) - 16777216) + var1
+        # var3 = (lookup_table2[gas_range] * var1) >> 9 is high * var1 + var3_low, with
+        # high and low the table entry above and below bit 9. high * var1 is divided by
+        # var2 in parts, as var1 = quotient * var2 + remainder, for
+        # calc_gas_res = (var3 + (var2 >> 1)) / var2
+        high = _LOOKUP_TABLE_2_HIGH[gas_range]
+        low = _LOOKUP_TABLE_2_LOW[gas_range]
+        var3_low = low * (var1 >> 9) + ((low * (var1 & 0x1FF)) >> 9)
+        quotient, remainder = divmod(var1, var2)
+        calc_gas_res, remainder = _mul_divmod(high, remainder, var2)
+        calc_gas_res += high * quotient
+        return calc_gas_res + (remainder + var3_low + (var2 >> 1)) // var2
+
+    def _altitude(self, pressure: float) -> float:
+        """Altitude in meters for ``pressure`` in hectoPascals"""
+        return 44330 * (1.0 - math.pow(pressure / self.sea_level_pressure, 0.1903))
+
+    def _perform_reading(self, force: bool = False) -> None:
         """Perform a single-shot reading from the sensor and fill internal data structure for
-        calculations"""
-        if time.monotonic() - self._last_reading < self._min_refresh_time:
+        calculations
+
+        :param bool force: Start a new conversion even if the last one is still within the
+          refresh window"""
+        if not force and time.monotonic() - self._last_reading < self._min_refresh_time:
             return
 
-        # set filter
-        self._write(_BME680_REG_CONFIG, [self._filter << 2])
-        # turn on temp oversample & pressure oversample
-        self._write(
-            _BME680_REG_CTRL_MEAS,
-            [(self._temp_oversample << 5) | (self._pressure_oversample << 2)],
-        )
-        # turn on humidity oversample
-        self._write(_BME680_REG_CTRL_HUM, [self._humidity_oversample])
-        # gas measurements enabled
-        if self._chip_variant == 0x01:
-            self._write(_BME680_REG_CTRL_GAS, [(self._run_gas & _BME680_RUNGAS) << 1])
-        else:
-            self._write(_BME680_REG_CTRL_GAS, [(self._run_gas & _BME680_RUNGAS)])
-        ctrl = self._read_byte(_BME680_REG_CTRL_MEAS)
-        ctrl = (ctrl & 0xFC) | 0x01  # enable single shot!
-        self._write(_BME680_REG_CTRL_MEAS, [ctrl])
-        new_data = False
-        while not new_data:
-            data = self._read(_BME680_REG_MEAS_STATUS, 17)
-            new_data = data[0] & 0x80 != 0
+        self._start_conversion()
+        time.sleep(self._conversion_duration)
+        self._read_conversion()
+
+    def _start_conversion(self) -> None:
+        """Write the measurement settings and trigger a forced-mode conversion. Settings
+        that have not changed since the last conversion are not written again, the rest
+        go out in one burst write."""
+        with self._write_batch:
+            # set filter
+            self._write_cached(_BME680_REG_CONFIG, [self._filter << 2])
+            # turn on humidity oversample
+            self._write_cached(_BME680_REG_CTRL_HUM, [self._humidity_oversample])
+            # gas measurements enabled, unless skipped by the gas cadence
+            run_gas = self._run_gas & _BME680_RUNGAS
+            if run_gas and not self._gas_due():
+                run_gas = 0
+                self._gas_skipped += 1
+            else:
+                self._gas_skipped = 0
+            self._conversion_gas = bool(run_gas)
+            if self._chip_variant == 0x01:
+                self._write_cached(_BME680_REG_CTRL_GAS, [run_gas << 1])
+            else:
+                self._write_cached(_BME680_REG_CTRL_GAS, [run_gas])
+            self._conversion_duration = self._tph_duration()
+            if run_gas:
+                self._conversion_duration += self._heater_time / 1000
+            # turn on temp oversample & pressure oversample and enable single shot! This
+            # also applies CTRL_HUM. The mode bits drop back to sleep when it is done.
+            ctrl = (self._temp_oversample << 5) | (self._pressure_oversample << 2)
+            self._write(_BME680_REG_CTRL_MEAS, [ctrl | _BME68X_FORCED_MODE])
+            self._shadow[_BME680_REG_CTRL_MEAS] = ctrl
+        self._measurement_ready_at = None
+
+    def _gas_due(self) -> bool:
+        """Whether the gas cadence calls for a gas measurement in the next conversion"""
+        if self._last_gas is None:
+            return True
+        if self._gas_interval is not None:
+            return time.monotonic() - self._last_gas >= self._gas_interval
+        return self._gas_skipped + 1 >= self._gas_cycles
+
+    def _read_conversion(self, wait: bool = True) -> bool:
+        """Read the data registers of a triggered conversion and fill the internal data
+        structure for calculations
+
+        :param bool wait: Keep polling the status register until new data is available
+        :return: True if new data was read, False if ``wait`` is False and it is not ready
+        """
+        data = self._field_buffer
+        self._readinto(_BME680_REG_MEAS_STATUS, data, _BME68X_LEN_FIELD)
+        while data[0] & 0x80 == 0:
+            # Only reached if the conversion outlasts its predicted duration
+            if not wait:
+                return False
             time.sleep(0.005)
+            self._readinto(_BME680_REG_MEAS_STATUS, data, _BME68X_LEN_FIELD)
         self._last_reading = time.monotonic()
+        self._parse_tph(data)
+        # Keep the last valid gas reading when this conversion did not measure gas
+        gas_lsb = 16 if self._chip_variant == 0x01 else 14
+        if self._adc_gas is None or (
+            self._conversion_gas and data[gas_lsb] & _BME68X_GASM_VALID_MSK
+        ):
+            self._adc_gas = ((data[gas_lsb - 1] << 8) | data[gas_lsb]) >> 6
+            self._gas_range = data[gas_lsb] & 0x0F
+            if self._conversion_gas:
+                self._last_gas = self._last_reading
+        return True
 
-        self._adc_pres = _read24(data[2:5]) / 16
-        self._adc_temp = _read24(data[5:8]) / 16
-        self._adc_hum = struct.unpack(">H", bytes(data[8:10]))[0]
-        if self._chip_variant == 0x01:
-            self._adc_gas = int(struct.unpack(">H", bytes(data[15:17]))[0] / 64)
-            self._gas_range = data[16] & 0x0F
-        else:
-            self._adc_gas = int(struct.unpack(">H", bytes(data[13:15]))[0] / 64)
-            self._gas_range = data[14] & 0x0F
+    def _parse_tph(self, data: ReadableBuffer, offset: int = 0) -> None:
+        """Fill the temperature, pressure and humidity ADC values from the data field
+        starting at ``data[offset]``"""
+        if self._integer_compensation:
+            self._adc_pres = (
+                (data[offset + 2] << 12) | (data[offset + 3] << 4) | (data[offset + 4] >> 4)
+            )
+            self._adc_temp = (
+                (data[offset + 5] << 12) | (data[offset + 6] << 4) | (data[offset + 7] >> 4)
+            )
+            self._adc_hum = (data[offset + 8] << 8) | data[offset + 9]
+            par_t = self._temp_calibration_int
+            var1 = (self._adc_temp >> 3) - (par_t[0] << 1)
+            var2 = (var1 * par_t[1]) >> 11
+            var3 = ((var1 >> 1) * (var1 >> 1)) >> 12
+            var3 = (var3 * (par_t[2] << 4)) >> 14
+            self._t_fine = var2 + var3
+            return
+
+        self._adc_pres = _read24(data[offset + 2 : offset + 5]) / 16
+        self._adc_temp = _read24(data[offset + 5 : offset + 8]) / 16
+        self._adc_hum = struct.unpack_from(">H", data, offset + 8)[0]
 
         var1 = (self._adc_temp / 8) - (self._temp_calibration[0] * 2)
         var2 = (var1 * self._temp_calibration[1]) / 2048
@@ -425,6 +976,7 @@ class Adafruit_BME680:
         """Read & save the calibration coefficients"""
         coeff = self._read(_BME680_BME680_COEFF_ADDR1, 25)
         coeff += self._read(_BME680_BME680_COEFF_ADDR2, 16)
+        self._calibration_crc = _crc8(coeff[25:])
 
         coeff = list(struct.unpack("<hbBHhbBhhbbHhhBBBHbbbBbHhbb", bytes(coeff[1:39])))
         # print("\n\n",coeff)
@@ -444,15 +996,112 @@ class Adafruit_BME680:
         self._heat_range = (self._read_byte(0x02) & 0x30) / 16
         self._heat_val = self._read_byte(0x00)
         self._sw_err = (self._read_byte(0x04) & 0xF0) / 16
+        self._set_calibration_int()
+
+    def _load_calibration(self, calibration: dict) -> None:
+        """Restore the coefficients from a :attr:`calibration` dict"""
+        self._temp_calibration = list(calibration["temperature"])
+        self._pressure_calibration = list(calibration["pressure"])
+        self._humidity_calibration = list(calibration["humidity"])
+        self._gas_calibration = list(calibration["gas"])
+        self._calibration_crc = calibration["crc"]
+        self._heat_range = calibration["heat_range"]
+        self._heat_val = calibration["heat_val"]
+        self._sw_err = calibration["sw_err"]
+        self._set_calibration_int()
+
+    def _set_calibration_int(self) -> None:
+        """Integer copies for the fixed-point path. The float path keeps H1 divided by
+        16, so the integer copy of H1 is rebuilt as the raw register value."""
+        self._temp_calibration_int = [int(i) for i in self._temp_calibration]
+        self._pressure_calibration_int = [int(i) for i in self._pressure_calibration]
+        self._humidity_calibration_int = [int(i) for i in self._humidity_calibration]
+        self._humidity_calibration_int[0] = round(self._humidity_calibration[0] * 16)
+        self._sw_err_int = int(self._sw_err)
 
     def _read_byte(self, register: int) -> int:
         """Read a byte register value and return it"""
-        return self._read(register, 1)[0]
+        self._readinto(register, self._byte_buffer)
+        return self._byte_buffer[0]
+
+    def _read_cached(self, register: int) -> int:
+        """Read a register only the driver writes, from the shadow copy once it is known"""
+        value = self._shadow.get(register)
+        if value is None:
+            value = self._shadow[register] = self._read_byte(register)
+        return value
+
+    def _write_cached(
+        self, register: int, values: ReadableBuffer, force: bool = False
+    ) -> None:
+        """Write 'values' to consecutive registers from 'register' and update the shadow
+        copy. Skipped when the shadow copy shows they already hold 'values', unless
+        'force' is set."""
+        if not force:
+            for i, value in enumerate(values):
+                if self._shadow.get(register + i) != value:
+                    break
+            else:
+                return
+        self._write(register, values)
+        for i, value in enumerate(values):
+            self._shadow[register + i] = value
+
+    def batch_writes(self) -> _WriteBatch:
+        """
+        Context manager that queues the register writes made inside its ``with`` block,
+        for example by :meth:`set_gas_heater`, and sends them as one burst write when the
+        block exits. Writes are flushed early before any register read.
+
+        .. code-block:: python
+
+            with bme680.batch_writes():
+                bme680.filter_size = 3
+                bme680.set_gas_heater(320, 150)
+        """
+        return self._write_batch
+
+    def _write(self, register: int, values: ReadableBuffer) -> None:
+        """Writes 'values' to consecutive registers from 'register', or queues them while
+        a write batch is open"""
+        buffer = self._write_buffer
+        length = self._write_len
+        # Registers from 0x80 are in the other SPI memory page, so they need their own burst
+        if length + 2 * len(values) > len(buffer) or (
+            length and (buffer[0] ^ register) & 0x80
+        ):
+            self._flush_writes()
+            length = 0
+        for value in values:
+            buffer[length] = register
+            buffer[length + 1] = value & 0xFF
+            register += 1
+            length += 2
+        self._write_len = length
+        if not self._batch_depth:
+            self._flush_writes()
+
+    def _flush_writes(self) -> None:
+        """Send any queued register writes as one burst write"""
+        length = self._write_len
+        if length:
+            self._write_len = 0
+            self._write_pairs(self._write_buffer, length)
 
     def _read(self, register: int, length: int) -> bytearray:
+        """Returns a new array of 'length' bytes from the 'register'. Hot paths use
+        `_readinto` with a buffer kept for reuse instead."""
+        result = bytearray(length)
+        self._readinto(register, result)
+        return result
+
+    def _readinto(
+        self, register: int, buffer: WriteableBuffer, end: Optional[int] = None
+    ) -> None:
+        """Reads consecutive registers from 'register' into 'buffer', up to 'end'"""
         raise NotImplementedError()
 
-    def _write(self, register: int, values: bytearray) -> None:
+    def _write_pairs(self, buffer: bytearray, length: int) -> None:
         raise NotImplementedError()
 
     def set_gas_heater(self, heater_temp: int, heater_time: int) -> bool:
@@ -471,6 +1120,144 @@ class Adafruit_BME680:
             return False
         return True
 
+    def set_heater_profile(
+        self,
+        heater_temps: Sequence[int],
+        heater_times: Sequence[int],
+        shared_heater_time: Optional[int] = None,
+    ) -> bool:
+        """
+        Configure a BME688 heater profile of up to 10 steps for :meth:`read_profile`.
+        The profile is written to the sensor at the start of each sweep, and the heater
+        set by :meth:`set_gas_heater` is restored after it, so forced-mode readings are
+        not affected.
+
+        :param  heater_temps: Desired temperature of each step in degrees Centigrade
+        :param  heater_times: Time to keep the heater on for each step in milliseconds in
+          sequential mode, or in parallel mode the number of TPHG cycles to hold each step
+        :param  shared_heater_time: Heater time in milliseconds shared by every TPHG cycle.
+          Setting it selects parallel mode instead of sequential mode.
+        :return: True on success
+        """
+        if self._chip_variant != _BME68X_VARIANT_GAS_HIGH:
+            raise RuntimeError("Heater profiles need a BME688")
+        if not (
+            0 < len(heater_temps) <= _BME68X_MAX_PROFILE_LEN
+            and len(heater_temps) == len(heater_times)
+        ):
+            raise RuntimeError("Invalid heater profile")
+        if shared_heater_time is None:
+            self._profile_mode = _BME68X_SEQUENTIAL_MODE
+        else:
+            self._profile_mode = _BME68X_PARALLEL_MODE
+        self._profile_len = len(heater_temps)
+        self._profile_temps = list(heater_temps)
+        self._profile_times = list(heater_times)
+        self._profile_shared_time = shared_heater_time or 0
+        return True
+
+    def read_profile(self) -> List[BME680Reading]:
+        """
+        Run one sweep of the heater profile set by :meth:`set_heater_profile` and return a
+        reading for each step, in step order. All three BME688 data fields are read in
+        one burst per poll.
+
+        :return: A list of `BME680Reading`, one per heater step
+        """
+        if not self._profile_len:
+            raise RuntimeError("No heater profile set")
+        tph_duration = self._tph_duration()
+        if self._profile_mode == _BME68X_PARALLEL_MODE:
+            cycle = tph_duration + self._profile_shared_time / 1000
+            sweep = sum(self._profile_times) * cycle
+        else:
+            sweep = self._profile_len * tph_duration + sum(self._profile_times) / 1000
+        deadline = time.monotonic() + 2 * sweep + 0.5
+
+        with self._write_batch:
+            self._set_heatr_profile_conf()
+            self._write_cached(_BME680_REG_CONFIG, [self._filter << 2])
+            self._write_cached(_BME680_REG_CTRL_HUM, [self._humidity_oversample])
+            self._write_cached(
+                _BME680_REG_CTRL_MEAS,
+                [(self._temp_oversample << 5) | (self._pressure_oversample << 2)],
+                force=True,
+            )
+            self._set_op_mode(self._profile_mode)
+
+        readings = [None] * self._profile_len
+        remaining = self._profile_len
+        try:
+            while remaining:
+                time.sleep(tph_duration)
+                data = self._field_buffer
+                self._readinto(_BME680_REG_MEAS_STATUS, data)
+                for offset in range(0, len(data), _BME68X_LEN_FIELD):
+                    step = data[offset] & _BME68X_GAS_INDEX_MSK
+                    if (
+                        not data[offset] & _BME68X_NEW_DATA_MSK
+                        or step >= self._profile_len
+                        or readings[step] is not None
+                        or not data[offset + 16] & _BME68X_GASM_VALID_MSK
+                    ):
+                        continue
+                    self._parse_tph(data, offset)
+                    self._adc_gas = int(
+                        struct.unpack_from(">H", data, offset + 15)[0] / 64
+                    )
+                    self._gas_range = data[offset + 16] & 0x0F
+                    readings[step] = self._compensated_reading(0.0)
+                    remaining -= 1
+                if remaining and time.monotonic() > deadline:
+                    raise RuntimeError("Timed out waiting for heater profile")
+        finally:
+            # Back to sleep, with the forced-mode heater in set-point 0 and nb_conv 0
+            self._set_heatr_conf(*self._forced_heater)
+        self._last_reading = self._last_gas = time.monotonic()
+        return readings
+
+    def _set_heatr_profile_conf(self) -> None:
+        """
+        This internal API is used to set the sequential or parallel mode heater profile
+        """
+        with self._write_batch:
+            self._set_op_mode(_BME68X_SLEEP_MODE)
+            self._write_cached(
+                _BME680_BME680_RES_HEAT_0,
+                [self._calc_res_heat(t) for t in self._profile_temps],
+            )
+            if self._profile_mode == _BME68X_SEQUENTIAL_MODE:
+                gas_wait = [self._calc_gas_wait(t) for t in self._profile_times]
+            else:
+                # In parallel mode the gas wait registers hold TPHG cycle multipliers
+                gas_wait = [min(int(t), 0xFF) for t in self._profile_times]
+                self._write_cached(
+                    _BME68X_REG_SHD_HEATR_DUR,
+                    [self._calc_heatr_dur_shared(self._profile_shared_time)],
+                )
+            self._write_cached(_BME680_BME680_GAS_WAIT_0, gas_wait)
+
+            ctrl_gas_data_0 = self._read_cached(_BME68X_REG_CTRL_GAS_0)
+            ctrl_gas_data_1 = self._read_cached(_BME68X_REG_CTRL_GAS_1)
+            ctrl_gas_data_0 = bme_set_bits(
+                ctrl_gas_data_0,
+                _BME68X_HCTRL_MSK,
+                _BME68X_HCTRL_POS,
+                _BME68X_ENABLE_HEATER,
+            )
+            ctrl_gas_data_1 = bme_set_bits_pos_0(
+                ctrl_gas_data_1, _BME68X_NBCONV_MSK, self._profile_len
+            )
+            ctrl_gas_data_1 = bme_set_bits(
+                ctrl_gas_data_1,
+                _BME68X_RUN_GAS_MSK,
+                _BME68X_RUN_GAS_POS,
+                _BME68X_ENABLE_GAS_MEAS_H,
+            )
+            self._run_gas = ~(_BME68X_ENABLE_GAS_MEAS_H - 1)
+            self._write_cached(_BME68X_REG_CTRL_GAS_0, [ctrl_gas_data_0])
+            self._write_cached(_BME68X_REG_CTRL_GAS_1, [ctrl_gas_data_1])
+
     def _set_heatr_conf(
         self, heater_temp: int, heater_time: int, enable: bool = True
     ) -> None:
@@ -482,32 +1269,35 @@ class Adafruit_BME680:
         ctrl_gas_data_0: int = 0
         ctrl_gas_data_1: int = 0
 
-        self._set_op_mode(_BME68X_SLEEP_MODE)
-        self._set_conf(heater_temp, heater_time, op_mode)
-        ctrl_gas_data_0 = self._read_byte(_BME68X_REG_CTRL_GAS_0)
-        ctrl_gas_data_1 = self._read_byte(_BME68X_REG_CTRL_GAS_1)
-        if enable:
-            hctrl = _BME68X_ENABLE_HEATER
-            if self._chip_variant == _BME68X_VARIANT_GAS_HIGH:
-                run_gas = _BME68X_ENABLE_GAS_MEAS_H
+        with self._write_batch:
+            self._set_op_mode(_BME68X_SLEEP_MODE)
+            self._set_conf(heater_temp, heater_time, op_mode)
+            ctrl_gas_data_0 = self._read_cached(_BME68X_REG_CTRL_GAS_0)
+            ctrl_gas_data_1 = self._read_cached(_BME68X_REG_CTRL_GAS_1)
+            if enable:
+                hctrl = _BME68X_ENABLE_HEATER
+                if self._chip_variant == _BME68X_VARIANT_GAS_HIGH:
+                    run_gas = _BME68X_ENABLE_GAS_MEAS_H
+                else:
+                    run_gas = _BME68X_ENABLE_GAS_MEAS_L
             else:
-                run_gas = _BME68X_ENABLE_GAS_MEAS_L
-        else:
-            hctrl = _BME68X_DISABLE_HEATER
-            run_gas = _BME68X_DISABLE_GAS_MEAS
-        self._run_gas = ~(run_gas - 1)
-
-        ctrl_gas_data_0 = bme_set_bits(
-            ctrl_gas_data_0, _BME68X_HCTRL_MSK, _BME68X_HCTRL_POS, hctrl
-        )
-        ctrl_gas_data_1 = bme_set_bits_pos_0(
-            ctrl_gas_data_1, _BME68X_NBCONV_MSK, nb_conv
-        )
-        ctrl_gas_data_1 = bme_set_bits(
-            ctrl_gas_data_1, _BME68X_RUN_GAS_MSK, _BME68X_RUN_GAS_POS, run_gas
-        )
-        self._write(_BME68X_REG_CTRL_GAS_0, [ctrl_gas_data_0])
-        self._write(_BME68X_REG_CTRL_GAS_1, [ctrl_gas_data_1])
+                hctrl = _BME68X_DISABLE_HEATER
+                run_gas = _BME68X_DISABLE_GAS_MEAS
+            self._run_gas = ~(run_gas - 1)
+            self._heater_time = min(heater_time, 0xFC0) if enable else 0
+            self._forced_heater = (heater_temp, heater_time, enable)
+
+            ctrl_gas_data_0 = bme_set_bits(
+                ctrl_gas_data_0, _BME68X_HCTRL_MSK, _BME68X_HCTRL_POS, hctrl
+            )
+            ctrl_gas_data_1 = bme_set_bits_pos_0(
+                ctrl_gas_data_1, _BME68X_NBCONV_MSK, nb_conv
+            )
+            ctrl_gas_data_1 = bme_set_bits(
+                ctrl_gas_data_1, _BME68X_RUN_GAS_MSK, _BME68X_RUN_GAS_POS, run_gas
+            )
+            self._write_cached(_BME68X_REG_CTRL_GAS_0, [ctrl_gas_data_0])
+            self._write_cached(_BME68X_REG_CTRL_GAS_1, [ctrl_gas_data_1])
 
     def _set_op_mode(self, op_mode: int) -> None:
         """
@@ -524,7 +1314,7 @@ class Adafruit_BME680:
             pow_mode = tmp_pow_mode & _BME68X_MODE_MSK
             if pow_mode != _BME68X_SLEEP_MODE:
                 tmp_pow_mode &= ~_BME68X_MODE_MSK  # Set to sleep
-                self._write(_BME680_REG_CTRL_MEAS, [tmp_pow_mode])
+                self._write_cached(_BME680_REG_CTRL_MEAS, [tmp_pow_mode], force=True)
                 # dev->delay_us(_BME68X_PERIOD_POLL, dev->intf_ptr)  # HELP
                 delay_microseconds(_BME68X_PERIOD_POLL)
         # Already in sleep
@@ -532,7 +1322,7 @@ class Adafruit_BME680:
             tmp_pow_mode = (tmp_pow_mode & ~_BME68X_MODE_MSK) | (
                 op_mode & _BME68X_MODE_MSK
             )
-            self._write(_BME680_REG_CTRL_MEAS, [tmp_pow_mode])
+            self._write_cached(_BME680_REG_CTRL_MEAS, [tmp_pow_mode], force=True)
 
     def _set_conf(self, heater_temp: int, heater_time: int, op_mode: int) -> None:
         """
@@ -543,8 +1333,8 @@ class Adafruit_BME680:
             raise OSError("GasHeaterException: _set_conf not forced mode")
         rh_reg_data: int = self._calc_res_heat(heater_temp)
         gw_reg_data: int = self._calc_gas_wait(heater_time)
-        self._write(_BME680_BME680_RES_HEAT_0, [rh_reg_data])
-        self._write(_BME680_BME680_GAS_WAIT_0, [gw_reg_data])
+        self._write_cached(_BME680_BME680_RES_HEAT_0, [rh_reg_data])
+        self._write_cached(_BME680_BME680_GAS_WAIT_0, [gw_reg_data])
 
     def _calc_res_heat(self, temp: int) -> int:
         """
@@ -607,6 +1397,23 @@ class Adafruit_BME680:
         durval = int(dur + (factor * 64))
         return durval
 
+    def _calc_heatr_dur_shared(self, dur: int) -> int:
+        """
+        This internal API is used to calculate the shared heater duration of parallel mode
+        """
+        factor: int = 0
+        heatdurval: int = 0xFF  # Max duration
+
+        if dur >= 0x783:
+            return heatdurval
+        # Step size of 0.477ms
+        dur = int(dur * 1000 / 477)
+        while dur > 0x3F:
+            dur = dur >> 2
+            factor += 1
+        heatdurval = int(dur + (factor * 64))
+        return heatdurval
+
 
 class Adafruit_BME680_I2C(Adafruit_BME680):
     """Driver for I2C connected BME680.
@@ -616,6 +1423,10 @@ class Adafruit_BME680_I2C(Adafruit_BME680):
     :param bool debug: Print debug statements when `True`. Defaults to `False`
     :param int refresh_rate: Maximum number of readings per second. Faster property reads
       will be from the previous reading.
+    :param bool integer_compensation: Use the fixed-point integer compensation path.
+      Defaults to `False`
+    :param dict calibration: The :attr:`calibration` saved on a previous boot, to skip
+      reading the coefficients again
 
     **Quickstart: Importing and using the BME680**
 
@@ -659,7 +1470,9 @@ class Adafruit_BME680_I2C(Adafruit_BME680):
         address: int = 0x77,
         debug: bool = False,
         *,
-        refresh_rate: int = 10
+        refresh_rate: int = 10,
+        integer_compensation: bool = False,
+        calibration: Optional[dict] = None
     ) -> None:
         """Initialize the I2C device at the 'address' given"""
         from adafruit_bus_device import (  # pylint: disable=import-outside-toplevel
@@ -668,28 +1481,32 @@ class Adafruit_BME680_I2C(Adafruit_BME680):
 
         self._i2c = i2c_device.I2CDevice(i2c, address)
         self._debug = debug
-        super().__init__(refresh_rate=refresh_rate)
+        super().__init__(
+            refresh_rate=refresh_rate,
+            integer_compensation=integer_compensation,
+            calibration=calibration,
+        )
 
-    def _read(self, register: int, length: int) -> bytearray:
-        """Returns an array of 'length' bytes from the 'register'"""
+    def _readinto(
+        self, register: int, buffer: WriteableBuffer, end: Optional[int] = None
+    ) -> None:
+        """Reads consecutive registers from 'register' into 'buffer', up to 'end', in one
+        transaction with a repeated start between the register write and the read"""
+        self._flush_writes()
+        self.bus_transactions += 1
+        self._register_buffer[0] = register & 0xFF
         with self._i2c as i2c:
-            i2c.write(bytes([register & 0xFF]))
-            result = bytearray(length)
-            i2c.readinto(result)
+            i2c.write_then_readinto(self._register_buffer, buffer, in_end=end)
             if self._debug:
-                print("\t$%02X => %s" % (register, [hex(i) for i in result]))
-            return result
+                print("\t$%02X => %s" % (register, [hex(i) for i in buffer[:end]]))
 
-    def _write(self, register: int, values: ReadableBuffer) -> None:
-        """Writes an array of 'length' bytes to the 'register'"""
+    def _write_pairs(self, buffer: bytearray, length: int) -> None:
+        """Writes the first 'length' bytes of interleaved register/value pairs in 'buffer'"""
+        self.bus_transactions += 1
         with self._i2c as i2c:
-            buffer = bytearray(2 * len(values))
-            for i, value in enumerate(values):
-                buffer[2 * i] = register + i
-                buffer[2 * i + 1] = value
-            i2c.write(buffer)
+            i2c.write(buffer, end=length)
             if self._debug:
-                print("\t$%02X <= %s" % (values[0], [hex(i) for i in values[1:]]))
+                print("\t$%02X <= %s" % (buffer[0], [hex(i) for i in buffer[1:length:2]]))
 
 
 class Adafruit_BME680_SPI(Adafruit_BME680):
@@ -701,6 +1518,10 @@ class Adafruit_BME680_SPI(Adafruit_BME680):
     :param int baudrate: Clock rate, default is :const:`100000`
     :param int refresh_rate: Maximum number of readings per second. Faster property reads
       will be from the previous reading.
+    :param bool integer_compensation: Use the fixed-point integer compensation path.
+      Defaults to `False`
+    :param dict calibration: The :attr:`calibration` saved on a previous boot, to skip
+      reading the coefficients again
 
 
     **Quickstart: Importing and using the BME680**
@@ -748,7 +1569,9 @@ class Adafruit_BME680_SPI(Adafruit_BME680):
         baudrate: int = 100000,
         debug: bool = False,
         *,
-        refresh_rate: int = 10
+        refresh_rate: int = 10,
+        integer_compensation: bool = False,
+        calibration: Optional[dict] = None
     ) -> None:
         from adafruit_bus_device import (  # pylint: disable=import-outside-toplevel
             spi_device,
@@ -756,40 +1579,56 @@ class Adafruit_BME680_SPI(Adafruit_BME680):
 
         self._spi = spi_device.SPIDevice(spi, cs, baudrate=baudrate)
         self._debug = debug
-        super().__init__(refresh_rate=refresh_rate)
+        self._spi_mem_page = None
+        self._page_buffer = bytearray((_BME680_REG_STATUS, 0))
+        super().__init__(
+            refresh_rate=refresh_rate,
+            integer_compensation=integer_compensation,
+            calibration=calibration,
+        )
 
-    def _read(self, register: int, length: int) -> bytearray:
+    def _readinto(
+        self, register: int, buffer: WriteableBuffer, end: Optional[int] = None
+    ) -> None:
+        self._flush_writes()
         if register != _BME680_REG_STATUS:
             # _BME680_REG_STATUS exists in both SPI memory pages
             # For all other registers, we must set the correct memory page
             self._set_spi_mem_page(register)
 
         register = (register | 0x80) & 0xFF  # Read single, bit 7 high.
+        self._register_buffer[0] = register
+        if end is None:
+            end = len(buffer)
+        self.bus_transactions += 1
         with self._spi as spi:
-            spi.write(bytearray([register]))  # pylint: disable=no-member
-            result = bytearray(length)
-            spi.readinto(result)  # pylint: disable=no-member
+            spi.write(self._register_buffer)  # pylint: disable=no-member
+            spi.readinto(buffer, end=end)  # pylint: disable=no-member
             if self._debug:
-                print("\t$%02X => %s" % (register, [hex(i) for i in result]))
-            return result
+                print("\t$%02X => %s" % (register, [hex(i) for i in buffer[:end]]))
 
-    def _write(self, register: int, values: ReadableBuffer) -> None:
+    def _write_pairs(self, buffer: bytearray, length: int) -> None:
+        register = buffer[0]
         if register != _BME680_REG_STATUS:
             # _BME680_REG_STATUS exists in both SPI memory pages
-            # For all other registers, we must set the correct memory page
+            # For all other registers, we must set the correct memory page.
+            # Every register of a burst is in the same page.
             self._set_spi_mem_page(register)
-        register &= 0x7F  # Write, bit 7 low.
+        for i in range(0, length, 2):
+            buffer[i] &= 0x7F  # Write, bit 7 low.
+        self.bus_transactions += 1
         with self._spi as spi:
-            buffer = bytearray(2 * len(values))
-            for i, value in enumerate(values):
-                buffer[2 * i] = register + i
-                buffer[2 * i + 1] = value & 0xFF
-            spi.write(buffer)  # pylint: disable=no-member
+            spi.write(buffer, end=length)  # pylint: disable=no-member
             if self._debug:
-                print("\t$%02X <= %s" % (values[0], [hex(i) for i in values[1:]]))
+                print("\t$%02X <= %s" % (register, [hex(i) for i in buffer[1:length:2]]))
 
     def _set_spi_mem_page(self, register: int) -> None:
         spi_mem_page = 0x00
         if register < 0x80:
             spi_mem_page = 0x10
-        self._write(_BME680_REG_STATUS, [spi_mem_page])
+        # The page only changes when we write it, so skip the write if it is already set
+        if spi_mem_page != self._spi_mem_page:
+            self._spi_mem_page = spi_mem_page
+            # Bypasses the write queue, which may hold the burst this page is set for
+            self._page_buffer[1] = spi_mem_page
+            self._write_pairs(self._page_buffer, 2)
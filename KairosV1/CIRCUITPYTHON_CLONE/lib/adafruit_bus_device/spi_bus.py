@@ -0,0 +1,174 @@
+# SPDX-FileCopyrightText: 2016 Scott Shawcroft for Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+# pylint: disable=too-few-public-methods
+
+"""
+`adafruit_bus_device.spi_bus` - Shared SPI Bus
+====================================================
+"""
+
+import time
+
+try:
+    from typing import Dict, List, Optional, Type
+    from types import TracebackType
+
+    # Used only for type annotations.
+    from busio import SPI
+    from adafruit_bus_device.spi_device import SPIDevice
+except ImportError:
+    pass
+
+
+__version__ = "0.0.0+auto.0"
+__repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_BusDevice.git"
+
+
+class _BusHold:
+    """Context manager returned by `SPIBus.hold`"""
+
+    def __init__(self, bus: "SPIBus") -> None:
+        self._bus = bus
+
+    def __enter__(self) -> "SPIBus":
+        bus = self._bus
+        if not bus._held:
+            while not bus.spi.try_lock():
+                time.sleep(0)
+        bus._held += 1
+        return bus
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[type]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> bool:
+        bus = self._bus
+        bus._held -= 1
+        if not bus._held:
+            bus.spi.unlock()
+        return False
+
+
+class SPIBus:
+    """
+    A `busio.SPI` shared by several devices. Pass it to drivers in place of the
+    `busio.SPI`: their `SPIDevice` objects then lock the bus through it, and it only
+    calls ``configure()`` when a device needs a different baudrate, polarity or phase
+    than the bus is already set to.
+
+    Every device on the bus must go through the `SPIBus`. Call `invalidate` if
+    anything else configures the `busio.SPI` directly.
+
+    :param ~busio.SPI spi: The SPI bus to share
+    :param bool track_occupancy: Record how long and how often each device holds the
+        bus, in `occupancy`. Defaults to False, since timing allocates a long integer
+        per transaction.
+
+    .. note:: This class is **NOT** built into CircuitPython. See
+      :ref:`here for install instructions <bus_device_installation>`.
+
+    Example:
+
+    .. code-block:: python
+
+        import busio
+        from board import *
+        from adafruit_bus_device.spi_bus import SPIBus
+
+        spi_bus = SPIBus(busio.SPI(SCK, MOSI, MISO))
+        display = adafruit_ssd1306.SSD1306_SPI(128, 64, spi_bus, dc, reset, display_cs)
+        sdcard = adafruit_sdcard.SDCard(spi_bus, sd_cs)
+        # Lock and configure the bus once for all the transactions of show()
+        with spi_bus.hold():
+            display.show()
+    """
+
+    def __init__(self, spi: SPI, *, track_occupancy: bool = False) -> None:
+        self.spi = spi
+        self.track_occupancy = track_occupancy
+        self.configures = 0
+        """Number of ``configure()`` calls made on the bus."""
+        self.configures_skipped = 0
+        """Number of ``configure()`` calls skipped as the bus was already set up."""
+        self.occupancy = {}  # type: Dict[object, List[int]]
+        """Nanoseconds held and transaction count, as a two item list per chip select
+        pin, when ``track_occupancy`` is set."""
+        self._held = 0
+        self._hold = _BusHold(self)
+        self._entered = 0
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Forget the bus configuration, so the next device configures it again"""
+        self._baudrate = None
+        self._polarity = None
+        self._phase = None
+
+    def hold(self) -> _BusHold:
+        """
+        Context manager that keeps the bus locked for the transactions inside its
+        ``with`` block, so devices do not lock and unlock it for each one. Holds can be
+        nested.
+        """
+        return self._hold
+
+    def acquire(self, device: "SPIDevice") -> SPI:
+        """Lock the bus for ``device`` unless it is held, and configure it for the
+        device if needed. Called by `SPIDevice` on entry."""
+        spi = self.spi
+        if not self._held:
+            while not spi.try_lock():
+                time.sleep(0)
+        if (
+            device.baudrate != self._baudrate
+            or device.polarity != self._polarity
+            or device.phase != self._phase
+        ):
+            spi.configure(
+                baudrate=device.baudrate, polarity=device.polarity, phase=device.phase
+            )
+            self._baudrate = device.baudrate
+            self._polarity = device.polarity
+            self._phase = device.phase
+            self.configures += 1
+        else:
+            self.configures_skipped += 1
+        if self.track_occupancy:
+            self._entered = time.monotonic_ns()
+        return spi
+
+    def release(self, device: "SPIDevice") -> None:
+        """Unlock the bus after ``device`` is done with it, unless it is held. Called by
+        `SPIDevice` on exit."""
+        if self.track_occupancy:
+            held = time.monotonic_ns() - self._entered
+            record = self.occupancy.get(device.chip_select)
+            if record is None:
+                self.occupancy[device.chip_select] = [held, 1]
+            else:
+                record[0] += held
+                record[1] += 1
+        if not self._held:
+            self.spi.unlock()
+
+    def report(self, names: Optional[Dict[object, str]] = None) -> str:
+        """The bus time and transaction count of each device, one device per line,
+        followed by the configure calls made and skipped
+
+        :param dict names: Device names by chip select pin, for the report
+        """
+        lines = []
+        for chip_select, (held, transactions) in self.occupancy.items():
+            name = names.get(chip_select) if names else None
+            lines.append(
+                "%-10s %8.1f ms %6d transactions"
+                % (name or chip_select, held / 1000000, transactions)
+            )
+        lines.append(
+            "configure  %d made, %d skipped" % (self.configures, self.configures_skipped)
+        )
+        return "\n".join(lines)
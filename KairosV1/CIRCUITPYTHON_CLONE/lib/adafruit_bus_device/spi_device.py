@@ -12,12 +12,13 @@
 import time
 
 try:
-    from typing import Optional, Type
+    from typing import Optional, Type, Union
     from types import TracebackType
 
     # Used only for type annotations.
     from busio import SPI
     from digitalio import DigitalInOut
+    from adafruit_bus_device.spi_bus import SPIBus
 except ImportError:
     pass
 
@@ -31,7 +32,9 @@ class SPIDevice:
     Represents a single SPI device and manages locking the bus and the device
     address.
 
-    :param ~busio.SPI spi: The SPI bus the device is on
+    :param ~busio.SPI spi: The SPI bus the device is on, or an
+        `~adafruit_bus_device.spi_bus.SPIBus` sharing it. With an ``SPIBus``, the bus is
+        only reconfigured when the previous device used different settings.
     :param ~digitalio.DigitalInOut chip_select: The chip select pin object that implements the
         DigitalInOut API.
     :param bool cs_active_value: Set to True if your device requires CS to be active high.
@@ -72,7 +75,7 @@ class SPIDevice:
 
     def __init__(
         self,
-        spi: SPI,
+        spi: Union[SPI, "SPIBus"],
         chip_select: Optional[DigitalInOut] = None,
         *,
         cs_active_value: bool = False,
@@ -81,7 +84,9 @@ class SPIDevice:
         phase: int = 0,
         extra_clocks: int = 0
     ) -> None:
-        self.spi = spi
+        # An SPIBus hands out its busio.SPI; self.spi is always the busio.SPI
+        self._bus = spi if hasattr(spi, "acquire") else None
+        self.spi = spi.spi if self._bus else spi
         self.baudrate = baudrate
         self.polarity = polarity
         self.phase = phase
@@ -92,11 +97,14 @@ class SPIDevice:
             self.chip_select.switch_to_output(value=not self.cs_active_value)
 
     def __enter__(self) -> SPI:
-        while not self.spi.try_lock():
-            time.sleep(0)
-        self.spi.configure(
-            baudrate=self.baudrate, polarity=self.polarity, phase=self.phase
-        )
+        if self._bus:
+            self._bus.acquire(self)
+        else:
+            while not self.spi.try_lock():
+                time.sleep(0)
+            self.spi.configure(
+                baudrate=self.baudrate, polarity=self.polarity, phase=self.phase
+            )
         if self.chip_select:
             self.chip_select.value = self.cs_active_value
         return self.spi
@@ -117,5 +125,8 @@ class SPIDevice:
                 clocks += 1
             for _ in range(clocks):
                 self.spi.write(buf)
-        self.spi.unlock()
+        if self._bus:
+            self._bus.release(self)
+        else:
+            self.spi.unlock()
         return False
@@ -27,14 +27,26 @@ Implementation Notes
 """
 
 import time
+from collections import namedtuple
 from micropython import const
 from adafruit_bus_device import i2c_device
-from adafruit_register.i2c_struct import ROUnaryStruct, UnaryStruct
-from adafruit_register.i2c_bit import RWBit
-from adafruit_register.i2c_bits import RWBits
+from adafruit_register.i2c_prealloc import (
+    ROUnaryStruct,
+    RWBit,
+    RWBits,
+    UnaryStruct,
+    clear_shadow,
+)
+from adafruit_register.i2c_register_block import (
+    RegisterBlock,
+    RegisterSnapshot,
+    SnapshotBit,
+    SnapshotBits,
+    SnapshotStruct,
+)
 
 try:
-    from typing import Tuple
+    from typing import Optional, Tuple
     from busio import I2C
 except ImportError:
     pass
@@ -65,6 +77,43 @@ _integration_times = (100, 50, 200, 400, 150, 250, 300, 350)
 # valid measurement rates
 _measurement_rates = (50, 100, 200, 500, 1000, 2000, 2000, 2000)
 
+# Auto-ranging steps as (gain, integration time), from least to most sensitive. Gain is
+# raised first since it costs no time; integration only grows once gain is at its maximum.
+_AUTO_RANGE_STEPS = (
+    (1, 50),
+    (2, 50),
+    (4, 50),
+    (8, 50),
+    (48, 50),
+    (96, 50),
+    (96, 100),
+    (96, 200),
+    (96, 400),
+)
+_AUTO_RANGE_HIGH = const(48000)  # counts above which a step is too sensitive
+_AUTO_RANGE_LOW = const(2000)  # counts below which integration is lengthened
+
+LTR329Sample = namedtuple(
+    "LTR329Sample", ("visible_plus_ir", "ir", "gain", "integration_time")
+)
+"""Both light channels from the same integration, with the gain and integration time
+in milliseconds they were measured with."""
+
+
+class _LTR329Status(RegisterSnapshot):
+    """Fields of the status register"""
+
+    data_invalid = SnapshotBit(_LTR329_REG_STATUS, 7)
+    data_gain_range = SnapshotBits(3, _LTR329_REG_STATUS, 4)
+    new_data = SnapshotBit(_LTR329_REG_STATUS, 2)
+
+
+class _LTR329Measurement(_LTR329Status):
+    """Both channels and the status register that follows them"""
+
+    ir = SnapshotStruct(_LTR329_REG_CHANNEL1, "<H")
+    visible_plus_ir = SnapshotStruct(_LTR329_REG_CHANNEL0, "<H")
+
 
 class LTR329:
     """Base driver for the LTR-329 light sensor.
@@ -77,22 +126,29 @@ class LTR329:
     manufacturer_id = ROUnaryStruct(_LTR329_REG_MANUID, "<B")
     # both channels must be read at once!
     _light_data = ROUnaryStruct(_LTR329_REG_CHANNEL1, "<I")
-    # Control register bits
+    # Control register bits. Only the driver writes the control and measurement rate
+    # registers, so they are shadowed and a setting costs one write.
     _reset = RWBit(_LTR329_REG_ALS_CONTR, 1)
-    _als_gain = RWBits(3, _LTR329_REG_ALS_CONTR, 2)
-    active_mode = RWBit(_LTR329_REG_ALS_CONTR, 0)
+    _als_gain = RWBits(3, _LTR329_REG_ALS_CONTR, 2, shadowed=True)
+    active_mode = RWBit(_LTR329_REG_ALS_CONTR, 0, shadowed=True)
     # measurement rate register bits
-    _integration_time = RWBits(3, _LTR329_REG_ALS_MEASRATE, 3)
-    _measurement_rate = RWBits(3, _LTR329_REG_ALS_MEASRATE, 0)
-    # status register bits
+    _integration_time = RWBits(3, _LTR329_REG_ALS_MEASRATE, 3, shadowed=True)
+    _measurement_rate = RWBits(3, _LTR329_REG_ALS_MEASRATE, 0, shadowed=True)
+    # status register bits, changed by the sensor and never shadowed
     als_data_invalid = RWBit(_LTR329_REG_STATUS, 7)
-    _als_data_gain_range = RWBits(3, _LTR329_REG_STATUS, 4)
     new_als_data_available = RWBit(_LTR329_REG_STATUS, 2)
+    # All status fields from one read, and both channels (IR first, as the sensor
+    # requires) with the status after them from one burst
+    _status = RegisterBlock(_LTR329_REG_STATUS, 1, _LTR329Status)
+    _measurement = RegisterBlock(_LTR329_REG_CHANNEL1, 5, _LTR329Measurement)
 
     def __init__(self, i2c: I2C, address: int = _LTR329_I2CADDR_DEFAULT) -> None:
         self.i2c_device = i2c_device.I2CDevice(i2c, address)
         if self.part_id != 0xA0 or self.manufacturer_id != 0x05:
             raise RuntimeError("Unable to find LTR-329, check your wiring")
+        self._sample = None
+        self._stale_samples = 0
+        self._ranged_sample = None
         self.reset()
         self.active_mode = True
 
@@ -100,6 +156,13 @@ class LTR329:
         """Reset the sensor to the default state set by the library"""
         self._reset = True
         time.sleep(0.010)
+        # The reset put every register back to its default
+        clear_shadow(self)
+        # Kept for read_sample(), which would otherwise read it on every sample
+        self._sample_integration_time = _integration_times[self._integration_time]
+        self._sample = None
+        self._stale_samples = 0
+        self._ranged_sample = None
 
     @property
     def als_gain(self) -> int:
@@ -116,7 +179,7 @@ class LTR329:
     def als_data_gain(self) -> int:
         """ALS gain for data that is being read now,
         can be: 1, 2, 4, 8, 48 or 96 times"""
-        return _als_gains[self._als_data_gain_range]
+        return _als_gains[self._status.data_gain_range]
 
     @property
     def integration_time(self) -> int:
@@ -132,6 +195,7 @@ class LTR329:
                 "200, 250, 300, 350, or 400 milliseconds"
             )
         self._integration_time = _integration_times.index(int_time)
+        self._sample_integration_time = int_time
 
     @property
     def measurement_rate(self) -> int:
@@ -147,6 +211,76 @@ class LTR329:
             )
         self._measurement_rate = _measurement_rates.index(rate)
 
+    def read_sample(self) -> LTR329Sample:
+        """Both light channels from the same integration, read in one burst. The status
+        register is checked first, and the last sample is returned again without
+        reading the channels when no new integration has finished since.
+
+        :return: A `LTR329Sample` of (visible_plus_ir, ir, gain, integration_time)
+        """
+        # Reading the channels marks the data as old, so whether there is new data
+        # can only be told from a status read before them
+        status = self._status
+        if status.data_invalid:
+            self.throw_out_reading()
+            raise ValueError("Data invalid / over-run!")
+        if self._sample is not None and not status.new_data:
+            return self._sample
+        measurement = self._measurement
+        if measurement.data_invalid:
+            raise ValueError("Data invalid / over-run!")
+        if self._stale_samples and self._sample is not None:
+            # Integrated with the settings from before auto_range() changed them
+            self._stale_samples -= 1
+            return self._sample
+        self._sample = LTR329Sample(
+            measurement.visible_plus_ir,
+            measurement.ir,
+            _als_gains[measurement.data_gain_range],
+            self._sample_integration_time,
+        )
+        return self._sample
+
+    def auto_range(self, sample: Optional[LTR329Sample]) -> bool:
+        """Pick the gain and integration time for the next samples from the counts of
+        ``sample``. Gain is raised as far as it can go without nearing saturation, and
+        integration is only lengthened past 50ms when the counts are still low, so the
+        measurement rate stays as fast as the light allows.
+
+        :param sample: The last `read_sample`, or `None` if it raised `ValueError`
+          because the data was invalid, which drops to the least sensitive setting
+        :return: True if the settings were changed
+        """
+        if sample is None:
+            step = _AUTO_RANGE_STEPS[0]
+        elif sample is self._ranged_sample:
+            # Repeated while there is no new data, or while a stale sample is discarded
+            return False
+        else:
+            self._ranged_sample = sample
+            # Counts per unit of gain x integration time
+            rate = max(sample.visible_plus_ir, sample.ir) / (
+                sample.gain * sample.integration_time
+            )
+            step = _AUTO_RANGE_STEPS[0]
+            for gain, int_time in _AUTO_RANGE_STEPS:
+                if rate * gain * int_time > _AUTO_RANGE_HIGH:
+                    break
+                if int_time > step[1] and rate * step[0] * step[1] >= _AUTO_RANGE_LOW:
+                    break
+                step = (gain, int_time)
+        if step == (self.als_gain, self._sample_integration_time):
+            return False
+        self.als_gain, self.integration_time = step
+        # The measurement rate must not be shorter than the integration time
+        for measurement_rate in _measurement_rates:
+            if measurement_rate >= step[1]:
+                self.measurement_rate = measurement_rate
+                break
+        # A conversion that was already running finishes with the old settings
+        self._stale_samples = 1
+        return True
+
     def throw_out_reading(self) -> None:
         """Throw out a reading (typically done to clear it out)"""
         _ = self._light_data
@@ -154,26 +288,26 @@ class LTR329:
     @property
     def light_channels(self) -> Tuple[int, int]:
         """A data pair of both visible+IR light, and the IR-only light"""
-        temp = self._light_data
-        if self.als_data_invalid:
+        measurement = self._measurement
+        if measurement.data_invalid:
             raise ValueError("Data invalid / over-run!")
-        return (temp >> 16, temp & 0xFFFF)
+        return (measurement.visible_plus_ir, measurement.ir)
 
     @property
     def visible_plus_ir_light(self) -> int:
         """The visible + IR light data"""
-        if self.als_data_invalid:
-            _ = self._light_data  # read data to clear it out
+        measurement = self._measurement
+        if measurement.data_invalid:
             raise ValueError("Data invalid / over-run!")
-        return self._light_data >> 16
+        return measurement.visible_plus_ir
 
     @property
     def ir_light(self) -> int:
         """The IR light data"""
-        if self.als_data_invalid:
-            _ = self._light_data  # read data to clear it out
+        measurement = self._measurement
+        if measurement.data_invalid:
             raise ValueError("Data invalid / over-run!")
-        return self._light_data & 0xFFFF
+        return measurement.ir
 
 
 class LTR303(LTR329):
@@ -183,13 +317,19 @@ class LTR303(LTR329):
     :param int address: The I2C device address. Defaults to :const:`0x29`
     """
 
-    _enable_int = RWBit(_LTR303_REG_INTERRUPT, 1)
-    _int_polarity = RWBit(_LTR303_REG_INTERRUPT, 2)
+    _enable_int = RWBit(_LTR303_REG_INTERRUPT, 1, shadowed=True)
+    _int_polarity = RWBit(_LTR303_REG_INTERRUPT, 2, shadowed=True)
     # The high and low int thresholds
     threshold_high = UnaryStruct(_LTR303_REG_THRESHHIGH_LSB, "<H")
     threshold_low = UnaryStruct(_LTR303_REG_THRESHLOW_LSB, "<H")
 
-    _int_persistence = RWBits(4, _LTR303_REG_INTPERSIST, 0)
+    _int_persistence = RWBits(4, _LTR303_REG_INTPERSIST, 0, shadowed=True)
+
+    def __init__(self, i2c: I2C, address: int = _LTR329_I2CADDR_DEFAULT) -> None:
+        # The high threshold register and both thresholds, for set_threshold_window()
+        self._threshold_buffer = bytearray(5)
+        self._threshold_buffer[0] = _LTR303_REG_THRESHHIGH_LSB
+        super().__init__(i2c, address)
 
     @property
     def int_persistence(self) -> int:
@@ -234,3 +374,27 @@ class LTR303(LTR329):
         self._int_polarity = pol
         # and reset the mode
         self.active_mode = curr_mode
+
+    def set_threshold_window(self, level: int, margin: float = 0.25) -> None:
+        """Program :attr:`threshold_low` and :attr:`threshold_high` to a window around
+        ``level`` counts of the visible + IR channel, in one I2C write. With
+        :attr:`enable_int` set, the INT pin then only fires once the light leaves the
+        window, so it does not have to be polled.
+
+        :param int level: The window center, usually ``visible_plus_ir`` of the last
+          `read_sample`. After `auto_range` changed the settings, take it from the
+          first sample with the new ones, as the counts of earlier ones are on another
+          scale.
+        :param float margin: Half the window width, as a fraction of ``level``
+        """
+        spread = max(int(level * margin), 1)
+        high = min(level + spread, 0xFFFF)
+        low = max(level - spread, 0)
+        # The high threshold registers are directly followed by the low ones
+        buffer = self._threshold_buffer
+        buffer[1] = high & 0xFF
+        buffer[2] = high >> 8
+        buffer[3] = low & 0xFF
+        buffer[4] = low >> 8
+        with self.i2c_device as i2c:
+            i2c.write(buffer)
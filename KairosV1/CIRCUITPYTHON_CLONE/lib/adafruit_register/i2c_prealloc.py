@@ -0,0 +1,440 @@
+# pylint: disable=too-few-public-methods
+
+"""
+`adafruit_register.i2c_prealloc`
+====================================================
+
+Allocation free variants of the struct and multi bit registers
+
+Drop-in replacements for `i2c_struct.UnaryStruct`, `i2c_struct.Struct`,
+`i2c_bit.RWBit`, `i2c_bits.RWBits` and `i2c_struct_array.StructArray` that work out
+sizes, masks and byte order once when the descriptor is created and reuse one
+buffer per descriptor, so an access does not allocate on the heap. Single integer
+values are decoded straight from the buffer instead of through a `struct.unpack_from`
+tuple.
+
+`RWBit` and `RWBits` can also shadow their register on the device object, which
+turns a read-modify-write into a single write once the register has been read.
+
+As with `i2c_struct.Struct`, the buffer is shared by every instance of the driver
+class, so accesses must not be interleaved across threads (CircuitPython has none).
+"""
+
+__version__ = "0.0.0+auto.0"
+__repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_Register.git"
+
+import struct
+import sys
+
+try:
+    from typing import Optional, Type, Tuple, Any, NoReturn
+    from circuitpython_typing.device_drivers import I2CDeviceDriver
+except ImportError:
+    pass
+
+# Integer format characters that are decoded without `struct`
+_INT_FORMATS = "bBhHiIlLqQ"
+
+
+def _byte_order(size: int, little_endian: bool) -> Tuple[int, ...]:
+    """Buffer indices of a ``size`` byte value after the register address byte, most
+    significant first"""
+    if little_endian:
+        return tuple(range(size, 0, -1))
+    return tuple(range(1, size + 1))
+
+
+def _int_layout(struct_format: str) -> Optional[Tuple[Tuple[int, ...], int]]:
+    """The byte order (as for `_decode`) and sign bit of a single integer struct format,
+    or None if ``struct_format`` is anything else"""
+    code = struct_format[-1]
+    prefix = struct_format[:-1]
+    if code not in _INT_FORMATS or prefix not in ("", "@", "=", "<", ">", "!"):
+        return None
+    if prefix in ("<", ">", "!"):
+        little_endian = prefix == "<"
+    else:
+        little_endian = sys.byteorder == "little"
+    size = struct.calcsize(struct_format)
+    return _byte_order(size, little_endian), (1 << (size * 8 - 1)) if code.islower() else 0
+
+
+def _decode(
+    buffer: bytearray, order: Tuple[int, ...], sign_bit: int, offset: int = 0
+) -> int:
+    """The integer held in ``buffer`` at the indices in ``order``, moved by ``offset``"""
+    value = 0
+    for i in order:
+        value = (value << 8) | buffer[offset + i]
+    # If the value is signed and negative, convert it
+    if value & sign_bit:
+        value -= 2 * sign_bit
+    return value
+
+
+class Struct:
+    """
+    Arbitrary structure register that is readable and writeable.
+
+    Values are tuples that map to the values in the defined struct.  See struct
+    module documentation for struct format string and its possible value types.
+
+    :param int register_address: The register address to read the bit from
+    :param str struct_format: The struct format string for this register.
+    """
+
+    def __init__(self, register_address: int, struct_format: str) -> None:
+        self.format = struct_format
+        self.buffer = bytearray(1 + struct.calcsize(self.format))
+        self.buffer[0] = register_address
+
+    def __get__(
+        self,
+        obj: Optional[I2CDeviceDriver],
+        objtype: Optional[Type[I2CDeviceDriver]] = None,
+    ) -> Tuple:
+        with obj.i2c_device as i2c:
+            i2c.write_then_readinto(self.buffer, self.buffer, out_end=1, in_start=1)
+        return struct.unpack_from(self.format, self.buffer, 1)
+
+    def __set__(self, obj: I2CDeviceDriver, value: Tuple) -> None:
+        struct.pack_into(self.format, self.buffer, 1, *value)
+        with obj.i2c_device as i2c:
+            i2c.write(self.buffer)
+
+
+class UnaryStruct:
+    """
+    Arbitrary single value structure register that is readable and writeable.
+
+    Values map to the first value in the defined struct.  See struct
+    module documentation for struct format string and its possible value types.
+
+    :param int register_address: The register address to read the bit from
+    :param str struct_format: The struct format string for this register.
+    """
+
+    def __init__(self, register_address: int, struct_format: str) -> None:
+        self.format = struct_format
+        self.address = register_address
+        self.buffer = bytearray(1 + struct.calcsize(struct_format))
+        self.buffer[0] = register_address
+        # Integers are decoded from the buffer directly, anything else through struct
+        self._order, self._sign_bit = _int_layout(struct_format) or (None, 0)
+
+    def __get__(
+        self,
+        obj: Optional[I2CDeviceDriver],
+        objtype: Optional[Type[I2CDeviceDriver]] = None,
+    ) -> Any:
+        buf = self.buffer
+        with obj.i2c_device as i2c:
+            i2c.write_then_readinto(buf, buf, out_end=1, in_start=1)
+        if self._order is None:
+            return struct.unpack_from(self.format, buf, 1)[0]
+        return _decode(buf, self._order, self._sign_bit)
+
+    def __set__(self, obj: I2CDeviceDriver, value: Any) -> None:
+        struct.pack_into(self.format, self.buffer, 1, value)
+        with obj.i2c_device as i2c:
+            i2c.write(self.buffer)
+
+
+class ROUnaryStruct(UnaryStruct):
+    """
+    Arbitrary single value structure register that is read-only.
+
+    Values map to the first value in the defined struct.  See struct
+    module documentation for struct format string and its possible value types.
+
+    :param int register_address: The register address to read the bit from
+    :param type struct_format: The struct format string for this register.
+    """
+
+    def __set__(self, obj: I2CDeviceDriver, value: Any) -> NoReturn:
+        raise AttributeError()
+
+
+def clear_shadow(obj: I2CDeviceDriver) -> None:
+    """Forget every register value shadowed for ``obj``. Call it when the registers
+    changed behind the shadowed descriptors, e.g. after a soft reset of the device.
+
+    :param object obj: The device object whose shadow to clear
+    """
+    shadow = getattr(obj, "_register_shadow", None)
+    if shadow:
+        shadow.clear()
+
+
+class _Register:
+    """
+    Whole register read and written as one `int`, the base of `RWBit` and `RWBits`.
+
+    With ``shadowed``, the last value read or written is kept in a dict on the device
+    object, keyed by register address, and later reads and read-modify-writes use it
+    instead of the bus. Only shadow registers that nothing but the driver changes;
+    status and data registers must not be shadowed. All shadowed descriptors of one
+    address must have the same ``register_width``.
+
+    :param int register_address: The register address to read the bit from
+    :param int register_width: The number of bytes in the register.
+    :param bool lsb_first: Is the first byte we read from I2C the LSB?
+    :param bool shadowed: Keep a copy of the register on the device object
+    """
+
+    def __init__(
+        self,
+        register_address: int,
+        register_width: int,
+        lsb_first: bool,
+        shadowed: bool,
+    ) -> None:
+        self.address = register_address
+        self.buffer = bytearray(1 + register_width)
+        self.buffer[0] = register_address
+        self.lsb_first = lsb_first
+        self.shadowed = shadowed
+        self._order = _byte_order(register_width, lsb_first)
+        self._write_order = tuple(reversed(self._order))
+
+    def _read_register(self, obj: I2CDeviceDriver) -> int:
+        if self.shadowed:
+            shadow = getattr(obj, "_register_shadow", None)
+            if shadow is None:
+                shadow = obj._register_shadow = {}
+            reg = shadow.get(self.address)
+            if reg is not None:
+                return reg
+        with obj.i2c_device as i2c:
+            i2c.write_then_readinto(self.buffer, self.buffer, out_end=1, in_start=1)
+        reg = _decode(self.buffer, self._order, 0)
+        if self.shadowed:
+            shadow[self.address] = reg
+        return reg
+
+    def _write_register(self, obj: I2CDeviceDriver, reg: int) -> None:
+        buf = self.buffer
+        value = reg
+        for i in self._write_order:
+            buf[i] = value & 0xFF
+            value >>= 8
+        with obj.i2c_device as i2c:
+            i2c.write(buf)
+        shadow = getattr(obj, "_register_shadow", None)
+        if self.shadowed:
+            shadow[self.address] = reg
+        elif shadow:
+            # Written around the shadow, which no longer matches the device
+            shadow.pop(self.address, None)
+
+
+class RWBit(_Register):
+    """
+    Single bit register that is readable and writeable.
+
+    Values are `bool`
+
+    :param int register_address: The register address to read the bit from
+    :param int bit: The bit index within the byte at ``register_address``
+    :param int register_width: The number of bytes in the register. Defaults to 1.
+    :param bool lsb_first: Is the first byte we read from I2C the LSB? Defaults to true
+    :param bool shadowed: Keep a copy of the register on the device object, so reads
+      and writes after the first do not read the device. Defaults to false
+
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        register_address: int,
+        bit: int,
+        register_width: int = 1,
+        lsb_first: bool = True,
+        shadowed: bool = False,
+    ) -> None:
+        super().__init__(register_address, register_width, lsb_first, shadowed)
+        self.bit_mask = 1 << bit
+
+    def __get__(
+        self,
+        obj: Optional[I2CDeviceDriver],
+        objtype: Optional[Type[I2CDeviceDriver]] = None,
+    ) -> bool:
+        return bool(self._read_register(obj) & self.bit_mask)
+
+    def __set__(self, obj: I2CDeviceDriver, value: bool) -> None:
+        reg = self._read_register(obj)
+        if value:
+            reg |= self.bit_mask
+        else:
+            reg &= ~self.bit_mask
+        self._write_register(obj, reg)
+
+
+class ROBit(RWBit):
+    """Single bit register that is read only. Subclass of `RWBit`.
+
+    Values are `bool`
+
+    :param int register_address: The register address to read the bit from
+    :param type bit: The bit index within the byte at ``register_address``
+    :param int register_width: The number of bytes in the register. Defaults to 1.
+
+    """
+
+    def __set__(self, obj: I2CDeviceDriver, value: bool) -> NoReturn:
+        raise AttributeError()
+
+
+class RWBits(_Register):
+    """
+    Multibit register (less than a full byte) that is readable and writeable.
+    This must be within a byte register.
+
+    Values are `int` between 0 and 2 ** ``num_bits`` - 1.
+
+    :param int num_bits: The number of bits in the field.
+    :param int register_address: The register address to read the bit from
+    :param int lowest_bit: The lowest bits index within the byte at ``register_address``
+    :param int register_width: The number of bytes in the register. Defaults to 1.
+    :param bool lsb_first: Is the first byte we read from I2C the LSB? Defaults to true
+    :param bool signed: If True, the value is a "two's complement" signed value.
+                        If False, it is unsigned.
+    :param bool shadowed: Keep a copy of the register on the device object, so reads
+      and writes after the first do not read the device. Defaults to false
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        num_bits: int,
+        register_address: int,
+        lowest_bit: int,
+        register_width: int = 1,
+        lsb_first: bool = True,
+        signed: bool = False,
+        shadowed: bool = False,
+    ) -> None:
+        self.bit_mask = ((1 << num_bits) - 1) << lowest_bit
+        if self.bit_mask >= 1 << (register_width * 8):
+            raise ValueError("Cannot have more bits than register size")
+        super().__init__(register_address, register_width, lsb_first, shadowed)
+        self.lowest_bit = lowest_bit
+        self.sign_bit = (1 << (num_bits - 1)) if signed else 0
+
+    def __get__(
+        self,
+        obj: Optional[I2CDeviceDriver],
+        objtype: Optional[Type[I2CDeviceDriver]] = None,
+    ) -> int:
+        reg = (self._read_register(obj) & self.bit_mask) >> self.lowest_bit
+        # If the value is signed and negative, convert it
+        if reg & self.sign_bit:
+            reg -= 2 * self.sign_bit
+        return reg
+
+    def __set__(self, obj: I2CDeviceDriver, value: int) -> None:
+        value = (value << self.lowest_bit) & self.bit_mask
+        self._write_register(obj, (self._read_register(obj) & ~self.bit_mask) | value)
+
+
+class ROBits(RWBits):
+    """
+    Multibit register (less than a full byte) that is read-only. This must be
+    within a byte register.
+
+    Values are `int` between 0 and 2 ** ``num_bits`` - 1.
+
+    :param int num_bits: The number of bits in the field.
+    :param int register_address: The register address to read the bit from
+    :param type lowest_bit: The lowest bits index within the byte at ``register_address``
+    :param int register_width: The number of bytes in the register. Defaults to 1.
+    """
+
+    def __set__(self, obj: I2CDeviceDriver, value: int) -> NoReturn:
+        raise AttributeError()
+
+
+class _BoundStructArray:
+    """
+    Array object that `StructArray` constructs on demand.
+
+    :param object obj: The device object to bind to. It must have a `i2c_device` attribute
+    :param int register_address: The register address to read the bit from
+    :param str struct_format: The struct format string for each register element
+    :param int count: Number of elements in the array
+    """
+
+    def __init__(
+        self,
+        obj: I2CDeviceDriver,
+        register_address: int,
+        struct_format: str,
+        count: int,
+    ) -> None:
+        self.format = struct_format
+        self.first_register = register_address
+        self.obj = obj
+        self.count = count
+        self.size = struct.calcsize(struct_format)
+        # Kept for the life of the driver, unlike i2c_struct_array which builds one
+        # for every access
+        self.buffer = bytearray(self.size + 1)
+
+    def _get_buffer(self, index: int) -> bytearray:
+        """Shared bounds checking and buffer addressing."""
+        if not 0 <= index < self.count:
+            raise IndexError()
+        self.buffer[0] = self.first_register + self.size * index
+        return self.buffer
+
+    def __getitem__(self, index: int) -> Tuple:
+        buf = self._get_buffer(index)
+        with self.obj.i2c_device as i2c:
+            i2c.write_then_readinto(buf, buf, out_end=1, in_start=1)
+        return struct.unpack_from(self.format, buf, 1)  # offset=1
+
+    def __setitem__(self, index: int, value: Tuple) -> None:
+        buf = self._get_buffer(index)
+        struct.pack_into(self.format, buf, 1, *value)
+        with self.obj.i2c_device as i2c:
+            i2c.write(buf)
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class StructArray:
+    """
+    Repeated array of structured registers that are readable and writeable.
+
+    Based on the index, values are offset by the size of the structure.
+
+    Values are tuples that map to the values in the defined struct.  See struct
+    module documentation for struct format string and its possible value types.
+
+    .. note:: This assumes the device addresses correspond to 8-bit bytes. This is not suitable for
+      devices with registers of other widths such as 16-bit.
+
+    :param int register_address: The register address to begin reading the array from
+    :param str struct_format: The struct format string for this register.
+    :param int count: Number of elements in the array
+    """
+
+    def __init__(self, register_address: int, struct_format: str, count: int) -> None:
+        self.format = struct_format
+        self.address = register_address
+        self.count = count
+        self.array_id = "_structarray{}".format(register_address)
+
+    def __get__(
+        self,
+        obj: Optional[I2CDeviceDriver],
+        objtype: Optional[Type[I2CDeviceDriver]] = None,
+    ) -> _BoundStructArray:
+        # The bound array is cached on the object itself, so its buffer lives as long
+        # as the driver does
+        try:
+            return getattr(obj, self.array_id)
+        except AttributeError:
+            bound = _BoundStructArray(obj, self.address, self.format, self.count)
+            setattr(obj, self.array_id, bound)
+            return bound
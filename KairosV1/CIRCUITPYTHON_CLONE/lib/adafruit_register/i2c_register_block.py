@@ -0,0 +1,210 @@
+# pylint: disable=too-few-public-methods
+
+"""
+`adafruit_register.i2c_register_block`
+====================================================
+
+Blocks of contiguous registers read in one transaction
+
+A `RegisterBlock` reads its whole address range in a single burst into a buffer kept
+for the device, and returns a `RegisterSnapshot` whose `SnapshotBit`, `SnapshotBits`
+and `SnapshotStruct` fields decode that buffer without touching the bus. Status and
+data registers that sit next to each other then cost one transaction instead of one
+per field.
+
+.. code-block:: python
+
+    class _Measurement(RegisterSnapshot):
+        ir = SnapshotStruct(0x88, "<H")
+        visible_plus_ir = SnapshotStruct(0x8A, "<H")
+        invalid = SnapshotBit(0x8C, 7)
+
+    class Sensor:
+        _measurement = RegisterBlock(0x88, 5, _Measurement)
+
+        @property
+        def light(self):
+            measurement = self._measurement  # one burst read of 0x88 to 0x8C
+            if measurement.invalid:
+                raise ValueError("Data invalid")
+            return measurement.visible_plus_ir
+"""
+
+__version__ = "0.0.0+auto.0"
+__repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_Register.git"
+
+import struct
+
+from adafruit_register.i2c_prealloc import _byte_order, _decode, _int_layout
+
+try:
+    from typing import Optional, Type, Any, NoReturn
+    from circuitpython_typing.device_drivers import I2CDeviceDriver
+except ImportError:
+    pass
+
+
+class RegisterSnapshot:
+    """
+    The registers of a `RegisterBlock` as last read, decoded by the `SnapshotBit`,
+    `SnapshotBits` and `SnapshotStruct` fields of a subclass.
+
+    :param int register_address: The first register of the block
+    :param int length: The number of registers in the block
+    """
+
+    def __init__(self, register_address: int, length: int) -> None:
+        self.first_register = register_address
+        self.buffer = bytearray(1 + length)
+        self.buffer[0] = register_address
+
+
+class RegisterBlock:
+    """
+    Block of contiguous registers that is read in one transaction.
+
+    Reading the attribute reads the whole block and returns the snapshot of the device,
+    an instance of ``snapshot_class`` created on first use and reused by every read
+    after, so its fields change with the next read of the block.
+
+    .. note:: This assumes the device auto-increments the register address through the
+      block on reads.
+
+    :param int register_address: The first register of the block
+    :param int length: The number of registers in the block
+    :param type snapshot_class: The `RegisterSnapshot` subclass declaring the fields
+    """
+
+    def __init__(
+        self,
+        register_address: int,
+        length: int,
+        snapshot_class: Type[RegisterSnapshot] = RegisterSnapshot,
+    ) -> None:
+        self.address = register_address
+        self.length = length
+        self.snapshot_class = snapshot_class
+        self.snapshot_id = "_registerblock{}".format(register_address)
+
+    def __get__(
+        self,
+        obj: Optional[I2CDeviceDriver],
+        objtype: Optional[Type[I2CDeviceDriver]] = None,
+    ) -> RegisterSnapshot:
+        # The snapshot is cached on the object itself, like the bound arrays of
+        # StructArray, so its buffer lives as long as the driver does
+        snapshot = getattr(obj, self.snapshot_id, None)
+        if snapshot is None:
+            snapshot = self.snapshot_class(self.address, self.length)
+            setattr(obj, self.snapshot_id, snapshot)
+        buf = snapshot.buffer
+        with obj.i2c_device as i2c:
+            i2c.write_then_readinto(buf, buf, out_end=1, in_start=1)
+        return snapshot
+
+    def __set__(self, obj: I2CDeviceDriver, value: Any) -> NoReturn:
+        raise AttributeError()
+
+
+class SnapshotBit:
+    """
+    Single bit of a `RegisterSnapshot`.
+
+    Values are `bool`
+
+    :param int register_address: The register address of the bit, within the block
+    :param int bit: The bit index within the byte at ``register_address``
+    """
+
+    def __init__(self, register_address: int, bit: int) -> None:
+        self.address = register_address
+        self.bit_mask = 1 << bit
+
+    def __get__(
+        self,
+        obj: Optional[RegisterSnapshot],
+        objtype: Optional[Type[RegisterSnapshot]] = None,
+    ) -> bool:
+        return bool(obj.buffer[1 + self.address - obj.first_register] & self.bit_mask)
+
+    def __set__(self, obj: RegisterSnapshot, value: bool) -> NoReturn:
+        raise AttributeError()
+
+
+class SnapshotBits:
+    """
+    Multibit field of a `RegisterSnapshot`.
+
+    Values are `int` between 0 and 2 ** ``num_bits`` - 1.
+
+    :param int num_bits: The number of bits in the field.
+    :param int register_address: The register address of the field, within the block
+    :param int lowest_bit: The lowest bits index within the byte at ``register_address``
+    :param int register_width: The number of bytes in the register. Defaults to 1.
+    :param bool lsb_first: Is the first byte we read from I2C the LSB? Defaults to true
+    :param bool signed: If True, the value is a "two's complement" signed value.
+                        If False, it is unsigned.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        num_bits: int,
+        register_address: int,
+        lowest_bit: int,
+        register_width: int = 1,
+        lsb_first: bool = True,
+        signed: bool = False,
+    ) -> None:
+        self.bit_mask = ((1 << num_bits) - 1) << lowest_bit
+        if self.bit_mask >= 1 << (register_width * 8):
+            raise ValueError("Cannot have more bits than register size")
+        self.address = register_address
+        self.lowest_bit = lowest_bit
+        self.sign_bit = (1 << (num_bits - 1)) if signed else 0
+        self._order = _byte_order(register_width, lsb_first)
+
+    def __get__(
+        self,
+        obj: Optional[RegisterSnapshot],
+        objtype: Optional[Type[RegisterSnapshot]] = None,
+    ) -> int:
+        reg = _decode(obj.buffer, self._order, 0, self.address - obj.first_register)
+        reg = (reg & self.bit_mask) >> self.lowest_bit
+        # If the value is signed and negative, convert it
+        if reg & self.sign_bit:
+            reg -= 2 * self.sign_bit
+        return reg
+
+    def __set__(self, obj: RegisterSnapshot, value: int) -> NoReturn:
+        raise AttributeError()
+
+
+class SnapshotStruct:
+    """
+    Single value of a `RegisterSnapshot`, decoded with a struct format.
+
+    Values map to the first value in the defined struct.  See struct
+    module documentation for struct format string and its possible value types.
+
+    :param int register_address: The register address of the value, within the block
+    :param str struct_format: The struct format string for this register.
+    """
+
+    def __init__(self, register_address: int, struct_format: str) -> None:
+        self.format = struct_format
+        self.address = register_address
+        # Integers are decoded from the buffer directly, anything else through struct
+        self._order, self._sign_bit = _int_layout(struct_format) or (None, 0)
+
+    def __get__(
+        self,
+        obj: Optional[RegisterSnapshot],
+        objtype: Optional[Type[RegisterSnapshot]] = None,
+    ) -> Any:
+        offset = self.address - obj.first_register
+        if self._order is None:
+            return struct.unpack_from(self.format, obj.buffer, 1 + offset)[0]
+        return _decode(obj.buffer, self._order, self._sign_bit, offset)
+
+    def __set__(self, obj: RegisterSnapshot, value: Any) -> NoReturn:
+        raise AttributeError()
@@ -41,6 +41,7 @@ Implementation Notes
 """
 
 import time
+from array import array
 from micropython import const
 from adafruit_bus_device import spi_device
 
@@ -57,6 +58,15 @@ __repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_SD.git"
 
 _CMD_TIMEOUT = const(200)
 
+# SPI clock used to initialize the card, and the slowest it is stepped down to
+_INIT_BAUDRATE = const(250000)
+# Fastest SPI clock: SD cards are limited to 25MHz in SPI mode, and the SAMD51 SERCOM
+# clocks SPI at half its 48MHz reference at most
+_MAX_BAUDRATE = const(24000000)
+# TRAN_SPEED of the CSD: transfer rate unit in units of 10 bit/s, and time value x 10
+_TRAN_SPEED_UNITS = (10000, 100000, 1000000, 10000000)
+_TRAN_SPEED_VALUES = (0, 10, 12, 13, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 70, 80)
+
 _R1_IDLE_STATE = const(1 << 0)
 # R1_ERASE_RESET = const(1 << 1)
 _R1_ILLEGAL_COMMAND = const(1 << 2)
@@ -67,6 +77,12 @@ _R1_ILLEGAL_COMMAND = const(1 << 2)
 _TOKEN_CMD25 = const(0xFC)
 _TOKEN_STOP_TRAN = const(0xFD)
 _TOKEN_DATA = const(0xFE)
+# Data response tokens, masked with 0x1F
+_DATA_ACCEPTED = const(0x05)
+_DATA_CRC_ERROR = const(0x0B)
+
+# Pause before the first retry of a failed block, doubled for each retry after
+_RETRY_DELAY = 0.001
 
 
 # pylint: disable-msg=superfluous-parens
@@ -75,7 +91,26 @@ class SDCard:
 
     :param ~busio.SPI spi: The SPI bus
     :param ~digitalio.DigitalInOut cs: The chip select connected to the card
-    :param int baudrate: The SPI data rate to use after card setup
+    :param int baudrate: The highest SPI data rate to use after card setup. Defaults to
+      the fastest the card reports in its CSD, up to 24MHz. The rate is halved whenever
+      a transfer fails, down to the 250kHz used for setup.
+    :param dict card_info: The :attr:`card_info` saved on a previous boot. When the card
+      is still initialized from then and its CID matches, setup is skipped.
+    :param int coalesce_blocks: Hold back up to this many consecutive blocks written in
+      separate calls, to write them to the card as one multiple block write. Defaults to
+      0, which writes every call through.
+    :param float coalesce_time: The longest in seconds held back blocks wait before
+      the next access writes them. `sync` and `flush` write them at once, so blocks
+      are only at risk from power loss until the file is flushed or closed.
+    :param bool defer_busy: Return from a write as soon as the card accepts the data,
+      instead of waiting for it to program the block. The next access to the card, or
+      `poll_ready`, waits for it instead, so other work can overlap the programming.
+      Defaults to False.
+    :param bool crc: Have the card check a CRC16 on every written block, and check the
+      one it sends with every block read, to catch data corrupted on the bus. Defaults
+      to False, as computing the CRC in Python takes a few milliseconds per block.
+    :param int retries: How many times a failed block is retried, after a pause that
+      doubles each time, before the SPI data rate is halved. Defaults to 2.
 
     Example usage:
 
@@ -98,23 +133,76 @@ class SDCard:
     """
 
     # pylint: disable=invalid-name
-    def __init__(self, spi: SPI, cs: DigitalInOut, baudrate: int = 1320000) -> None:
+    def __init__(
+        self,
+        spi: SPI,
+        cs: DigitalInOut,
+        baudrate: Optional[int] = None,
+        card_info: Optional[dict] = None,
+        *,
+        coalesce_blocks: int = 0,
+        coalesce_time: float = 1.0,
+        defer_busy: bool = False,
+        crc: bool = False,
+        retries: int = 2,
+    ) -> None:
         # Create an SPIDevice running at a lower initialization baudrate first.
-        self._spi = spi_device.SPIDevice(spi, cs, baudrate=250000, extra_clocks=8)
+        self._spi = spi_device.SPIDevice(
+            spi, cs, baudrate=_INIT_BAUDRATE, extra_clocks=8
+        )
 
         self._cmdbuf = bytearray(6)
         self._single_byte = bytearray(1)
+        self._crcbuf = bytearray(2)
 
         # Card is byte addressing, set to 1 if addresses are per block
         self._cdv = 512
+        self._cid = None
+        # Fastest clock the card supports, from TRAN_SPEED in the CSD
+        self._max_baudrate = _INIT_BAUDRATE
+
+        # Run of consecutive blocks held back by write coalescing
+        self._coalesce_blocks = coalesce_blocks
+        self._coalesce_time = coalesce_time
+        self._pending = bytearray(512 * coalesce_blocks)
+        self._pending_start = 0
+        self._pending_count = 0
+        self._pending_since = 0.0
+
+        # Programming of the last write, when it is left to the next access
+        self._defer_busy = defer_busy
+        self._busy = False
+        self._busy_since = 0
+        self.busy_hidden_ns = 0
+        """With ``defer_busy``, the time in nanoseconds between deferred writes and the
+        next check of the card. It is at most the programming time that other work
+        overlapped, and is exact for writes found still busy."""
+        self.busy_waited_ns = 0
+        """With ``defer_busy``, the time in nanoseconds the next access still waited for
+        the card to finish programming."""
+
+        # Data CRCs, and the retries of failed blocks
+        self._crc = crc
+        self._retries = retries
+        self.crc_errors = 0
+        """Blocks read with a wrong CRC, or rejected by the card for one, with ``crc``."""
+        self.transfer_errors = 0
+        """Failed block reads and writes, whatever the cause."""
+        self.transfers_retried = 0
+        """Failed blocks retried at the same SPI data rate."""
 
         # initialise the card
-        self._init_card(cs)
+        self._init_card(cs, card_info)
 
         # Create a new SPIDevice with the (probably) higher operating baudrate.
-        self._spi = spi_device.SPIDevice(spi, cs, baudrate=baudrate, extra_clocks=8)
+        baudrate = min(baudrate or _MAX_BAUDRATE, self._max_baudrate, _MAX_BAUDRATE)
+        self._spi = spi_device.SPIDevice(
+            spi, cs, baudrate=max(baudrate, _INIT_BAUDRATE), extra_clocks=8
+        )
 
-    def _init_card(self, chip_select: DigitalInOut) -> None:
+    def _init_card(
+        self, chip_select: DigitalInOut, card_info: Optional[dict] = None
+    ) -> None:
         """Initialize the card in SPI mode."""
         # clock card at least 80 cycles with cs high
         with self._spi as card:
@@ -125,6 +213,10 @@ class SDCard:
                 card.write(self._single_byte)
 
         with self._spi as card:
+            if card_info and self._resume_card(card, card_info):
+                self._set_crc_mode(card)
+                return
+
             # CMD0: init card; should return _R1_IDLE_STATE (allow 5 attempts)
             for _ in range(5):
                 if self._cmd(card, 0, 0, 0x95) == _R1_IDLE_STATE:
@@ -142,28 +234,101 @@ class SDCard:
             else:
                 raise OSError("couldn't determine SD card version")
 
-            # get the number of sectors
-            # CMD9: response R2 (R1 byte + 16-byte block read)
-            csd = bytearray(16)
-            if self._cmd(card, 9, 0, 0xAF, response_buf=csd) != 0:
-                raise OSError("no response from SD card")
-            # self.readinto(csd)
-            csd_version = (csd[0] & 0xC0) >> 6
-            if csd_version >= 2:
-                raise OSError("SD card CSD format not supported")
-
-            if csd_version == 1:
-                self._sectors = ((csd[8] << 8 | csd[9]) + 1) * 1024
-            else:
-                block_length = 2 ** (csd[5] & 0xF)
-                c_size = ((csd[6] & 0x3) << 10) | (csd[7] << 2) | ((csd[8] & 0xC) >> 6)
-                mult = 2 ** (((csd[9] & 0x3) << 1 | (csd[10] & 0x80) >> 7) + 2)
-                self._sectors = block_length // 512 * mult * (c_size + 1)
+            # get the number of sectors and the clock rate
+            self._read_csd(card)
 
             # CMD16: set block length to 512 bytes
             if self._cmd(card, 16, 512, 0x15) != 0:
                 raise OSError("can't set 512 block size")
 
+            self._set_crc_mode(card)
+
+    def _set_crc_mode(self, card: SPI) -> None:
+        """Turn the CRC checks of the card on or off as set by ``crc``. The card keeps
+        the mode through a reset of the microcontroller, so it is always set."""
+        # CMD59: CRC on/off
+        if self._cmd(card, 59, 1 if self._crc else 0, 0) != 0:
+            raise OSError("can't set SD card CRC mode")
+
+    def _resume_card(self, card: SPI, card_info: dict) -> bool:
+        """Reuse the setup of a card that stayed powered through a reset. Only a card
+        that is out of idle state, and so answers CMD10 with R1 = 0, can be resumed."""
+        # CMD10: read the CID, which identifies the card
+        cid = bytearray(16)
+        if self._cmd(card, 10, 0, 0, response_buf=cid) != 0:
+            return False
+        if list(cid) != card_info["cid"]:
+            return False
+        self._cid = cid
+        self._cdv = card_info["cdv"]
+        self._sectors = card_info["sectors"]
+        if "max_baudrate" in card_info:
+            self._max_baudrate = card_info["max_baudrate"]
+        else:
+            # Saved before the clock rate was kept
+            self._read_csd(card)
+        return True
+
+    def _read_csd(self, card: SPI) -> None:
+        """Read the number of sectors and the fastest clock rate from the CSD."""
+        # CMD9: response R2 (R1 byte + 16-byte block read)
+        csd = bytearray(16)
+        if self._cmd(card, 9, 0, 0xAF, response_buf=csd) != 0:
+            raise OSError("no response from SD card")
+        csd_version = (csd[0] & 0xC0) >> 6
+        if csd_version >= 2:
+            raise OSError("SD card CSD format not supported")
+
+        if csd_version == 1:
+            self._sectors = ((csd[8] << 8 | csd[9]) + 1) * 1024
+        else:
+            block_length = 2 ** (csd[5] & 0xF)
+            c_size = ((csd[6] & 0x3) << 10) | (csd[7] << 2) | ((csd[8] & 0xC0) >> 6)
+            mult = 2 ** (((csd[9] & 0x3) << 1 | (csd[10] & 0x80) >> 7) + 2)
+            self._sectors = block_length // 512 * mult * (c_size + 1)
+
+        # TRAN_SPEED: time value in bits 6-3, rate unit in bits 2-0
+        tran_speed = csd[3]
+        if tran_speed & 0x7 < len(_TRAN_SPEED_UNITS):
+            self._max_baudrate = max(
+                _TRAN_SPEED_VALUES[(tran_speed >> 3) & 0xF]
+                * _TRAN_SPEED_UNITS[tran_speed & 0x7],
+                _INIT_BAUDRATE,
+            )
+
+    @property
+    def card_info(self) -> dict:
+        """The CID and the parameters detected during setup, to pass as ``card_info``
+        on the next boot"""
+        if self._cid is None:
+            cid = bytearray(16)
+            with self._spi as card:
+                self._finish_busy(card)
+                if self._cmd(card, 10, 0, 0, response_buf=cid) != 0:
+                    raise OSError("no response from SD card")
+            self._cid = cid
+        return {
+            "cid": list(self._cid),
+            "cdv": self._cdv,
+            "sectors": self._sectors,
+            "max_baudrate": self._max_baudrate,
+        }
+
+    @property
+    def baudrate(self) -> int:
+        """The SPI data rate in use, after any step down from transfer errors"""
+        return self._spi.baudrate
+
+    def _step_down(self) -> bool:
+        """Halve the SPI data rate after a failed transfer.
+
+        :return: False if the rate was already down to the setup rate
+        """
+        if self._spi.baudrate <= _INIT_BAUDRATE:
+            return False
+        self._spi.baudrate = max(self._spi.baudrate // 2, _INIT_BAUDRATE)
+        return True
+
     def _init_card_v1(self, card: SPI) -> None:
         """Initialize v1 SDCards which use byte addressing."""
         for _ in range(_CMD_TIMEOUT):
@@ -177,7 +342,6 @@ class SDCard:
         """Initialize v2 SDCards which use 512-byte block addressing."""
         ocr = bytearray(4)
         for _ in range(_CMD_TIMEOUT):
-            time.sleep(0.050)
             self._cmd(card, 58, 0, 0xFD, response_buf=ocr, data_block=False)
             self._cmd(card, 55, 0, 0x65)
             # On non-longint builds, we cannot use 0x40000000 directly as the arg
@@ -190,6 +354,8 @@ class SDCard:
                     self._cdv = 1
                 # print("[SDCard] v2 card")
                 return
+            # Only wait between attempts, not before the first one
+            time.sleep(0.050)
         raise OSError("timeout waiting for v2 card")
 
     def _wait_for_ready(self, card: SPI, timeout: float = 0.3) -> None:
@@ -260,18 +426,11 @@ class SDCard:
             if not (buf[0] & 0x80):
                 if response_buf:
                     if data_block:
-                        # Wait for the start block byte
-                        buf[1] = 0xFF
-                        for _ in range(_CMD_TIMEOUT):
-                            card.readinto(buf, start=1, end=2, write_value=0xFF)
-                            if buf[1] == 0xFE:
-                                break
-                        if buf[1] != 0xFE:
+                        # Read the data block, checking its CRC in CRC mode
+                        if self._readinto(card, response_buf) != 0:
                             return -1
-                    card.readinto(response_buf, write_value=0xFF)
-                    if data_block:
-                        # Read the checksum
-                        card.readinto(buf, start=1, end=3, write_value=0xFF)
+                    else:
+                        card.readinto(response_buf, write_value=0xFF)
                 return buf[0]
         return -1
 
@@ -330,7 +489,7 @@ class SDCard:
         # pylint: disable=singleton-comparison
         # Disable should be removed when refactor can be tested.
         if response_buf != None and result == 0:
-            self._readinto(card, response_buf)
+            return self._readinto(card, response_buf)
 
         return result
 
@@ -356,8 +515,13 @@ class SDCard:
         return 1  # timeout
 
     def _readinto(
-        self, card: SPI, buf: WriteableBuffer, start: int = 0, end: Optional[int] = None
-    ) -> None:
+        self,
+        card: SPI,
+        buf: WriteableBuffer,
+        start: int = 0,
+        end: Optional[int] = None,
+        timeout: float = 0.3,
+    ) -> int:
         """
         Read a data block into buf.
 
@@ -365,19 +529,30 @@ class SDCard:
         :param WriteableBuffer buf: The buffer to write into
         :param int start: The first index to write data at
         :param int end: The index after the last byte to write to.
+        :param float timeout: Maximum time to wait for the block in seconds.
+        :return: 0 on success, -1 on an error token, a timeout or, in CRC mode, a wrong
+          CRC
         """
         if end is None:
             end = len(buf)
 
-        # read until start byte (0xfe)
+        # read until start byte (0xfe), an error token or the timeout
+        start_time = time.monotonic()
         buf[start] = 0xFF  # busy
         while buf[start] != 0xFE:
+            if buf[start] != 0xFF or time.monotonic() - start_time > timeout:
+                return -1
             card.readinto(buf, start=start, end=start + 1, write_value=0xFF)
 
         card.readinto(buf, start=start, end=end, write_value=0xFF)
 
-        # read checksum and throw it away
-        card.readinto(self._cmdbuf, end=2, write_value=0xFF)
+        # read the checksum, and check it in CRC mode
+        crc = self._crcbuf
+        card.readinto(crc, write_value=0xFF)
+        if self._crc and (crc[0] << 8 | crc[1]) != calculate_crc16(buf, start, end):
+            self.crc_errors += 1
+            return -1
+        return 0
 
     # pylint: disable-msg=too-many-arguments
     def _write(
@@ -407,8 +582,13 @@ class SDCard:
         cmd[0] = token
         card.write(cmd, end=1)
         card.write(buf, start=start, end=end)
-        cmd[0] = 0xFF
-        cmd[1] = 0xFF
+        if self._crc:
+            crc = calculate_crc16(buf, start, end)
+            cmd[0] = crc >> 8
+            cmd[1] = crc & 0xFF
+        else:
+            cmd[0] = 0xFF
+            cmd[1] = 0xFF
         card.write(cmd, end=2)
 
         # check the response
@@ -417,10 +597,18 @@ class SDCard:
         for _ in range(_CMD_TIMEOUT):
             card.readinto(cmd, end=1, write_value=0xFF)
             if not (cmd[0] & 0x80):
-                if (cmd[0] & 0x1F) != 0x05:
+                if (cmd[0] & 0x1F) != _DATA_ACCEPTED:
+                    if (cmd[0] & 0x1F) == _DATA_CRC_ERROR:
+                        self.crc_errors += 1
                     return -1
                 else:
                     break
+        else:
+            return -1
+
+        if self._defer_busy:
+            # the next access waits for the write to finish
+            return 0
 
         # wait for write to finish
         card.readinto(cmd, end=1, write_value=0xFF)
@@ -429,6 +617,37 @@ class SDCard:
 
         return 0  # worked
 
+    def _finish_busy(self, card: SPI) -> None:
+        """
+        Wait for the card to finish programming a deferred write.
+
+        :param busio.SPI card: The locked SPI bus.
+        """
+        if not self._busy:
+            return
+        checked = time.monotonic_ns()
+        self.busy_hidden_ns += checked - self._busy_since
+        self._wait_for_ready(card)
+        self.busy_waited_ns += time.monotonic_ns() - checked
+        self._busy = False
+
+    def poll_ready(self) -> bool:
+        """
+        Check without waiting whether the card has finished programming a deferred
+        write. Calling this while doing other work tightens `busy_hidden_ns`.
+
+        :return: True if the card is ready for the next access
+        """
+        if not self._busy:
+            return True
+        with self._spi as card:
+            card.readinto(self._single_byte, write_value=0xFF)
+        if self._single_byte[0] != 0xFF:
+            return False
+        self.busy_hidden_ns += time.monotonic_ns() - self._busy_since
+        self._busy = False
+        return True
+
     # pylint: enable-msg=too-many-arguments
 
     def count(self) -> int:
@@ -442,70 +661,238 @@ class SDCard:
 
     def readblocks(self, start_block: int, buf: WriteableBuffer) -> int:
         """
-        Read one or more blocks from the card
+        Read one or more blocks from the card. A read is retried from the block that
+        failed, ``retries`` times at the same SPI data rate and then at half the rate,
+        until it succeeds or the rate is down to the setup rate.
 
         :param int start_block: The block to start reading from
         :param WriteableBuffer buf: The buffer to write into. Length must be multiple of 512.
         """
         nblocks, err = divmod(len(buf), 512)
         assert nblocks and not err, "Buffer length is invalid"
-        with self._spi as card:
-            if nblocks == 1:
-                # CMD17: set read address for single block
-                # We use _block_cmd to read our data so that the chip select line
-                # isn't toggled between the command, response and data.
-                if self._block_cmd(card, 17, start_block, 0, response_buf=buf) != 0:
-                    return 1
-            else:
-                # CMD18: set read address for multiple blocks
-                if self._block_cmd(card, 18, start_block, 0) != 0:
-                    return 1
-                offset = 0
-                while nblocks:
-                    self._readinto(card, buf, start=offset, end=(offset + 512))
-                    offset += 512
-                    nblocks -= 1
-                ret = self._cmd(card, 12, 0, 0x61, wait=False)
-                # return first status 0 or last before card ready (0xff)
-                while ret != 0:
-                    card.readinto(self._single_byte, write_value=0xFF)
-                    if self._single_byte[0] & 0x80:
-                        return ret
-                    ret = self._single_byte[0]
-        return 0
+        # Held back blocks must reach the card before they are read back
+        if self._pending_count and (
+            self._flush_due()
+            or start_block < self._pending_start + self._pending_count
+            and self._pending_start < start_block + nblocks
+        ):
+            if self.flush() != 0:
+                return 1
+        done = 0
+        attempt = 0
+        while True:
+            with self._spi as card:
+                self._finish_busy(card)
+                read = self._readblocks(
+                    card,
+                    start_block + done,
+                    memoryview(buf)[done * 512 :] if done else buf,
+                    nblocks - done,
+                )
+            done += read
+            if done == nblocks:
+                return 0
+            attempt = self._recover(0 if read else attempt)
+            if attempt < 0:
+                return 1
+
+    def _readblocks(
+        self, card: SPI, start_block: int, buf: WriteableBuffer, nblocks: int
+    ) -> int:
+        """Read ``nblocks`` blocks into buf, returning how many were read before any
+        failure."""
+        if nblocks == 1:
+            # CMD17: set read address for single block
+            # We use _block_cmd to read our data so that the chip select line
+            # isn't toggled between the command, response and data.
+            if self._block_cmd(card, 17, start_block, 0, response_buf=buf) != 0:
+                return 0
+        else:
+            # CMD18: set read address for multiple blocks
+            if self._block_cmd(card, 18, start_block, 0) != 0:
+                return 0
+            offset = 0
+            done = 0
+            while done < nblocks:
+                if self._readinto(card, buf, start=offset, end=(offset + 512)) != 0:
+                    break
+                offset += 512
+                done += 1
+            ret = self._cmd(card, 12, 0, 0x61, wait=False)
+            # first status 0 or last before card ready (0xff)
+            while ret != 0:
+                card.readinto(self._single_byte, write_value=0xFF)
+                if self._single_byte[0] & 0x80:
+                    # the stop failed, so trust none of the blocks
+                    return 0
+                ret = self._single_byte[0]
+            return done
+        return 1
+
+    def _recover(self, attempt: int) -> int:
+        """
+        Count a failed block, and pause before it is retried at the same SPI data rate,
+        twice as long as for the attempt before. Once ``retries`` attempts have failed,
+        halve the data rate instead.
+
+        :param int attempt: The number of retries of the block so far
+        :return: The number of retries to pass for the block next time, or -1 to give up
+        """
+        self.transfer_errors += 1
+        if attempt < self._retries:
+            self.transfers_retried += 1
+            time.sleep(_RETRY_DELAY * (1 << attempt))
+            return attempt + 1
+        return 0 if self._step_down() else -1
 
     def writeblocks(self, start_block: int, buf: ReadableBuffer) -> int:
         """
-        Write one or more blocks to the card
+        Write one or more blocks to the card. A write is retried from the block that
+        failed, ``retries`` times at the same SPI data rate and then at half the rate,
+        until it succeeds or the rate is down to the setup rate.
+
+        With ``coalesce_blocks``, blocks that continue or overwrite the run held back
+        are added to it instead, and the run is written when full, when the next write
+        does not continue it, or once it is ``coalesce_time`` old.
 
         :param int start_block: The block to start writing to
         :param ReadableBuffer buf: The buffer to write into. Length must be multiple of 512.
         """
         nblocks, err = divmod(len(buf), 512)
         assert nblocks and not err, "Buffer length is invalid"
-        with self._spi as card:
-            if nblocks == 1:
-                # CMD24: set write address for single block
-                if self._block_cmd(card, 24, start_block, 0) != 0:
-                    return 1
+        if not self._coalesce_blocks:
+            return self._write_run(start_block, buf, nblocks)
+
+        offset = start_block - self._pending_start
+        if not (
+            self._pending_count
+            and 0 <= offset <= self._pending_count
+            and offset + nblocks <= self._coalesce_blocks
+        ):
+            if self.flush() != 0:
+                return 1
+            if nblocks >= self._coalesce_blocks:
+                return self._write_run(start_block, buf, nblocks)
+            self._pending_start = start_block
+            self._pending_since = time.monotonic()
+            offset = 0
+        self._pending[offset * 512 : (offset + nblocks) * 512] = buf
+        self._pending_count = max(self._pending_count, offset + nblocks)
+        if self._pending_count == self._coalesce_blocks or self._flush_due():
+            return self.flush()
+        return 0
 
-                # send the data
-                self._write(card, _TOKEN_DATA, buf)
-            else:
-                # CMD25: set write address for first block
-                if self._block_cmd(card, 25, start_block, 0) != 0:
-                    return 1
-                # send the data
-                offset = 0
-                while nblocks:
+    def _flush_due(self) -> bool:
+        """True if the held back run is ``coalesce_time`` old."""
+        return (
+            self._pending_count > 0
+            and time.monotonic() - self._pending_since >= self._coalesce_time
+        )
+
+    def flush(self) -> int:
+        """
+        Write the blocks held back by write coalescing to the card now. If the write
+        fails they stay held back, for the next flush to write again.
+
+        :return: 0 on success, 1 if the write failed
+        """
+        nblocks = self._pending_count
+        if not nblocks:
+            return 0
+        if self._write_run(self._pending_start, self._pending, nblocks) != 0:
+            return 1
+        self._pending_count = 0
+        return 0
+
+    def sync(self) -> None:
+        """
+        Write the blocks held back by write coalescing to the card.
+        ``storage.VfsFat`` calls this whenever a file is flushed or closed, so flushed
+        data is on the card when the call returns.
+        """
+        if self.flush() != 0:
+            raise OSError("SD card write failed")
+
+    def _write_run(self, start_block: int, buf: ReadableBuffer, nblocks: int) -> int:
+        """Write the first ``nblocks`` blocks of buf, retrying failed blocks until the
+        write succeeds."""
+        done = 0
+        attempt = 0
+        while True:
+            with self._spi as card:
+                self._finish_busy(card)
+                written = self._writeblocks(
+                    card,
+                    start_block + done,
+                    memoryview(buf)[done * 512 :] if done else buf,
+                    nblocks - done,
+                )
+                if self._defer_busy:
+                    # Single block writes end with the card programming, and so do
+                    # multiple block writes after the stop token
+                    self._busy = True
+                    self._busy_since = time.monotonic_ns()
+            done += written
+            if done == nblocks:
+                return 0
+            attempt = self._recover(0 if written else attempt)
+            if attempt < 0:
+                return 1
+
+    def _writeblocks(
+        self, card: SPI, start_block: int, buf: ReadableBuffer, nblocks: int
+    ) -> int:
+        """Write ``nblocks`` blocks from buf, returning how many the card accepted
+        before any failure."""
+        if nblocks == 1:
+            # CMD24: set write address for single block
+            if self._block_cmd(card, 24, start_block, 0) != 0:
+                return 0
+
+            # send the data
+            if self._write(card, _TOKEN_DATA, buf, end=512) != 0:
+                return 0
+        else:
+            # ACMD23: tell the card how many blocks follow, so it can pre-erase them.
+            # The hint is optional, so a card that rejects it gets a plain CMD25.
+            if self._cmd(card, 55, 0, 0) == 0:
+                self._cmd(card, 23, nblocks, 0)
+            # CMD25: set write address for first block
+            if self._block_cmd(card, 25, start_block, 0) != 0:
+                return 0
+            # send the data
+            offset = 0
+            done = 0
+            while done < nblocks:
+                if (
                     self._write(
                         card, _TOKEN_CMD25, buf, start=offset, end=(offset + 512)
                     )
-                    offset += 512
-                    nblocks -= 1
-                self._wait_for_ready(card)
-                self._cmd_nodata(card, _TOKEN_STOP_TRAN, 0x0)
-        return 0
+                    != 0
+                ):
+                    break
+                offset += 512
+                done += 1
+            self._wait_for_ready(card)
+            self._cmd_nodata(card, _TOKEN_STOP_TRAN, 0x0)
+            return done
+        return 1
+
+    def measure_throughput(self, start_block: int = 0, nblocks: int = 16) -> float:
+        """
+        Time multiple block reads at the current SPI data rate.
+
+        :param int start_block: The first block to read
+        :param int nblocks: The number of blocks to read, two at a time
+        :return: The read throughput in bytes per second
+        """
+        buf = bytearray(1024)
+        start_time = time.monotonic_ns()
+        for block in range(start_block, start_block + nblocks, 2):
+            if self.readblocks(block, buf) != 0:
+                raise OSError("SD card read failed")
+        elapsed = time.monotonic_ns() - start_time
+        return (nblocks + 1) // 2 * len(buf) * 1000000000 / elapsed
 
 
 def _calculate_crc_table() -> bytearray:
@@ -546,3 +933,43 @@ def calculate_crc(message: ReadableBuffer) -> int:
         crc = CRC_TABLE[(crc << 1) ^ message[i]]
 
     return (crc << 1) | 1
+
+
+def _calculate_crc16_table() -> array:
+    """Precompute the table used in calculate_crc16."""
+    crc_table = array("H", [0] * 256)
+    crc_poly = const(0x1021)  # the value of our CRC-16-CCITT polynomial
+
+    # generate a table value for all 256 possible byte values
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ crc_poly
+            else:
+                crc = crc << 1
+        crc_table[i] = crc & 0xFFFF
+    return crc_table
+
+
+CRC16_TABLE = _calculate_crc16_table()
+
+
+def calculate_crc16(
+    data: ReadableBuffer, start: int = 0, end: Optional[int] = None
+) -> int:
+    """
+    Calculate the CRC16 of the data block in data[start:end], using a precomputed table
+    in CRC16_TABLE.
+
+    :param ReadableBuffer data: The buffer holding the block
+    :param int start: The first index of the block
+    :param int end: The index after the last byte of the block
+    """
+    if end is None:
+        end = len(data)
+    table = CRC16_TABLE
+    crc = 0
+    for i in range(start, end):
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ data[i]]
+    return crc
@@ -119,7 +119,7 @@ class _SSD1306(framebuf.FrameBuffer):
         #   96, 16:         0x60         0x02
         #   64, 48:         0x80         0x12
         #   64, 32:         0x80         0x12
-        for cmd in (
+        init_sequence = (
             SET_DISP,  # off
             # address setting
             SET_MEM_ADDR,
@@ -154,8 +154,9 @@ class _SSD1306(framebuf.FrameBuffer):
             SET_CHARGE_PUMP,
             0x10 if self.external_vcc else 0x14,
             SET_DISP | 0x01,  # display on
-        ):
-            self.write_cmd(cmd)
+        )
+        # Sent as one burst where the bus allows it
+        self.write_cmds(bytes(init_sequence))
         self.fill(0)
         self.show()
 
@@ -188,6 +189,11 @@ class _SSD1306(framebuf.FrameBuffer):
         """Derived class must implement this"""
         raise NotImplementedError
 
+    def write_cmds(self, cmds: bytes) -> None:
+        """Send a sequence of commands"""
+        for cmd in cmds:
+            self.write_cmd(cmd)
+
     def poweron(self) -> None:
         "Reset device and turn on the display."
         if self.reset_pin:
@@ -345,6 +351,12 @@ class SSD1306_SPI(_SSD1306):
         with self.spi_device as spi:
             spi.write(bytearray([cmd]))
 
+    def write_cmds(self, cmds: bytes) -> None:
+        """Send a sequence of commands to the SPI device in one transaction"""
+        self.dc_pin.value = 0
+        with self.spi_device as spi:
+            spi.write(cmds)
+
     def write_framebuf(self) -> None:
         """write to the frame buffer via SPI"""
         self.dc_pin.value = 1
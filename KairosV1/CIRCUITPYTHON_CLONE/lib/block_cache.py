@@ -0,0 +1,218 @@
+"""
+`block_cache` - Write-back LRU cache for block devices
+======================================================
+
+Keeps the most recently used 512-byte blocks of a block device, such as an
+`adafruit_sdcard.SDCard`, in RAM. `BlockCache` has the same ``readblocks``,
+``writeblocks``, ``count`` and ``sync`` methods as the device, so it is passed to
+``storage.VfsFat`` in its place. The FAT and directory sectors that every file open,
+append and close rereads are then served without touching the bus, and repeated
+writes to them reach the card once.
+
+.. code-block:: python
+
+    import block_cache
+
+    sdcard = adafruit_sdcard.SDCard(spi, cs)
+    cache = block_cache.BlockCache(sdcard, blocks=8)
+    storage.mount(storage.VfsFat(cache), "/sd")
+"""
+
+import time
+
+try:
+    from typing import Any, Dict, List, Optional
+    from circuitpython_typing import ReadableBuffer, WriteableBuffer
+except ImportError:
+    pass
+
+_BLOCK_SIZE = 512
+
+
+class BlockCache:
+    """Write-back cache of the least recently used blocks of ``device``.
+
+    Reads and writes of more than half the cache go straight to the device, so a large
+    file transfer does not evict the metadata blocks.
+
+    :param device: The block device to cache, with ``readblocks``, ``writeblocks`` and
+      ``count`` methods
+    :param int blocks: The number of 512-byte blocks to keep. Defaults to 8.
+    :param float write_back_time: The longest in seconds a written block stays in the
+      cache only, before the next access writes it to the device. `sync` writes it
+      sooner. Defaults to 2.
+    """
+
+    def __init__(
+        self, device: Any, blocks: int = 8, write_back_time: float = 2.0
+    ) -> None:
+        self.device = device
+        self.write_back_time = write_back_time
+        self.hits = 0
+        """Blocks read or written in the cache."""
+        self.misses = 0
+        """Blocks read from the device into the cache."""
+        self.writebacks = 0
+        """Dirty blocks written to the device."""
+        self._data = bytearray(_BLOCK_SIZE * blocks)
+        self._view = memoryview(self._data)
+        self._slots = {}  # type: Dict[int, int]
+        self._blocks = [None] * blocks  # type: List[Optional[int]]
+        self._used = [0] * blocks
+        self._dirty = bytearray(blocks)
+        self._dirty_since = None  # type: Optional[float]
+        self._tick = 0
+
+    def count(self) -> int:
+        """The number of blocks of the device"""
+        return self.device.count()
+
+    def _slot(self, block: int, load: bool) -> int:
+        """The slot holding ``block``, after loading it from the device if ``load``, or
+        -1 if the device failed.
+
+        Evicts the least recently used block if it is not cached."""
+        self._tick += 1
+        slot = self._slots.get(block)
+        if slot is not None:
+            self.hits += 1
+            self._used[slot] = self._tick
+            return slot
+        used = self._used
+        slot = 0
+        for i in range(1, len(used)):
+            if used[i] < used[slot]:
+                slot = i
+        evicted = self._blocks[slot]
+        if evicted is not None:
+            if self._dirty[slot] and self._write_back(slot) != 0:
+                return -1
+            del self._slots[evicted]
+            self._blocks[slot] = None
+        if load:
+            self.misses += 1
+            data = self._view[slot * _BLOCK_SIZE : (slot + 1) * _BLOCK_SIZE]
+            if self.device.readblocks(block, data) != 0:
+                used[slot] = 0
+                return -1
+        self._slots[block] = slot
+        self._blocks[slot] = block
+        used[slot] = self._tick
+        return slot
+
+    def _write_back(self, slot: int) -> int:
+        data = self._view[slot * _BLOCK_SIZE : (slot + 1) * _BLOCK_SIZE]
+        result = self.device.writeblocks(self._blocks[slot], data)
+        if result == 0:
+            self._clean(slot)
+            self.writebacks += 1
+        return result
+
+    def _clean(self, slot: int) -> None:
+        """Mark ``slot`` clean, and stop the write back timer once no block is dirty"""
+        self._dirty[slot] = 0
+        if not any(self._dirty):
+            self._dirty_since = None
+
+    def _write_back_due(self) -> int:
+        if (
+            self._dirty_since is not None
+            and time.monotonic() - self._dirty_since >= self.write_back_time
+        ):
+            return self.flush()
+        return 0
+
+    def readblocks(self, start_block: int, buf: WriteableBuffer) -> int:
+        """
+        Read one or more blocks, from the cache where they are held
+
+        :param int start_block: The block to start reading from
+        :param WriteableBuffer buf: The buffer to write into. Length must be multiple of 512.
+        """
+        if self._write_back_due() != 0:
+            return 1
+        nblocks = len(buf) // _BLOCK_SIZE
+        if nblocks > len(self._used) // 2:
+            result = self.device.readblocks(start_block, buf)
+            # The device is behind on the blocks still dirty here
+            for slot, block in enumerate(self._blocks):
+                if (
+                    block is not None
+                    and self._dirty[slot]
+                    and start_block <= block < start_block + nblocks
+                ):
+                    offset = (block - start_block) * _BLOCK_SIZE
+                    buf[offset : offset + _BLOCK_SIZE] = self._view[
+                        slot * _BLOCK_SIZE : (slot + 1) * _BLOCK_SIZE
+                    ]
+            return result
+        offset = 0
+        for block in range(start_block, start_block + nblocks):
+            slot = self._slot(block, True)
+            if slot < 0:
+                return 1
+            buf[offset : offset + _BLOCK_SIZE] = self._view[
+                slot * _BLOCK_SIZE : (slot + 1) * _BLOCK_SIZE
+            ]
+            offset += _BLOCK_SIZE
+        return 0
+
+    def writeblocks(self, start_block: int, buf: ReadableBuffer) -> int:
+        """
+        Write one or more blocks into the cache. They reach the device when evicted,
+        when they are ``write_back_time`` old, or on `sync`.
+
+        :param int start_block: The block to start writing to
+        :param ReadableBuffer buf: The buffer to write from. Length must be multiple of 512.
+        """
+        if self._write_back_due() != 0:
+            return 1
+        nblocks = len(buf) // _BLOCK_SIZE
+        if nblocks > len(self._used) // 2:
+            # Drop the cached copies, which the write makes stale
+            for block in range(start_block, start_block + nblocks):
+                slot = self._slots.pop(block, None)
+                if slot is not None:
+                    self._blocks[slot] = None
+                    self._used[slot] = 0
+                    self._clean(slot)
+            return self.device.writeblocks(start_block, buf)
+        buf = memoryview(buf)
+        offset = 0
+        for block in range(start_block, start_block + nblocks):
+            slot = self._slot(block, False)
+            if slot < 0:
+                return 1
+            self._data[slot * _BLOCK_SIZE : (slot + 1) * _BLOCK_SIZE] = buf[
+                offset : offset + _BLOCK_SIZE
+            ]
+            self._dirty[slot] = 1
+            offset += _BLOCK_SIZE
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+        return 0
+
+    def flush(self) -> int:
+        """Write every dirty block to the device, in block order, so a device that
+        coalesces writes can merge consecutive ones
+
+        :return: 0 on success, 1 if a write failed
+        """
+        while True:
+            slot = None
+            for i, block in enumerate(self._blocks):
+                if self._dirty[i] and (slot is None or block < self._blocks[slot]):
+                    slot = i
+            if slot is None:
+                break
+            if self._write_back(slot) != 0:
+                return 1
+        return 0
+
+    def sync(self) -> None:
+        """Write every dirty block to the device, and have the device write anything it
+        holds back. ``storage.VfsFat`` calls this whenever a file is flushed or
+        closed."""
+        device_flush = getattr(self.device, "flush", None)
+        if self.flush() != 0 or device_flush is not None and device_flush() != 0:
+            raise OSError("block device write failed")
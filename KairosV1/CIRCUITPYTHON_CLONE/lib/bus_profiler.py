@@ -0,0 +1,334 @@
+"""
+`bus_profiler` - Bus transaction profiling
+==========================================
+
+Counts the transactions of every `SPIDevice` and `I2CDevice`: how many there were,
+the bytes written and read, the time spent waiting to lock and configure the bus, and
+the time the bus was then held. They are totalled per device and per the driver
+method that made them, to show where the loop time goes on the buses.
+
+Profiling is opt-in. `BusProfiler.install` wraps the methods of the two device classes
+and `BusProfiler.uninstall` puts the originals back, so the drivers run unchanged when
+no profiler is installed. The timing allocates, so an installed profiler slows the
+loop a little.
+
+.. code-block:: python
+
+    import bus_profiler
+
+    profiler = bus_profiler.BusProfiler()
+    profiler.install()
+    # Before storage.VfsFat(), which looks up the block device methods once
+    profiler.watch(sdcard, "readblocks", "writeblocks")
+    profiler.watch(display, "show")
+    ...
+    profiler.dump()  # to the serial console
+    with open("/sd/bus_profile.txt", "a") as f:
+        profiler.dump(f)
+"""
+
+import time
+
+from micropython import const
+from adafruit_bus_device.i2c_device import I2CDevice
+from adafruit_bus_device.spi_device import SPIDevice
+
+try:
+    from typing import Any, Callable, Dict, List, Optional, Tuple
+    from busio import SPI
+except ImportError:
+    pass
+
+# Fields of the totals kept for each device and method
+_ENTRIES = const(0)
+_WRITTEN = const(1)
+_READ = const(2)
+_WAIT_NS = const(3)
+_BUSY_NS = const(4)
+_STARTED_NS = const(5)
+
+_UNWATCHED = "-"
+
+
+class _CountingSPI:
+    """Stands in for the `busio.SPI` returned by an `SPIDevice`, counting the bytes
+    moved by the transaction into ``totals``"""
+
+    def __init__(self, spi: SPI) -> None:
+        self.spi = spi
+        self.totals = None  # type: Optional[List[int]]
+
+    def write(self, buffer, *, start: int = 0, end: Optional[int] = None) -> None:
+        if end is None:
+            end = len(buffer)
+        self.totals[_WRITTEN] += end - start
+        self.spi.write(buffer, start=start, end=end)
+
+    def readinto(
+        self,
+        buffer,
+        *,
+        start: int = 0,
+        end: Optional[int] = None,
+        write_value: int = 0
+    ) -> None:
+        if end is None:
+            end = len(buffer)
+        self.totals[_READ] += end - start
+        self.spi.readinto(buffer, start=start, end=end, write_value=write_value)
+
+    def write_readinto(  # pylint: disable=too-many-arguments
+        self,
+        out_buffer,
+        in_buffer,
+        *,
+        out_start: int = 0,
+        out_end: Optional[int] = None,
+        in_start: int = 0,
+        in_end: Optional[int] = None
+    ) -> None:
+        if out_end is None:
+            out_end = len(out_buffer)
+        if in_end is None:
+            in_end = len(in_buffer)
+        self.totals[_WRITTEN] += out_end - out_start
+        self.totals[_READ] += in_end - in_start
+        self.spi.write_readinto(
+            out_buffer,
+            in_buffer,
+            out_start=out_start,
+            out_end=out_end,
+            in_start=in_start,
+            in_end=in_end,
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.spi, name)
+
+
+class BusProfiler:
+    """Totals the bus transactions of all `SPIDevice` and `I2CDevice` objects while
+    installed.
+
+    Devices are named after the driver passed to `watch`, or otherwise by their I2C
+    address or, for SPI, the id of the `SPIDevice`. Transactions made outside a
+    watched method are totalled under ``-``."""
+
+    def __init__(self) -> None:
+        # (device name, method) -> [entries, written, read, wait ns, busy ns, started]
+        self.totals = {}  # type: Dict[Tuple[str, str], List[int]]
+        self._names = {}  # type: Dict[object, str]
+        self._open = {}  # type: Dict[object, List[int]]
+        self._proxies = {}  # type: Dict[object, _CountingSPI]
+        self._originals = None  # type: Optional[List[Tuple[type, str, Callable]]]
+        self._method = _UNWATCHED
+        self._since = time.monotonic_ns()
+
+    @property
+    def installed(self) -> bool:
+        """True while the device classes are wrapped by this profiler"""
+        return self._originals is not None
+
+    def install(self) -> None:
+        """Wrap the `SPIDevice` and `I2CDevice` methods to profile every transaction,
+        including those of devices created before"""
+        if self._originals is not None:
+            return
+        self._originals = []
+        profiler = self
+        spi_enter = self._replace(SPIDevice, "__enter__")
+        spi_exit = self._replace(SPIDevice, "__exit__")
+        i2c_enter = self._replace(I2CDevice, "__enter__")
+        i2c_exit = self._replace(I2CDevice, "__exit__")
+        i2c_readinto = self._replace(I2CDevice, "readinto")
+        i2c_write = self._replace(I2CDevice, "write")
+        i2c_write_then_readinto = self._replace(I2CDevice, "write_then_readinto")
+
+        def spi_device_enter(device):
+            started = time.monotonic_ns()
+            spi = spi_enter(device)
+            proxy = profiler._proxies.get(device)
+            if proxy is None or proxy.spi is not spi:
+                proxy = profiler._proxies[device] = _CountingSPI(spi)
+            proxy.totals = profiler._begin(device, started)
+            return proxy
+
+        def spi_device_exit(device, exc_type, exc_val, exc_tb):
+            result = spi_exit(device, exc_type, exc_val, exc_tb)
+            profiler._end(device)
+            return result
+
+        def i2c_device_enter(device):
+            started = time.monotonic_ns()
+            i2c_enter(device)
+            profiler._begin(device, started)
+            return device
+
+        def i2c_device_exit(device, exc_type, exc_val, exc_tb):
+            result = i2c_exit(device, exc_type, exc_val, exc_tb)
+            profiler._end(device)
+            return result
+
+        def i2c_device_readinto(device, buf, *, start=0, end=None):
+            profiler._count(device, 0, (len(buf) if end is None else end) - start)
+            i2c_readinto(device, buf, start=start, end=end)
+
+        def i2c_device_write(device, buf, *, start=0, end=None):
+            profiler._count(device, (len(buf) if end is None else end) - start, 0)
+            i2c_write(device, buf, start=start, end=end)
+
+        def i2c_device_write_then_readinto(  # pylint: disable=too-many-arguments
+            device,
+            out_buffer,
+            in_buffer,
+            *,
+            out_start=0,
+            out_end=None,
+            in_start=0,
+            in_end=None
+        ):
+            profiler._count(
+                device,
+                (len(out_buffer) if out_end is None else out_end) - out_start,
+                (len(in_buffer) if in_end is None else in_end) - in_start,
+            )
+            i2c_write_then_readinto(
+                device,
+                out_buffer,
+                in_buffer,
+                out_start=out_start,
+                out_end=out_end,
+                in_start=in_start,
+                in_end=in_end,
+            )
+
+        SPIDevice.__enter__ = spi_device_enter
+        SPIDevice.__exit__ = spi_device_exit
+        I2CDevice.__enter__ = i2c_device_enter
+        I2CDevice.__exit__ = i2c_device_exit
+        I2CDevice.readinto = i2c_device_readinto
+        I2CDevice.write = i2c_device_write
+        I2CDevice.write_then_readinto = i2c_device_write_then_readinto
+
+    def uninstall(self) -> None:
+        """Put the original `SPIDevice` and `I2CDevice` methods back"""
+        if self._originals is None:
+            return
+        for cls, name, original in self._originals:
+            setattr(cls, name, original)
+        self._originals = None
+        self._open = {}
+        self._proxies = {}
+
+    def _replace(self, cls: type, name: str) -> Callable:
+        original = getattr(cls, name)
+        self._originals.append((cls, name, original))
+        return original
+
+    def watch(self, driver: object, *methods: str) -> None:
+        """Total the transactions made by the given methods of ``driver`` under the
+        method name, and name its devices after the driver class.
+
+        The methods are wrapped on the driver object itself, so call this before
+        anything keeps a reference to them, such as ``storage.VfsFat``.
+
+        :param driver: A driver object, such as an ``SDCard``
+        :param str methods: The names of the methods to watch
+        """
+        for value in driver.__dict__.values():
+            if isinstance(value, (SPIDevice, I2CDevice)):
+                self._names[value] = type(driver).__name__
+        for method in methods:
+            setattr(driver, method, self._watched(getattr(driver, method), method))
+
+    def _watched(self, function: Callable, method: str) -> Callable:
+        profiler = self
+
+        def watched(*args, **kwargs):
+            caller = profiler._method
+            profiler._method = method
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler._method = caller
+
+        return watched
+
+    def name(self, device: object, name: str) -> None:
+        """Name ``device``, an `SPIDevice` or `I2CDevice`, in the report"""
+        self._names[device] = name
+
+    def _device_name(self, device: object) -> str:
+        name = self._names.get(device)
+        if name is None:
+            if isinstance(device, I2CDevice):
+                name = "I2C 0x%02x" % device.device_address
+            else:
+                name = "SPI %x" % id(device)
+            self._names[device] = name
+        return name
+
+    def _begin(self, device: object, started: int) -> List[int]:
+        now = time.monotonic_ns()
+        key = (self._device_name(device), self._method)
+        totals = self.totals.get(key)
+        if totals is None:
+            totals = self.totals[key] = [0, 0, 0, 0, 0, 0]
+        totals[_ENTRIES] += 1
+        totals[_WAIT_NS] += now - started
+        totals[_STARTED_NS] = now
+        self._open[device] = totals
+        return totals
+
+    def _end(self, device: object) -> None:
+        totals = self._open.pop(device, None)
+        if totals is not None:
+            totals[_BUSY_NS] += time.monotonic_ns() - totals[_STARTED_NS]
+
+    def _count(self, device: object, written: int, read: int) -> None:
+        totals = self._open.get(device)
+        if totals is not None:
+            totals[_WRITTEN] += written
+            totals[_READ] += read
+
+    def reset(self) -> None:
+        """Clear the totals and restart the elapsed time"""
+        self.totals = {}
+        self._since = time.monotonic_ns()
+
+    def report(self) -> str:
+        """The totals of each device and method, one per line, with the share of the
+        time since `install` or `reset` that the bus was held for them"""
+        elapsed = max(time.monotonic_ns() - self._since, 1)
+        lines = [
+            "%-20s %-18s %6s %8s %8s %9s %9s %5s"
+            % ("device", "method", "with", "written", "read", "wait ms", "busy ms", "%")
+        ]
+        for (device, method), totals in sorted(self.totals.items()):
+            lines.append(
+                "%-20s %-18s %6d %8d %8d %9.1f %9.1f %5.1f"
+                % (
+                    device,
+                    method,
+                    totals[_ENTRIES],
+                    totals[_WRITTEN],
+                    totals[_READ],
+                    totals[_WAIT_NS] / 1000000,
+                    totals[_BUSY_NS] / 1000000,
+                    100 * totals[_BUSY_NS] / elapsed,
+                )
+            )
+        lines.append("over %.1f s" % (elapsed / 1000000000))
+        return "\n".join(lines)
+
+    def dump(self, stream: Optional[Any] = None) -> None:
+        """Print the `report` to the serial console, or write it to ``stream``, such as
+        a file open on the SD card
+
+        :param stream: An object with a ``write`` method, or None for the console
+        """
+        if stream is None:
+            print(self.report())
+        else:
+            stream.write(self.report())
+            stream.write("\n")
@@ -0,0 +1,93 @@
+"""
+`warm_boot` - Persisted driver state and boot-time profiling
+=============================================================
+
+Keeps what the drivers detect at power-up (BME680 calibration, SD card
+parameters) in the microcontroller's non-volatile memory, so the next boot can
+pass it back to the drivers and skip detecting it again. The drivers check that
+the state belongs to the device they find, the BME680 by a CRC of its calibration
+registers and the SD card by its CID, and detect it again when it does not.
+`BootProfiler` times the boot up to the first logged sample.
+
+.. code-block:: python
+
+    import warm_boot
+
+    profiler = warm_boot.BootProfiler()
+    state = warm_boot.load()
+    sensor = adafruit_bme680.Adafruit_BME680_SPI(spi, cs, calibration=state.get("bme680"))
+    profiler.mark("bme680")
+    warm_boot.save({"bme680": sensor.calibration})
+"""
+
+import json
+import time
+
+try:
+    import microcontroller
+except ImportError:
+    microcontroller = None
+
+try:
+    from typing import List, Tuple
+except ImportError:
+    pass
+
+_MAGIC = b"KWB1"
+_HEADER_LEN = 6  # magic + 16-bit little endian length of the JSON payload
+
+
+def load() -> dict:
+    """Return the state saved by `save`, or an empty dict if there is none or it is not
+    valid"""
+    nvm = microcontroller.nvm if microcontroller else None
+    if not nvm or nvm[0:4] != _MAGIC:
+        return {}
+    length = nvm[4] | (nvm[5] << 8)
+    if _HEADER_LEN + length > len(nvm):
+        return {}
+    try:
+        return json.loads(bytes(nvm[_HEADER_LEN : _HEADER_LEN + length]).decode())
+    except ValueError:
+        return {}
+
+
+def save(state: dict) -> bool:
+    """Save ``state`` for the next boot. NVM is only written when the state changed, to
+    spare the flash.
+
+    :return: True if NVM was written
+    """
+    nvm = microcontroller.nvm if microcontroller else None
+    payload = json.dumps(state).encode()
+    blob = _MAGIC + bytes((len(payload) & 0xFF, len(payload) >> 8)) + payload
+    if not nvm or len(blob) > len(nvm) or nvm[0 : len(blob)] == blob:
+        return False
+    nvm[0 : len(blob)] = blob
+    return True
+
+
+class BootProfiler:
+    """Records when each boot stage finished, in milliseconds since reset.
+
+    `time.monotonic_ns` counts from reset, so the first mark also covers the time spent
+    before ``code.py`` started."""
+
+    def __init__(self) -> None:
+        self.marks = []  # type: List[Tuple[str, int]]
+        self.mark("code.py")
+
+    def mark(self, stage: str) -> int:
+        """Record that ``stage`` has finished and return the milliseconds since reset"""
+        now = time.monotonic_ns() // 1000000
+        self.marks.append((stage, now))
+        return now
+
+    def report(self) -> str:
+        """The time each stage took and the total since reset, one stage per line"""
+        lines = []
+        previous = 0
+        for stage, now in self.marks:
+            lines.append("%-14s %6d ms (+%d)" % (stage, now, now - previous))
+            previous = now
+        return "\n".join(lines)
@@ -0,0 +1,140 @@
+"""
+Heap bytes allocated per register access, for the adafruit_register descriptors
+against their allocation free variants in adafruit_register.i2c_prealloc.
+
+Run it as a script, or from the REPL with ``import register_benchmark`` and
+``register_benchmark.main()``. No sensor is needed: the registers are read from and
+written to a bytearray standing in for the device.
+"""
+
+import gc
+from adafruit_register import i2c_bits, i2c_prealloc, i2c_struct, i2c_struct_array
+
+ACCESSES = 200
+
+
+class _FakeI2CDevice:
+    """Register memory with the I2CDevice methods the descriptors use, none of which
+    allocate"""
+
+    def __init__(self) -> None:
+        self.memory = bytearray(256)
+
+    def __enter__(self) -> "_FakeI2CDevice":
+        return self
+
+    def __exit__(self, exc_type, exc_val, traceback) -> bool:
+        return False
+
+    def write_then_readinto(
+        self, out_buffer, in_buffer, *, out_start=0, out_end=None, in_start=0, in_end=None
+    ) -> None:
+        address = out_buffer[out_start]
+        for i in range(in_start, len(in_buffer) if in_end is None else in_end):
+            in_buffer[i] = self.memory[address]
+            address += 1
+
+    def write(self, buffer, *, start=0, end=None) -> None:
+        address = buffer[start]
+        for i in range(start + 1, len(buffer) if end is None else end):
+            self.memory[address] = buffer[i]
+            address += 1
+
+
+class _Upstream:
+    unary = i2c_struct.UnaryStruct(0x10, "<H")
+    pair = i2c_struct.Struct(0x20, "<HH")
+    bits = i2c_bits.RWBits(3, 0x30, 2)
+    array = i2c_struct_array.StructArray(0x40, "<H", 4)
+
+    def __init__(self) -> None:
+        self.i2c_device = _FakeI2CDevice()
+
+
+class _Prealloc:
+    unary = i2c_prealloc.UnaryStruct(0x10, "<H")
+    pair = i2c_prealloc.Struct(0x20, "<HH")
+    bits = i2c_prealloc.RWBits(3, 0x30, 2)
+    array = i2c_prealloc.StructArray(0x40, "<H", 4)
+
+    def __init__(self) -> None:
+        self.i2c_device = _FakeI2CDevice()
+
+
+def _get_unary(device):
+    return device.unary
+
+
+def _set_unary(device):
+    device.unary = 1234
+
+
+def _get_pair(device):
+    return device.pair
+
+
+def _set_pair(device):
+    device.pair = (1, 2)
+
+
+def _get_bits(device):
+    return device.bits
+
+
+def _set_bits(device):
+    device.bits = 5
+
+
+def _get_array(device):
+    return device.array[2]
+
+
+def _set_array(device):
+    device.array[2] = (7,)
+
+
+ACCESS_TYPES = (
+    ("UnaryStruct get", _get_unary),
+    ("UnaryStruct set", _set_unary),
+    ("Struct get", _get_pair),
+    ("Struct set", _set_pair),
+    ("RWBits get", _get_bits),
+    ("RWBits set", _set_bits),
+    ("StructArray get", _get_array),
+    ("StructArray set", _set_array),
+)
+
+
+def allocated_per_access(access, device, accesses=ACCESSES) -> float:
+    """Heap bytes that ``access(device)`` allocates, averaged over ``accesses`` calls"""
+    access(device)  # binds StructArray and warms up the descriptor
+    gc.collect()
+    gc.disable()
+    try:
+        before = gc.mem_alloc()
+        for _ in range(accesses):
+            access(device)
+        after = gc.mem_alloc()
+    finally:
+        gc.enable()
+    return (after - before) / accesses
+
+
+def main() -> None:
+    """Print the bytes allocated per access by both descriptor sets"""
+    upstream = _Upstream()
+    prealloc = _Prealloc()
+    print("%-16s %9s %9s" % ("access", "upstream", "prealloc"))
+    for name, access in ACCESS_TYPES:
+        print(
+            "%-16s %9.1f %9.1f"
+            % (
+                name,
+                allocated_per_access(access, upstream),
+                allocated_per_access(access, prealloc),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,169 @@
 import csv
+import json
 import matplotlib.pyplot as plt
+import numpy as np
 import argparse
 import os
 
 ####################################################################
 # This script reads a CSV file containing data from Kairos and plots it.
+# Logs written with RAW_LOGGING in code.py hold raw BME680 ADC words and
+# are compensated here first. Light is converted to lux for logs that record
+# the light sensor gain and integration time of each sample.
 # Example usage:
 # python3 plot_logged_data.py /path/to/data.csv --cutoff 16000
 ####################################################################
 
+# First line of a raw log, followed by the calibration coefficients as JSON
+RAW_LOG_PREFIX = "# BME680 calibration:"
+
+# Gas range constants of the BME680 (not BME688), as in adafruit_bme680
+LOOKUP_TABLE_1 = np.array([
+    2147483647.0, 2147483647.0, 2147483647.0, 2147483647.0, 2147483647.0,
+    2126008810.0, 2147483647.0, 2130303777.0, 2147483647.0, 2147483647.0,
+    2143188679.0, 2136746228.0, 2147483647.0, 2126008810.0, 2147483647.0,
+    2147483647.0,
+])
+LOOKUP_TABLE_2 = np.array([
+    4096000000.0, 2048000000.0, 1024000000.0, 512000000.0, 255744255.0,
+    127110228.0, 64000000.0, 32258064.0, 16016016.0, 8000000.0, 4000000.0,
+    2000000.0, 1000000.0, 500000.0, 250000.0, 125000.0,
+])
+
+# LTR-329 lux formula coefficients from the datasheet, as (CH1 / (CH0 + CH1) upper
+# bound, CH0 coefficient, CH1 coefficient)
+LUX_COEFFICIENTS = (
+    (0.45, 1.7743, 1.1059),
+    (0.64, 4.2785, -1.9548),
+    (0.85, 0.5926, 0.1185),
+)
+
+
+def counts_to_lux(visible_lights, ir_lights, gains, integration_times):
+    # Vectorized LTR-329 datasheet lux formula. The log holds visible (CH0 - CH1)
+    # and IR (CH1) counts. Rows without a gain (saturated before the first good
+    # sample, or logs from before it was recorded) come out as NaN, and an IR
+    # ratio of 0.85 or more as 0 lux.
+    ir = np.asarray(ir_lights, dtype=np.float64)
+    ch0 = np.asarray(visible_lights, dtype=np.float64) + ir
+    gains = np.asarray(gains, dtype=np.float64)
+    scale = gains * np.asarray(integration_times, dtype=np.float64) / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = ir / (ch0 + ir)
+        lux = np.zeros_like(ch0)
+        # Apply the bands from the highest down so the lowest matching one wins
+        for upper, ch0_coefficient, ch1_coefficient in reversed(LUX_COEFFICIENTS):
+            band = ratio < upper
+            lux[band] = (ch0_coefficient * ch0[band] + ch1_coefficient * ir[band]) / scale[band]
+    lux[~(gains > 0)] = np.nan
+    return lux
+
+
+def compensate_raw(calibration, adc_temp, adc_pres, adc_hum, adc_gas, gas_range):
+    # Vectorized port of the float compensation in adafruit_bme680, one pass over
+    # every row. Returns temperature (°C), gas (ohms), humidity (%), pressure (hPa)
+    # and altitude (m) arrays.
+    par_t = calibration["temperature"]
+    par_p = calibration["pressure"]
+    par_h = calibration["humidity"]
+    adc_temp = np.asarray(adc_temp, dtype=np.float64)
+    adc_pres = np.asarray(adc_pres, dtype=np.float64)
+    adc_hum = np.asarray(adc_hum, dtype=np.float64)
+    adc_gas = np.asarray(adc_gas, dtype=np.float64)
+    gas_range = np.asarray(gas_range, dtype=np.int64)
+
+    # Temperature
+    var1 = (adc_temp / 8) - (par_t[0] * 2)
+    var2 = (var1 * par_t[1]) / 2048
+    var3 = ((var1 / 2) * (var1 / 2)) / 4096
+    var3 = (var3 * par_t[2] * 16) / 16384
+    t_fine = np.trunc(var2 + var3)
+    temp_scaled = ((t_fine * 5) + 128) / 256
+    temperature = temp_scaled / 100
+
+    # Pressure
+    var1 = (t_fine / 2) - 64000
+    var2 = ((var1 / 4) * (var1 / 4)) / 2048
+    var2 = (var2 * par_p[5]) / 4
+    var2 = var2 + (var1 * par_p[4] * 2)
+    var2 = (var2 / 4) + (par_p[3] * 65536)
+    var1 = ((((var1 / 4) * (var1 / 4)) / 8192) * (par_p[2] * 32) / 8) + (
+        (par_p[1] * var1) / 2
+    )
+    var1 = var1 / 262144
+    var1 = ((32768 + var1) * par_p[0]) / 32768
+    calc_pres = 1048576 - adc_pres
+    calc_pres = (calc_pres - (var2 / 4096)) * 3125
+    calc_pres = (calc_pres / var1) * 2
+    var1 = (par_p[8] * (((calc_pres / 8) * (calc_pres / 8)) / 8192)) / 4096
+    var2 = ((calc_pres / 4) * par_p[7]) / 8192
+    var3 = (((calc_pres / 256) ** 3) * par_p[9]) / 131072
+    calc_pres += (var1 + var2 + var3 + (par_p[6] * 128)) / 16
+    pressure = calc_pres / 100
+
+    # Humidity
+    var1 = (adc_hum - (par_h[0] * 16)) - ((temp_scaled * par_h[2]) / 200)
+    var2 = (
+        par_h[1]
+        * (
+            ((temp_scaled * par_h[3]) / 100)
+            + (((temp_scaled * ((temp_scaled * par_h[4]) / 100)) / 64) / 100)
+            + 16384
+        )
+    ) / 1024
+    var3 = var1 * var2
+    var4 = par_h[5] * 128
+    var4 = (var4 + ((temp_scaled * par_h[6]) / 100)) / 16
+    var5 = ((var3 / 16384) * (var3 / 16384)) / 1024
+    var6 = (var4 * var5) / 2
+    humidity = np.clip((((var3 + var6) / 1024) * 1000) / 4096 / 1000, 0, 100)
+
+    # Gas
+    if calibration["variant"] == 0x01:
+        var1 = np.right_shift(262144, gas_range)
+        var2 = 4096 + ((adc_gas - 512) * 3)
+        gas = ((10000 * var1) / var2) * 100
+    else:
+        var1 = ((1340 + (5 * calibration["sw_err"])) * LOOKUP_TABLE_1[gas_range]) / 65536
+        var2 = ((adc_gas * 32768) - 16777216) + var1
+        var3 = (LOOKUP_TABLE_2[gas_range] * var1) / 512
+        gas = (var3 + (var2 / 2)) / var2
+    gas = np.trunc(gas)
+
+    altitude = 44330 * (1.0 - (pressure / calibration["sea_level_pressure"]) ** 0.1903)
+    return temperature, gas, humidity, pressure, altitude
+
+
+def load_raw_log(file_path):
+    # Read a raw log and return its timestamps, compensated BME680 channels, light
+    # columns and light gain and integration time columns as arrays. Logs from before
+    # the light sensor auto-ranged have no gain and integration time, which are then
+    # returned as NaN.
+    with open(file_path, "r") as f:
+        calibration = json.loads(f.readline()[len(RAW_LOG_PREFIX):])
+        header = f.readline().strip().split(",")
+        # The gas age column, nan until gas was first measured, is not plotted
+        columns = list(range(8)) + list(range(9, len(header)))
+        data = np.loadtxt(f, delimiter=",", usecols=columns, ndmin=2)
+    if data.shape[1] < 10:
+        data = np.hstack((data, np.full((len(data), 2), np.nan)))
+    temperature, gas, humidity, pressure, altitude = compensate_raw(
+        calibration, data[:, 1], data[:, 2], data[:, 3], data[:, 4], data[:, 5]
+    )
+    return (
+        data[:, 0],
+        temperature,
+        gas,
+        humidity,
+        pressure,
+        altitude,
+        data[:, 6],
+        data[:, 7],
+        data[:, 8],
+        data[:, 9],
+    )
+
+
 def plot_data(file_path, cutoff):
     # Check if the file exists
     if not os.path.isfile(file_path):
@@ -24,23 +179,50 @@ def plot_data(file_path, cutoff):
     altitudes = []
     visible_lights = []
     ir_lights = []
+    light_gains = []
+    light_integrations = []
 
     with open(file_path, "r") as f:
-        reader = csv.reader(f)
-        next(reader)  # Skip the header row
-        for row in reader:
-            timestamp = float(row[0])
-            if timestamp >= cutoff:
-                timestamps.append(timestamp)
-                temperatures.append(float(row[1]))
-                gases.append(float(row[2]))
-                humidities.append(float(row[3]))
-                pressures.append(float(row[4]))
-                altitudes.append(float(row[5]))
-                visible_lights.append(float(row[6]))
-                ir_lights.append(float(row[7]))
-
-    if not timestamps:
+        raw_log = f.readline().startswith(RAW_LOG_PREFIX)
+
+    if raw_log:
+        columns = load_raw_log(file_path)
+        keep = columns[0] >= cutoff
+        (
+            timestamps,
+            temperatures,
+            gases,
+            humidities,
+            pressures,
+            altitudes,
+            visible_lights,
+            ir_lights,
+            light_gains,
+            light_integrations,
+        ) = (column[keep] for column in columns)
+    else:
+        with open(file_path, "r") as f:
+            reader = csv.reader(f)
+            next(reader)  # Skip the header row
+            for row in reader:
+                timestamp = float(row[0])
+                if timestamp >= cutoff:
+                    timestamps.append(timestamp)
+                    temperatures.append(float(row[1]))
+                    gases.append(float(row[2]))
+                    humidities.append(float(row[3]))
+                    pressures.append(float(row[4]))
+                    altitudes.append(float(row[5]))
+                    visible_lights.append(float(row[6]))
+                    ir_lights.append(float(row[7]))
+                    if len(row) > 10:
+                        light_gains.append(float(row[9]))
+                        light_integrations.append(float(row[10]))
+                    else:
+                        light_gains.append(np.nan)
+                        light_integrations.append(np.nan)
+
+    if not len(timestamps):
         print(f"No data found for timestamps >= {cutoff}.")
         return
 
@@ -76,16 +258,16 @@ def plot_data(file_path, cutoff):
     axs[1, 0].set_title("Altitude")
 
     # Plot visible light
-    axs[1, 1].plot(timestamps, visible_lights, label="Visible Light (lux)", color="orange")
+    axs[1, 1].plot(timestamps, visible_lights, label="Visible Light (counts)", color="orange")
     axs[1, 1].set_xlabel("Time (s)")
-    axs[1, 1].set_ylabel("Light Intensity (lux)")
+    axs[1, 1].set_ylabel("Light Intensity (counts)")
     axs[1, 1].legend()
     axs[1, 1].set_title("Visible Light")
 
     # Plot IR light
-    axs[1, 2].plot(timestamps, ir_lights, label="IR Light (lux)", color="brown")
+    axs[1, 2].plot(timestamps, ir_lights, label="IR Light (counts)", color="brown")
     axs[1, 2].set_xlabel("Time (s)")
-    axs[1, 2].set_ylabel("Light Intensity (lux)")
+    axs[1, 2].set_ylabel("Light Intensity (counts)")
     axs[1, 2].legend()
     axs[1, 2].set_title("IR Light")
 
@@ -96,8 +278,18 @@ def plot_data(file_path, cutoff):
     axs[2, 0].legend()
     axs[2, 0].set_title("AQI")
 
-    # Remove unused plots (second row, third column, and third row, second and third columns)
-    fig.delaxes(axs[2, 1])  # Remove subplot at (2, 1)
+    # Plot illuminance, for logs that record the light sensor gain and integration time
+    lux = counts_to_lux(visible_lights, ir_lights, light_gains, light_integrations)
+    if np.isfinite(lux).any():
+        axs[2, 1].plot(timestamps, lux, label="Illuminance (lux)", color="gold")
+        axs[2, 1].set_xlabel("Time (s)")
+        axs[2, 1].set_ylabel("Illuminance (lux)")
+        axs[2, 1].legend()
+        axs[2, 1].set_title("Illuminance")
+    else:
+        fig.delaxes(axs[2, 1])  # Remove subplot at (2, 1)
+
+    # Remove unused plot (third row, third column)
     fig.delaxes(axs[2, 2])  # Remove subplot at (2, 2)
 
     # Adjust layout to prevent overlap
@@ -0,0 +1,586 @@
+import argparse
+import collections
+import os
+import sys
+import types
+import typing
+
+####################################################################
+# This script emulates an SD card in SPI mode on top of an image file, so
+# that the adafruit_sdcard driver in CIRCUITPYTHON_CLONE/lib can be run and
+# benchmarked on a computer. EmulatedSPI stands in for the busio.SPI object
+# and EmulatedChipSelect for the chip select pin. The emulated card answers
+# CMD0/8/9/10/12/13/16/17/18/24/25/55/58/59, ACMD23 and ACMD41, checks CRCs
+# once CMD59 turns them on, signals busy while programming and adds read
+# latency. Time is simulated from the bytes clocked at the configured SPI
+# rate, so the numbers are the same on every machine.
+# Example usage:
+# python3 sd_card_emulator.py card.img --create 8192 --baudrate 12000000
+####################################################################
+
+LIB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CIRCUITPYTHON_CLONE", "lib")
+
+BLOCK_SIZE = 512
+
+# R1 response bits
+R1_IDLE_STATE = 0x01
+R1_ILLEGAL_COMMAND = 0x04
+R1_COM_CRC_ERROR = 0x08
+R1_ADDRESS_ERROR = 0x20
+
+# Data tokens and data response tokens
+TOKEN_DATA = 0xFE
+TOKEN_CMD25 = 0xFC
+TOKEN_STOP_TRAN = 0xFD
+DATA_ACCEPTED = 0x05
+DATA_CRC_ERROR = 0x0B
+DATA_WRITE_ERROR = 0x0D
+# Data error token for reads, with the out of range bit set
+TOKEN_READ_OUT_OF_RANGE = 0x08
+
+
+def crc7(data):
+    """CRC7 of a command frame, shifted left with the end bit set as sent on the bus."""
+    crc = 0
+    for byte in data:
+        for bit in range(7, -1, -1):
+            feedback = ((byte >> bit) & 1) ^ ((crc >> 6) & 1)
+            crc = (crc << 1) & 0x7F
+            if feedback:
+                crc ^= 0x09
+    return (crc << 1) | 1
+
+
+def crc16(data):
+    """CRC16-CCITT (XModem) of a data block, as SD cards use."""
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return crc
+
+
+class OperationStats:
+    """Bytes clocked and simulated time, totalled per card operation."""
+
+    def __init__(self):
+        self.totals = collections.OrderedDict()
+
+    def add(self, operation, nbytes, seconds, new=False):
+        entry = self.totals.setdefault(operation, [0, 0, 0.0])
+        if new:
+            entry[0] += 1
+        entry[1] += nbytes
+        entry[2] += seconds
+
+    def clear(self):
+        self.totals.clear()
+
+    def report(self):
+        lines = ["%-10s %7s %10s %12s" % ("operation", "count", "bytes", "sim ms")]
+        for operation, (count, nbytes, seconds) in self.totals.items():
+            lines.append("%-10s %7d %10d %12.3f" % (operation, count, nbytes, seconds * 1000))
+        return "\n".join(lines)
+
+
+class EmulatedSDCard:
+    """An SD card in SPI mode, storing its blocks in an image file.
+
+    The image size sets the capacity and must be a multiple of 512 bytes. High capacity
+    cards (SDHC) are block addressed and report a version 2 CSD, standard capacity ones
+    are byte addressed with a version 1 CSD.
+
+    read_latency is the time from a read command to its data token, program_time the
+    busy time after each written block, and init_polls how many ACMD41 the card stays
+    idle for. Above max_baudrate, the card flips the low bit of every byte it sends.
+    corrupt_reads and corrupt_writes inject that many data CRC errors.
+    """
+
+    def __init__(self, image_path, high_capacity=True, tran_speed=0x32,
+                 read_latency=100e-6, program_time=500e-6, init_polls=3,
+                 max_baudrate=None, cid=None):
+        self.image = open(image_path, "r+b")
+        size = os.fstat(self.image.fileno()).st_size
+        if size % BLOCK_SIZE or not size:
+            raise ValueError("image size must be a nonzero multiple of 512 bytes")
+        self.blocks = size // BLOCK_SIZE
+        self.high_capacity = high_capacity
+        self.tran_speed = tran_speed
+        self.read_latency = read_latency
+        self.program_time = program_time
+        self.init_polls = init_polls
+        self.max_baudrate = max_baudrate
+        self.cid = bytes(cid or b"\x03SDEMULATR\x10\x00\x00\x00\x01\x18")[:15]
+        self.cid += bytes((crc7(self.cid),))
+        self.corrupt_reads = 0
+        self.corrupt_writes = 0
+        self.stats = OperationStats()
+        self.log = []
+        self.now = 0.0
+        self.baudrate = 100000
+        self.selected = False
+        self.power_cycle()
+
+    def close(self):
+        self.image.close()
+
+    # State
+
+    def power_cycle(self):
+        """Return to the power-up state, as if the card was removed and reinserted."""
+        self.spi_mode = False
+        self.idle = True
+        self.app_command = False
+        self.acmd41_polls = 0
+        self.crc_enabled = False
+        self.frame = bytearray()
+        self.out = collections.deque()
+        self.data = collections.deque()
+        self.busy_until = 0.0
+        self.busy_after_out = False
+        self.mode = "command"  # command, write_token, write_data, read_multiple
+        self.write_block = 0
+        self.write_multiple = False
+        self.write_data = bytearray()
+        self.read_block = 0
+        self.read_ready_at = 0.0
+        self.pre_erase = 0
+        self.operation = "idle"
+
+    @property
+    def csd(self):
+        csd = bytearray(16)
+        csd[1] = 0x0E  # TAAC: 1ms
+        csd[3] = self.tran_speed
+        csd[4] = 0x5B  # CCC, with the high bits of csd[5]
+        if self.high_capacity:
+            c_size = self.blocks // 1024 - 1
+            csd[0] = 0x40
+            csd[5] = 0x59  # READ_BL_LEN 512
+            csd[7] = (c_size >> 16) & 0x3F
+            csd[8] = (c_size >> 8) & 0xFF
+            csd[9] = c_size & 0xFF
+        else:
+            # blocks = (C_SIZE + 1) * 2 ** (C_SIZE_MULT + 2) with 512-byte blocks
+            mult = 7
+            while mult and (self.blocks >> (mult + 2)) == 0:
+                mult -= 1
+            c_size = (self.blocks >> (mult + 2)) - 1
+            csd[5] = 0x59
+            csd[6] = (c_size >> 10) & 0x03
+            csd[7] = (c_size >> 2) & 0xFF
+            csd[8] = (c_size & 0x03) << 6
+            csd[9] = (mult >> 1) & 0x03
+            csd[10] = (mult & 0x01) << 7
+        csd[15] = crc7(csd[:15])
+        return bytes(csd)
+
+    def select(self, selected):
+        self.selected = selected
+        if not selected:
+            self.frame = bytearray()
+
+    # Bus interface, one byte in each direction per clocked byte
+
+    def clock(self, mosi, seconds):
+        """Clock one byte: take ``mosi`` from the host and return the byte sent back."""
+        self.now += seconds
+        self.stats.add(self.operation, 1, seconds)
+        if not self.selected:
+            return 0xFF
+        miso = self._next_out()
+        if self.max_baudrate and self.baudrate > self.max_baudrate:
+            miso ^= 0x01
+        self._feed(mosi)
+        return miso
+
+    def _next_out(self):
+        if self.now < self.busy_until:
+            return 0x00
+        if self.out:
+            value = self.out.popleft()
+            if not self.out and self.busy_after_out:
+                self.busy_after_out = False
+                self.busy_until = self.now + self.program_time
+            return value
+        if self.mode == "read_multiple" and not self.data:
+            self._queue_block(self.read_block)
+            self.read_block += 1
+        # Data blocks follow the response once the read latency has passed
+        if self.data and self.now >= self.read_ready_at:
+            return self.data.popleft()
+        return 0xFF
+
+    def _respond(self, *values, busy=False):
+        self.out.extend(values)
+        self.busy_after_out = busy
+
+    # Image access
+
+    def _read_image(self, block):
+        self.image.seek(block * BLOCK_SIZE)
+        return self.image.read(BLOCK_SIZE)
+
+    def _write_image(self, block, data):
+        self.image.seek(block * BLOCK_SIZE)
+        self.image.write(data)
+
+    def _address(self, arg):
+        """Block number of a command argument, or None if it is out of range."""
+        block = arg if self.high_capacity else arg // BLOCK_SIZE
+        if not self.high_capacity and arg % BLOCK_SIZE:
+            return None
+        return block if block < self.blocks else None
+
+    def _queue_block(self, block):
+        self.read_ready_at = self.now + self.read_latency
+        if block >= self.blocks:
+            self.data.append(TOKEN_READ_OUT_OF_RANGE)
+            self.mode = "command"
+            return
+        data = bytearray(self._read_image(block))
+        crc = crc16(data)
+        if self.corrupt_reads:
+            self.corrupt_reads -= 1
+            data[0] ^= 0x01
+        self.data.append(TOKEN_DATA)
+        self.data.extend(data)
+        self.data.extend((crc >> 8, crc & 0xFF))
+
+    # Protocol
+
+    def _feed(self, byte):
+        if self.mode == "write_token":
+            if byte == 0xFF:
+                return
+            if byte == (TOKEN_CMD25 if self.write_multiple else TOKEN_DATA):
+                self.mode = "write_data"
+                self.write_data = bytearray()
+                return
+            if byte == TOKEN_STOP_TRAN and self.write_multiple:
+                self.mode = "command"
+                self._respond(0xFF, busy=True)
+                return
+            self.mode = "command"
+        if self.mode == "write_data":
+            self._receive_data(byte)
+            return
+        if not self.frame:
+            if byte & 0xC0 == 0x40:
+                self.frame.append(byte)
+                self._start_operation(byte & 0x3F)
+            return
+        self.frame.append(byte)
+        if len(self.frame) == 6:
+            frame = bytes(self.frame)
+            self.frame = bytearray()
+            self._command(frame)
+
+    def _start_operation(self, cmd):
+        self.operation = ("ACMD%d" if self.app_command else "CMD%d") % cmd
+        self.stats.add(self.operation, 0, 0.0, new=True)
+        self.log.append(self.operation)
+
+    def _receive_data(self, byte):
+        self.write_data.append(byte)
+        if len(self.write_data) < BLOCK_SIZE + 2:
+            return
+        data = bytes(self.write_data[:BLOCK_SIZE])
+        crc = self.write_data[BLOCK_SIZE] << 8 | self.write_data[BLOCK_SIZE + 1]
+        accepted = not self.crc_enabled or crc16(data) == crc
+        if self.corrupt_writes:
+            self.corrupt_writes -= 1
+            accepted = False
+        if not accepted:
+            self._respond(DATA_CRC_ERROR)
+            self.mode = "command"
+            return
+        if self.write_block >= self.blocks:
+            self._respond(DATA_WRITE_ERROR)
+            self.mode = "command"
+            return
+        self._write_image(self.write_block, data)
+        self.write_block += 1
+        self._respond(DATA_ACCEPTED, busy=True)
+        self.mode = "write_token" if self.write_multiple else "command"
+
+    def _r1(self):
+        return R1_IDLE_STATE if self.idle else 0x00
+
+    def _command(self, frame):  # pylint: disable=too-many-branches,too-many-statements
+        cmd = frame[0] & 0x3F
+        arg = int.from_bytes(frame[1:5], "big")
+        app_command = self.app_command
+        self.app_command = False
+        crc_ok = crc7(frame[:5]) == frame[5]
+
+        if cmd == 0:
+            # The card only enters SPI mode on a CMD0 with a valid CRC
+            if not crc_ok:
+                if self.spi_mode:
+                    self._respond(0xFF, self._r1() | R1_COM_CRC_ERROR)
+                return
+            self._software_reset()
+            self._respond(0xFF, R1_IDLE_STATE)
+            return
+        if not self.spi_mode:
+            return
+        if self.mode == "read_multiple":
+            self.mode = "command"
+            self.data.clear()
+            if cmd == 12:
+                # Stuff byte, R1, then busy while the card stops
+                self._respond(0xFF, 0x00, busy=True)
+                return
+            # Any other command also ends the transfer, as for a host that missed
+            # the start of it
+        if (self.crc_enabled or cmd == 8) and not crc_ok:
+            self._respond(0xFF, self._r1() | R1_COM_CRC_ERROR)
+            return
+
+        r1 = self._r1()
+        if cmd == 8:
+            self._respond(0xFF, r1, 0x00, 0x00, (arg >> 8) & 0x0F, arg & 0xFF)
+        elif cmd == 55:
+            self.app_command = True
+            self._respond(0xFF, r1)
+        elif cmd == 41 and app_command:
+            self.acmd41_polls += 1
+            if self.acmd41_polls > self.init_polls:
+                self.idle = False
+            self._respond(0xFF, self._r1())
+        elif cmd == 58:
+            ocr0 = 0x80 | (0x40 if self.high_capacity else 0) if not self.idle else 0x00
+            self._respond(0xFF, r1, ocr0, 0xFF, 0x80, 0x00)
+        elif cmd == 59:
+            self.crc_enabled = bool(arg & 1)
+            self._respond(0xFF, r1)
+        elif self.idle:
+            self._respond(0xFF, r1 | R1_ILLEGAL_COMMAND)
+        elif cmd in (9, 10):
+            payload = self.csd if cmd == 9 else self.cid
+            crc = crc16(payload)
+            self._respond(0xFF, 0x00, 0xFF, TOKEN_DATA, *payload, crc >> 8, crc & 0xFF)
+        elif cmd == 13:
+            self._respond(0xFF, 0x00, 0x00)
+        elif cmd == 16:
+            self._respond(0xFF, 0x00 if arg == BLOCK_SIZE else 0x40)
+        elif cmd in (17, 18):
+            block = self._address(arg)
+            if block is None:
+                self._respond(0xFF, R1_ADDRESS_ERROR)
+                return
+            self._respond(0xFF, 0x00)
+            if cmd == 17:
+                self._queue_block(block)
+            else:
+                self.mode = "read_multiple"
+                self.read_block = block
+        elif cmd == 23 and app_command:
+            self.pre_erase = arg & 0x7FFFFF
+            self._respond(0xFF, 0x00)
+        elif cmd in (24, 25):
+            block = self._address(arg)
+            if block is None:
+                self._respond(0xFF, R1_ADDRESS_ERROR)
+                return
+            self._respond(0xFF, 0x00)
+            self.mode = "write_token"
+            self.write_multiple = cmd == 25
+            self.write_block = block
+        elif cmd == 12:
+            self._respond(0xFF, 0x00)
+        else:
+            self._respond(0xFF, r1 | R1_ILLEGAL_COMMAND)
+
+    def _software_reset(self):
+        """Software reset by CMD0: back to idle in SPI mode, CRC checks off."""
+        operation = self.operation
+        self.power_cycle()
+        self.spi_mode = True
+        self.operation = operation
+
+
+class EmulatedChipSelect:
+    """Stands in for the digitalio.DigitalInOut chip select pin of the card."""
+
+    def __init__(self, card):
+        self.card = card
+        self._value = True
+
+    def switch_to_output(self, value=False, **_):
+        self.value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = bool(value)
+        self.card.select(not self._value)
+
+
+class EmulatedSPI:
+    """Stands in for the busio.SPI object the card is on.
+
+    Every clocked byte advances the simulated time by 8 bits at the configured
+    baudrate. call_overhead adds a fixed time per write or read call, to model the
+    interpreter overhead of each transfer on the microcontroller, about 20 us on a
+    SAMD51 by default.
+    """
+
+    def __init__(self, card, call_overhead=20e-6):
+        self.card = card
+        self.call_overhead = call_overhead
+        self.baudrate = 100000
+        self.bytes_clocked = 0
+        self._locked = False
+
+    @property
+    def frequency(self):
+        return self.baudrate
+
+    def try_lock(self):
+        if self._locked:
+            return False
+        self._locked = True
+        return True
+
+    def unlock(self):
+        self._locked = False
+
+    def configure(self, *, baudrate=100000, polarity=0, phase=0, bits=8):
+        if polarity or phase or bits != 8:
+            raise ValueError("SD cards use SPI mode 0 with 8-bit transfers")
+        self.baudrate = baudrate
+        self.card.baudrate = baudrate
+
+    def _call(self):
+        self.card.now += self.call_overhead
+        self.card.stats.add(self.card.operation, 0, self.call_overhead)
+
+    def _byte_time(self):
+        return 8 / self.baudrate
+
+    def write(self, buffer, *, start=0, end=None):
+        self._call()
+        seconds = self._byte_time()
+        for i in range(start, len(buffer) if end is None else end):
+            self.card.clock(buffer[i], seconds)
+            self.bytes_clocked += 1
+
+    def readinto(self, buffer, *, start=0, end=None, write_value=0):
+        self._call()
+        seconds = self._byte_time()
+        for i in range(start, len(buffer) if end is None else end):
+            buffer[i] = self.card.clock(write_value, seconds)
+            self.bytes_clocked += 1
+
+    def write_readinto(self, out_buffer, in_buffer, *, out_start=0, out_end=None,
+                       in_start=0, in_end=None):
+        self._call()
+        seconds = self._byte_time()
+        out_end = len(out_buffer) if out_end is None else out_end
+        in_end = len(in_buffer) if in_end is None else in_end
+        if out_end - out_start != in_end - in_start:
+            raise ValueError("buffer slices must be of equal length")
+        for i in range(out_end - out_start):
+            in_buffer[in_start + i] = self.card.clock(out_buffer[out_start + i], seconds)
+            self.bytes_clocked += 1
+
+
+def create_image(path, blocks):
+    """Create a zero filled image of ``blocks`` 512-byte blocks."""
+    with open(path, "wb") as image:
+        image.truncate(blocks * BLOCK_SIZE)
+
+
+def _provide(name, **attributes):
+    """Register module ``name`` with ``attributes`` unless it can be imported."""
+    try:
+        __import__(name)
+    except ImportError:
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+
+def load_sdcard_driver():
+    """Import adafruit_sdcard from CIRCUITPYTHON_CLONE/lib.
+
+    The CircuitPython modules the driver imports come from Adafruit Blinka and
+    circuitpython_typing when they are installed. Otherwise the emulated classes stand
+    in for busio.SPI and digitalio.DigitalInOut, and const() is defined here."""
+    if LIB_PATH not in sys.path:
+        sys.path.insert(0, LIB_PATH)
+    buffer = typing.Union[bytes, bytearray, memoryview]
+    _provide("micropython", const=lambda value: value)
+    _provide("busio", SPI=EmulatedSPI)
+    _provide("digitalio", DigitalInOut=EmulatedChipSelect)
+    _provide("circuitpython_typing", ReadableBuffer=buffer, WriteableBuffer=buffer)
+    import adafruit_sdcard  # pylint: disable=import-outside-toplevel
+
+    return adafruit_sdcard
+
+
+def benchmark(card, spi, sdcard, blocks):
+    """Write then read ``blocks`` blocks one at a time and eight at a time, printing the
+    simulated throughput and the operations of each pass."""
+    passes = (
+        ("single block writes", True, 1),
+        ("8 block writes", True, 8),
+        ("single block reads", False, 1),
+        ("8 block reads", False, 8),
+    )
+    pattern = bytes(range(256)) * 2
+    for name, writing, per_call in passes:
+        card.stats.clear()
+        start_time = card.now
+        start_bytes = spi.bytes_clocked
+        buf = bytearray(pattern * per_call)
+        for block in range(0, blocks - blocks % per_call, per_call):
+            if writing:
+                result = sdcard.writeblocks(block, buf)
+            else:
+                result = sdcard.readblocks(block, buf)
+            if result != 0:
+                raise OSError("%s failed at block %d" % (name, block))
+        if writing and hasattr(sdcard, "flush"):
+            sdcard.flush()
+        elapsed = card.now - start_time
+        print("%s: %d bytes clocked, %.1f ms simulated, %.1f KiB/s" % (
+            name, spi.bytes_clocked - start_bytes, elapsed * 1000,
+            blocks * BLOCK_SIZE / 1024 / elapsed if elapsed else 0))
+        print(card.stats.report())
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark adafruit_sdcard against an emulated SD card.")
+    parser.add_argument("image", type=str, help="Path to the card image file.")
+    parser.add_argument("--create", type=int, metavar="BLOCKS", help="Create a zero filled image of this many 512-byte blocks first.")
+    parser.add_argument("--standard-capacity", action="store_true", help="Emulate a byte addressed SDSC card instead of SDHC.")
+    parser.add_argument("--baudrate", type=int, default=None, help="Highest SPI clock for the driver, in Hz.")
+    parser.add_argument("--blocks", type=int, default=64, help="Number of blocks written and read per pass.")
+    parser.add_argument("--program-time", type=float, default=500e-6, help="Card busy time per written block, in seconds.")
+    parser.add_argument("--read-latency", type=float, default=100e-6, help="Time to the data token of a read, in seconds.")
+    parser.add_argument("--call-overhead", type=float, default=20e-6, help="Time per SPI write or read call on the microcontroller, in seconds.")
+
+    args = parser.parse_args()
+
+    if args.create:
+        create_image(args.image, args.create)
+    emulated_card = EmulatedSDCard(args.image, high_capacity=not args.standard_capacity,
+                                   read_latency=args.read_latency, program_time=args.program_time)
+    emulated_spi = EmulatedSPI(emulated_card, call_overhead=args.call_overhead)
+    sdcard_driver = load_sdcard_driver()
+    driver = sdcard_driver.SDCard(emulated_spi, EmulatedChipSelect(emulated_card), baudrate=args.baudrate)
+    print("card: %d blocks, driver clock %d Hz, setup took %.1f ms simulated" % (
+        driver.count(), driver.baudrate, emulated_card.now * 1000))
+    print(emulated_card.stats.report())
+    print()
+    benchmark(emulated_card, emulated_spi, driver, args.blocks)
+    emulated_card.close()
@@ -0,0 +1,171 @@
+"""
+Register-level stand-in for a BME680 or BME688 on an I2C bus, to test adafruit_bme680
+on a computer. The model keeps every register in ``mem``, records the register writes
+in ``writes``, and produces data fields for forced, sequential and parallel mode
+conversions from the heater set-points the driver wrote.
+"""
+
+import struct
+
+# Calibration coefficients from a real BME680, as the 0x8A-0xA1 and 0xE1-0xEE registers
+CALIBRATION = struct.pack(
+    "<hbBHhbBhhbbHhhBBBHbbbBbHhbb",
+    26264, 3, 0, 36385, -10497, 88, 0, 7262, -108, 25, 30, 0, -2755, -2590, 30, 0,
+    0x3F, 0x3053, 0, 45, 20, 120, -100, 25958, -12000, -30, 18,
+)
+
+# Pressure, temperature and humidity ADC words of every conversion
+ADC_PRES = 415148
+ADC_TEMP = 512000
+ADC_HUM = 22000
+GAS_RANGE = 4
+
+REG_MEAS_STATUS = 0x1D
+REG_RES_HEAT_0 = 0x5A
+REG_GAS_WAIT_0 = 0x64
+REG_SHD_HEATR_DUR = 0x6E
+REG_CTRL_GAS_1 = 0x71
+REG_CTRL_MEAS = 0x74
+FIELD_LENGTH = 17
+
+
+def gas_adc(step):
+    """The gas ADC word the model measures with heater set-point ``step``."""
+    return 300 + 50 * step
+
+
+class BME680Model:
+    """The registers of a BME680, or of a BME688 when ``variant`` is 1.
+
+    ``start_step`` is the heater step profile sweeps start at, to check the driver
+    orders readings by their gas index rather than by arrival.
+    """
+
+    def __init__(self, variant=1, start_step=0):
+        self.mem = bytearray(256)
+        self.mem[0xD0] = 0x61
+        self.mem[0xF0] = variant
+        self.mem[0x8A:0xA2] = CALIBRATION[:24]
+        self.mem[0xE1:0xEF] = CALIBRATION[24:]
+        self.mem[0x00] = 0x30
+        self.mem[0x02] = 0x16
+        self.mem[0x04] = 0x10
+        self.variant = variant
+        self.start_step = start_step
+        self.writes = []
+        self.forced_set_points = []
+        # The registers as a sequential or parallel sweep started
+        self.sweep_registers = None
+        self._outputs = None
+        self._meas_index = 0
+
+    def writes_to(self, register):
+        """The values written to ``register``, in order."""
+        return [value for reg, value in self.writes if reg == register]
+
+    def write(self, register, value):
+        self.writes.append((register, value))
+        self.mem[register] = value
+        if register == REG_CTRL_MEAS:
+            mode = value & 0x03
+            if mode == 1:
+                self._forced_conversion()
+            elif mode in (2, 3):
+                self.sweep_registers = bytes(self.mem)
+                self._outputs = self._profile_outputs(mode)
+            else:
+                self._outputs = None
+
+    def read(self, register):
+        if register == REG_MEAS_STATUS and self._outputs is not None:
+            for field in range(3):
+                step, valid = next(self._outputs)
+                self._fill_field(field, step, valid)
+        return self.mem[register]
+
+    def _set_point_ready(self, step):
+        """True if heater set-point ``step`` was configured and gas measurement enabled"""
+        return (
+            self.mem[REG_CTRL_GAS_1] & 0x30 != 0
+            and self.mem[REG_RES_HEAT_0 + step] != 0
+            and self.mem[REG_GAS_WAIT_0 + step] != 0
+        )
+
+    def _forced_conversion(self):
+        # Forced mode heats with the set-point selected by nb_conv
+        step = self.mem[REG_CTRL_GAS_1] & 0x0F
+        self.forced_set_points.append(step)
+        self._fill_field(0, step, self._set_point_ready(step))
+        self.mem[REG_CTRL_MEAS] &= 0xFC
+
+    def _profile_outputs(self, mode):
+        """The gas index and gas validity of each data field of a sweep, forever"""
+        nb_conv = self.mem[REG_CTRL_GAS_1] & 0x0F
+        step = self.start_step % max(nb_conv, 1)
+        while True:
+            if mode == 3:
+                # Sequential: one conversion per step
+                yield step, self._set_point_ready(step)
+            else:
+                # Parallel: the step is held for its gas wait in TPHG cycles, and only
+                # the last cycle has valid gas
+                cycles = max(self.mem[REG_GAS_WAIT_0 + step], 1)
+                for cycle in range(cycles):
+                    yield step, cycle == cycles - 1 and self._set_point_ready(step)
+            step = (step + 1) % max(nb_conv, 1)
+
+    def _fill_field(self, field, step, gas_valid):
+        m = self.mem
+        o = REG_MEAS_STATUS + FIELD_LENGTH * field
+        m[o] = 0x80 | step
+        m[o + 1] = self._meas_index & 0xFF
+        self._meas_index += 1
+        m[o + 2] = (ADC_PRES >> 12) & 0xFF
+        m[o + 3] = (ADC_PRES >> 4) & 0xFF
+        m[o + 4] = (ADC_PRES << 4) & 0xF0
+        m[o + 5] = (ADC_TEMP >> 12) & 0xFF
+        m[o + 6] = (ADC_TEMP >> 4) & 0xFF
+        m[o + 7] = (ADC_TEMP << 4) & 0xF0
+        m[o + 8] = ADC_HUM >> 8
+        m[o + 9] = ADC_HUM & 0xFF
+        gas = gas_adc(step)
+        # The BME688 has its gas words at 0x2C, the BME680 at 0x2A
+        g = o + (15 if self.variant else 13)
+        m[g] = gas >> 2
+        m[g + 1] = ((gas & 0x03) << 6) | GAS_RANGE | (0x30 if gas_valid else 0)
+
+
+class FakeI2C:
+    """A busio.I2C with ``model`` at every address."""
+
+    def __init__(self, model):
+        self.model = model
+        self._pointer = 0
+        self._locked = False
+
+    def try_lock(self):
+        if self._locked:
+            return False
+        self._locked = True
+        return True
+
+    def unlock(self):
+        self._locked = False
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        data = bytes(buffer[start:end])
+        if len(data) == 1:
+            self._pointer = data[0]
+        # The BME680 takes register and value pairs
+        for i in range(0, len(data) - 1, 2):
+            self.model.write(data[i], data[i + 1])
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        for i in range(start, len(buffer) if end is None else end):
+            buffer[i] = self.model.read(self._pointer)
+            self._pointer += 1
+
+    def writeto_then_readfrom(self, address, out_buffer, in_buffer, *, out_start=0,
+                              out_end=None, in_start=0, in_end=None):
+        self._pointer = out_buffer[out_start]
+        self.readfrom_into(address, in_buffer, start=in_start, end=in_end)
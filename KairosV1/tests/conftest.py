@@ -0,0 +1,35 @@
+"""
+Host stand-ins for the CircuitPython modules that the libraries in CIRCUITPYTHON_CLONE/lib
+import, so they can be tested with pytest on a computer. Modules that are installed,
+such as those of Adafruit Blinka, are used instead.
+"""
+
+import os
+import sys
+import types
+import typing
+
+HOST_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIB_PATH = os.path.join(HOST_PATH, "CIRCUITPYTHON_CLONE", "lib")
+
+for path in (LIB_PATH, HOST_PATH):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def _provide(name, **attributes):
+    """Register module ``name`` with ``attributes`` unless it can be imported."""
+    try:
+        __import__(name)
+    except ImportError:
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+
+_buffer = typing.Union[bytes, bytearray, memoryview]
+_provide("micropython", const=lambda value: value)
+_provide("busio", I2C=object, SPI=object)
+_provide("digitalio", DigitalInOut=object)
+_provide("circuitpython_typing", ReadableBuffer=_buffer, WriteableBuffer=_buffer)
+_provide("circuitpython_typing.device_drivers", I2CDeviceDriver=object)
@@ -0,0 +1,170 @@
+"""The fixed-point integer compensation against the float compensation, and the integer
+gas algorithms against the Bosch BME68x API."""
+
+import itertools
+
+import pytest
+
+import adafruit_bme680
+from bme680_model import BME680Model, FakeI2C
+
+# ADC temperature, pressure, humidity and gas words and gas range, spanning about 8 to
+# 45 C, 800 to 980 hPa and 15 to 95 %RH with the model's calibration
+RAW_WORDS = [
+    (adc_temp, adc_pres, adc_hum, adc_gas, gas_range)
+    for (adc_temp, adc_pres, adc_hum), (adc_gas, gas_range) in zip(
+        itertools.product(
+            (440000, 480000, 520000, 560000),
+            (380000, 415000, 450000),
+            (16000, 22000, 28000),
+        ),
+        itertools.cycle([(662, 4), (283, 10), (777, 13), (186, 5), (927, 11)]),
+    )
+]
+
+# lookup_table1 and lookup_table2 of calc_gas_resistance_low in the Bosch BME68x API
+BOSCH_TABLE_1 = (
+    2147483647, 2147483647, 2147483647, 2147483647, 2147483647, 2126008810, 2147483647,
+    2130303777, 2147483647, 2147483647, 2143188679, 2136746228, 2147483647, 2126008810,
+    2147483647, 2147483647,
+)
+BOSCH_TABLE_2 = (
+    4096000000, 2048000000, 1024000000, 512000000, 255744255, 127110228, 64000000,
+    32258064, 16016016, 8000000, 4000000, 2000000, 1000000, 500000, 250000, 125000,
+)
+
+
+def bosch_gas_low(adc_gas, gas_range, range_sw_err):
+    """calc_gas_resistance_low of the Bosch BME68x API, for the BME680, in 64 bits"""
+    var1 = ((1340 + (5 * range_sw_err)) * BOSCH_TABLE_1[gas_range]) >> 16
+    var2 = ((adc_gas << 15) - 16777216) + var1
+    var3 = (BOSCH_TABLE_2[gas_range] * var1) >> 9
+    return (var3 + (var2 >> 1)) // var2
+
+
+def bosch_gas_high(adc_gas, gas_range):
+    """calc_gas_resistance_high of the Bosch BME68x API, for the BME688"""
+    var1 = 262144 >> gas_range
+    var2 = 4096 + (adc_gas - 512) * 3
+    return (10000 * var1) // var2 * 100
+
+
+def make_sensor(integer_compensation, variant=1):
+    return adafruit_bme680.Adafruit_BME680_I2C(
+        FakeI2C(BME680Model(variant)), integer_compensation=integer_compensation
+    )
+
+
+def compensate(sensor, words):
+    adc_temp, adc_pres, adc_hum, adc_gas, gas_range = words
+    field = bytearray(10)
+    field[2:5] = (adc_pres << 4).to_bytes(3, "big")
+    field[5:8] = (adc_temp << 4).to_bytes(3, "big")
+    field[8:10] = adc_hum.to_bytes(2, "big")
+    sensor._parse_tph(field)
+    sensor._adc_gas = adc_gas
+    sensor._gas_range = gas_range
+    return sensor._compensated_reading(0.0)
+
+
+def integer_gas(sensor, adc_gas, gas_range):
+    sensor._adc_gas = adc_gas
+    sensor._gas_range = gas_range
+    return sensor._calc_gas_int()
+
+
+def test_h1_keeps_its_low_nibble():
+    sensor = make_sensor(True)
+    assert sensor._humidity_calibration_int[0] == sensor._humidity_calibration[0] * 16
+    assert sensor._humidity_calibration_int[0] % 16 != 0
+
+
+def test_saved_calibration_checked_against_sensor():
+    saved = make_sensor(False).calibration
+    assert saved["crc"] == adafruit_bme680._crc8(BME680Model().mem[0xE1:0xF1])
+
+    # The same sensor uses the saved calibration instead of reading it
+    marked = dict(saved, sw_err=7.0)
+    sensor = adafruit_bme680.Adafruit_BME680_I2C(FakeI2C(BME680Model()), calibration=marked)
+    assert sensor.calibration == marked
+
+    # Another sensor of the same variant reads its own
+    other = BME680Model()
+    other.mem[0xE5] ^= 0x10
+    sensor = adafruit_bme680.Adafruit_BME680_I2C(FakeI2C(other), calibration=marked)
+    assert sensor.calibration["crc"] != saved["crc"]
+    assert sensor.calibration["sw_err"] == saved["sw_err"]
+    assert sensor.calibration["humidity"] != saved["humidity"]
+
+    # A calibration saved without a CRC is read again
+    del marked["crc"]
+    sensor = adafruit_bme680.Adafruit_BME680_I2C(FakeI2C(BME680Model()), calibration=marked)
+    assert sensor.calibration == saved
+
+
+def test_integer_readings_are_scaled_ints():
+    sensor = make_sensor(True)
+    reading = compensate(sensor, RAW_WORDS[0])
+    for value in (reading.temperature, reading.gas, reading.relative_humidity):
+        assert isinstance(value, int)
+    assert isinstance(reading.pressure, int)
+    assert reading.altitude is None
+
+    converted = sensor.float_reading(reading)
+    assert converted.temperature == reading.temperature / 100
+    assert converted.relative_humidity == reading.relative_humidity / 1000
+    assert converted.pressure == reading.pressure / 100
+    assert converted.altitude == sensor._altitude(converted.pressure)
+
+    float_sensor = make_sensor(False)
+    reading = compensate(float_sensor, RAW_WORDS[0])
+    assert float_sensor.float_reading(reading) is reading
+
+
+@pytest.mark.parametrize("variant", [0, 1])
+def test_integer_matches_float(variant):
+    fixed_sensor = make_sensor(True, variant)
+    float_sensor = make_sensor(False, variant)
+    for words in RAW_WORDS:
+        fixed = fixed_sensor.float_reading(compensate(fixed_sensor, words))
+        floating = compensate(float_sensor, words)
+        # The integer path truncates, so it never reads above the float path
+        assert floating.temperature - 0.015 <= fixed.temperature <= floating.temperature
+        assert fixed.pressure == pytest.approx(floating.pressure, abs=0.05)
+        assert (
+            floating.relative_humidity - 0.06
+            <= fixed.relative_humidity
+            <= floating.relative_humidity
+        )
+        assert fixed.altitude == pytest.approx(floating.altitude, abs=0.5)
+        if variant:
+            # Bosch truncates to 100 ohm steps on the BME688
+            assert floating.gas - 100 < fixed.gas <= floating.gas
+        else:
+            assert fixed.gas == pytest.approx(floating.gas, rel=1e-4)
+
+
+def test_bosch_gas_vectors():
+    bme680 = make_sensor(True, variant=0)
+    bme688 = make_sensor(True, variant=1)
+    assert bme680._sw_err_int == 1
+    assert integer_gas(bme680, 512, 4) == bosch_gas_low(512, 4, 1) == 499500
+    assert integer_gas(bme680, 300, 7) == bosch_gas_low(300, 7, 1) == 74906
+    assert integer_gas(bme688, 512, 4) == bosch_gas_high(512, 4) == 4000000
+    assert integer_gas(bme688, 300, 7) == bosch_gas_high(300, 7) == 591900
+
+
+@pytest.mark.parametrize("range_sw_err", [0, 1, 7, 15])
+def test_bme680_gas_matches_bosch(range_sw_err):
+    sensor = make_sensor(True, variant=0)
+    sensor._sw_err_int = range_sw_err
+    for gas_range, adc_gas in itertools.product(range(16), range(0, 1024, 11)):
+        assert integer_gas(sensor, adc_gas, gas_range) == bosch_gas_low(
+            adc_gas, gas_range, range_sw_err
+        )
+
+
+def test_bme688_gas_matches_bosch():
+    sensor = make_sensor(True, variant=1)
+    for gas_range, adc_gas in itertools.product(range(16), range(1024)):
+        assert integer_gas(sensor, adc_gas, gas_range) == bosch_gas_high(adc_gas, gas_range)
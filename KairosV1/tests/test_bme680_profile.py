@@ -0,0 +1,112 @@
+"""BME688 heater profile sweeps against the register-level model."""
+
+import pytest
+
+import adafruit_bme680
+from bme680_model import (
+    GAS_RANGE,
+    REG_CTRL_GAS_1,
+    REG_CTRL_MEAS,
+    REG_GAS_WAIT_0,
+    REG_RES_HEAT_0,
+    REG_SHD_HEATR_DUR,
+    BME680Model,
+    FakeI2C,
+    gas_adc,
+)
+
+TEMPS = [200, 280, 360]
+
+
+def make_sensor(variant=1, start_step=0):
+    model = BME680Model(variant, start_step)
+    sensor = adafruit_bme680.Adafruit_BME680_I2C(FakeI2C(model))
+    return sensor, model
+
+
+def expected_gas(sensor, step):
+    """The gas resistance the driver computes from the model's ADC word for ``step``"""
+    sensor._adc_gas = gas_adc(step)
+    sensor._gas_range = GAS_RANGE
+    return sensor._compensate_gas()
+
+
+def check_forced_mode_restored(sensor, model, duration):
+    """After a sweep, forced mode is back on set-point 0 with the set_gas_heater heater"""
+    assert model.mem[REG_CTRL_MEAS] & 0x03 == 0
+    assert model.mem[REG_CTRL_GAS_1] & 0x0F == 0
+    assert model.mem[REG_RES_HEAT_0] == sensor._calc_res_heat(320)
+    assert model.mem[REG_GAS_WAIT_0] == sensor._calc_gas_wait(150)
+    assert sensor.measurement_duration == duration
+    reading = sensor.read_all()
+    assert model.forced_set_points[-1] == 0
+    assert reading.gas_age == 0
+    assert reading.gas == expected_gas(sensor, 0)
+
+
+@pytest.mark.parametrize("start_step", [0, 2])
+def test_sequential_profile(start_step):
+    sensor, model = make_sensor(start_step=start_step)
+    duration = sensor.measurement_duration
+    assert sensor.set_heater_profile(TEMPS, [100, 60, 40])
+
+    readings = sensor.read_profile()
+
+    registers = model.sweep_registers
+    assert registers[REG_CTRL_MEAS] & 0x03 == 3
+    assert registers[REG_CTRL_GAS_1] == 0x20 | len(TEMPS)
+    assert list(registers[REG_RES_HEAT_0 : REG_RES_HEAT_0 + 3]) == [
+        sensor._calc_res_heat(t) for t in TEMPS
+    ]
+    assert list(registers[REG_GAS_WAIT_0 : REG_GAS_WAIT_0 + 3]) == [
+        sensor._calc_gas_wait(t) for t in (100, 60, 40)
+    ]
+    assert [r.gas for r in readings] == [expected_gas(sensor, s) for s in range(3)]
+    check_forced_mode_restored(sensor, model, duration)
+
+
+def test_parallel_profile():
+    sensor, model = make_sensor(start_step=1)
+    duration = sensor.measurement_duration
+    assert sensor.set_heater_profile(TEMPS, [3, 2, 4], shared_heater_time=50)
+
+    readings = sensor.read_profile()
+
+    registers = model.sweep_registers
+    assert registers[REG_CTRL_MEAS] & 0x03 == 2
+    assert registers[REG_CTRL_GAS_1] == 0x20 | len(TEMPS)
+    assert list(registers[REG_GAS_WAIT_0 : REG_GAS_WAIT_0 + 3]) == [3, 2, 4]
+    assert registers[REG_SHD_HEATR_DUR] == sensor._calc_heatr_dur_shared(50)
+    assert [r.gas for r in readings] == [expected_gas(sensor, s) for s in range(3)]
+    # The cycle counts are not heater milliseconds for forced mode
+    check_forced_mode_restored(sensor, model, duration)
+
+
+def test_profile_rewritten_after_forced_reading():
+    sensor, model = make_sensor()
+    sensor.set_heater_profile(TEMPS, [100, 60, 40])
+    sensor.read_profile()
+    sensor.read_all()
+    readings = sensor.read_profile()
+    assert model.sweep_registers[REG_RES_HEAT_0] == sensor._calc_res_heat(TEMPS[0])
+    assert [r.gas for r in readings] == [expected_gas(sensor, s) for s in range(3)]
+
+
+def test_disabled_gas_restored_after_profile():
+    sensor, model = make_sensor()
+    sensor.set_gas_heater(None, None)
+    sensor.set_heater_profile(TEMPS, [100, 60, 40])
+    sensor.read_profile()
+    assert model.mem[REG_CTRL_GAS_1] & 0x30 == 0
+    assert sensor.measurement_duration == sensor._tph_duration()
+
+
+def test_profile_needs_bme688():
+    sensor, _ = make_sensor(variant=0)
+    with pytest.raises(RuntimeError):
+        sensor.set_heater_profile(TEMPS, [100, 60, 40])
+    sensor, _ = make_sensor()
+    with pytest.raises(RuntimeError):
+        sensor.read_profile()
+    with pytest.raises(RuntimeError):
+        sensor.set_heater_profile(TEMPS, [100, 60])
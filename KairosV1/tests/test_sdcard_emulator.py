@@ -0,0 +1,338 @@
+"""adafruit_sdcard and block_cache against the SD card emulator."""
+
+import random
+
+import pytest
+
+import adafruit_sdcard
+import block_cache
+from sd_card_emulator import (
+    BLOCK_SIZE,
+    R1_ILLEGAL_COMMAND,
+    EmulatedChipSelect,
+    EmulatedSDCard,
+    EmulatedSPI,
+    create_image,
+)
+
+# SDHC cards count their capacity in units of 1024 blocks
+BLOCKS = 2048
+
+
+@pytest.fixture
+def card(tmp_path):
+    """An emulated SDHC card on a fresh image."""
+    path = tmp_path / "card.img"
+    create_image(path, BLOCKS)
+    emulated = EmulatedSDCard(path)
+    yield emulated
+    emulated.close()
+
+
+def mount(card, **kwargs):
+    return adafruit_sdcard.SDCard(EmulatedSPI(card), EmulatedChipSelect(card), **kwargs)
+
+
+def pattern(block, nblocks=1):
+    """Data that differs in every block, so misplaced blocks are caught."""
+    return bytes((block * 7 + i) & 0xFF for i in range(nblocks * BLOCK_SIZE))
+
+
+def image(card, block, nblocks=1):
+    card.image.flush()
+    card.image.seek(block * BLOCK_SIZE)
+    return card.image.read(nblocks * BLOCK_SIZE)
+
+
+@pytest.mark.parametrize("high_capacity", [True, False])
+def test_single_and_multiple_blocks(tmp_path, high_capacity):
+    path = tmp_path / "card.img"
+    create_image(path, BLOCKS)
+    card = EmulatedSDCard(path, high_capacity=high_capacity)
+    try:
+        sdcard = mount(card)
+        assert sdcard.count() == BLOCKS
+
+        assert sdcard.writeblocks(5, pattern(5)) == 0
+        assert sdcard.writeblocks(10, pattern(10, 8)) == 0
+        assert image(card, 5) == pattern(5)
+        assert image(card, 10, 8) == pattern(10, 8)
+        assert image(card, 6, 4) == bytes(4 * BLOCK_SIZE)
+        assert card.log.count("CMD24") == 1
+        assert card.log.count("CMD25") == 1
+
+        buf = bytearray(BLOCK_SIZE)
+        assert sdcard.readblocks(5, buf) == 0
+        assert buf == pattern(5)
+        buf = bytearray(8 * BLOCK_SIZE)
+        assert sdcard.readblocks(10, buf) == 0
+        assert buf == pattern(10, 8)
+    finally:
+        card.close()
+
+
+def test_read_crc_errors_retried(card):
+    sdcard = mount(card, crc=True)
+    assert card.crc_enabled
+    sdcard.writeblocks(20, pattern(20, 4))
+    baudrate = sdcard.baudrate
+
+    card.corrupt_reads = 1
+    buf = bytearray(BLOCK_SIZE)
+    assert sdcard.readblocks(20, buf) == 0
+    assert buf == pattern(20)
+
+    card.corrupt_reads = 1
+    buf = bytearray(4 * BLOCK_SIZE)
+    assert sdcard.readblocks(20, buf) == 0
+    assert buf == pattern(20, 4)
+
+    assert sdcard.crc_errors == 2
+    assert sdcard.transfer_errors == 2
+    assert sdcard.transfers_retried == 2
+    assert sdcard.baudrate == baudrate
+
+
+def test_write_crc_errors_retried(card):
+    sdcard = mount(card, crc=True)
+    baudrate = sdcard.baudrate
+
+    card.corrupt_writes = 1
+    assert sdcard.writeblocks(30, pattern(30)) == 0
+    card.corrupt_writes = 1
+    assert sdcard.writeblocks(40, pattern(40, 4)) == 0
+
+    assert image(card, 30) == pattern(30)
+    assert image(card, 40, 4) == pattern(40, 4)
+    assert sdcard.crc_errors == 2
+    assert sdcard.transfers_retried == 2
+    assert sdcard.baudrate == baudrate
+
+
+def test_data_rate_halved_after_retries(card):
+    sdcard = mount(card, crc=True, retries=2)
+    sdcard.writeblocks(50, pattern(50))
+    baudrate = sdcard.baudrate
+
+    card.corrupt_reads = 3
+    buf = bytearray(BLOCK_SIZE)
+    assert sdcard.readblocks(50, buf) == 0
+    assert buf == pattern(50)
+    assert sdcard.transfer_errors == 3
+    assert sdcard.transfers_retried == 2
+    assert sdcard.baudrate == baudrate // 2
+
+
+def test_corruption_unseen_without_crc(card):
+    sdcard = mount(card)
+    assert not card.crc_enabled
+    sdcard.writeblocks(60, pattern(60))
+    card.corrupt_reads = 1
+    buf = bytearray(BLOCK_SIZE)
+    assert sdcard.readblocks(60, buf) == 0
+    assert buf != pattern(60)
+    assert sdcard.crc_errors == 0
+
+
+class RejectingCard(EmulatedSDCard):
+    """A card that answers ``rejected`` commands with an illegal command R1."""
+
+    rejected = ()
+
+    def _command(self, frame):
+        name = ("ACMD%d" if self.app_command else "CMD%d") % (frame[0] & 0x3F)
+        if self.spi_mode and not self.idle and name in self.rejected:
+            self.app_command = False
+            self._respond(0xFF, R1_ILLEGAL_COMMAND)
+            return
+        super()._command(frame)
+
+
+@pytest.mark.parametrize("rejected", ["CMD55", "ACMD23"])
+def test_pre_erase_hint_rejected(tmp_path, rejected):
+    path = tmp_path / "card.img"
+    create_image(path, BLOCKS)
+    card = RejectingCard(path)
+    card.rejected = (rejected,)
+    try:
+        sdcard = mount(card)
+        card.log.clear()
+        assert sdcard.writeblocks(140, pattern(140, 4)) == 0
+        assert image(card, 140, 4) == pattern(140, 4)
+        assert card.log.count("CMD25") == 1
+        # No CMD23 without the CMD55 that makes it ACMD23
+        assert "CMD23" not in card.log
+        assert sdcard.transfer_errors == 0
+    finally:
+        card.close()
+
+
+def test_card_info_resume(card):
+    first = mount(card, crc=True)
+    first.writeblocks(70, pattern(70))
+    card_info = first.card_info
+
+    # A card that stayed powered is resumed without setup
+    card.log.clear()
+    resumed = mount(card, card_info=card_info, crc=True)
+    assert "CMD0" not in card.log
+    assert "CMD9" not in card.log
+    assert "CMD59" in card.log
+    assert resumed.count() == first.count()
+    assert resumed.baudrate == first.baudrate
+    buf = bytearray(BLOCK_SIZE)
+    assert resumed.readblocks(70, buf) == 0
+    assert buf == pattern(70)
+
+    # card_info saved before the clock rate was kept reads it from the CSD
+    card.log.clear()
+    older = dict(card_info)
+    del older["max_baudrate"]
+    assert mount(card, card_info=older).baudrate == first.baudrate
+    assert "CMD0" not in card.log
+    assert "CMD9" in card.log
+
+    # Another card, or one that lost power, is set up again
+    other = dict(card_info, cid=[card_info["cid"][0] ^ 1] + card_info["cid"][1:])
+    card.log.clear()
+    mount(card, card_info=other)
+    assert "CMD0" in card.log
+
+    card.power_cycle()
+    card.log.clear()
+    setup = mount(card, card_info=card_info)
+    assert "CMD0" in card.log
+    assert setup.readblocks(70, buf) == 0
+    assert buf == pattern(70)
+
+
+def test_defer_busy(card):
+    sdcard = mount(card, defer_busy=True)
+    assert sdcard.writeblocks(80, pattern(80)) == 0
+    assert card.now < card.busy_until
+    polls = 1
+    while not sdcard.poll_ready():
+        polls += 1
+    assert polls > 1
+    assert card.now >= card.busy_until
+
+    # The next access waits for a write still programming
+    assert sdcard.writeblocks(81, pattern(81, 2)) == 0
+    assert card.now < card.busy_until
+    buf = bytearray(3 * BLOCK_SIZE)
+    assert sdcard.readblocks(80, buf) == 0
+    assert buf == pattern(80) + pattern(81, 2)
+
+
+def test_coalesce_blocks(card):
+    sdcard = mount(card, coalesce_blocks=4, coalesce_time=60)
+    card.log.clear()
+    for block in range(90, 93):
+        assert sdcard.writeblocks(block, pattern(block)) == 0
+    assert "CMD24" not in card.log and "CMD25" not in card.log
+    assert image(card, 90, 3) == bytes(3 * BLOCK_SIZE)
+
+    # Reading a held back block writes the run first
+    buf = bytearray(BLOCK_SIZE)
+    assert sdcard.readblocks(91, buf) == 0
+    assert buf == pattern(91)
+    assert card.log.count("CMD25") == 1
+    assert image(card, 90, 3) == pattern(90) + pattern(91) + pattern(92)
+
+    # A full run is written as soon as it is complete, overwrites merge into it
+    card.log.clear()
+    assert sdcard.writeblocks(100, pattern(0)) == 0
+    for block in (101, 100, 102, 103):
+        assert sdcard.writeblocks(block, pattern(block)) == 0
+    assert card.log.count("CMD25") == 1
+    assert "CMD24" not in card.log
+    assert image(card, 100, 4) == pattern(100) + pattern(101) + pattern(102) + pattern(103)
+
+    # A write elsewhere writes the run held back, and flush the rest
+    card.log.clear()
+    sdcard.writeblocks(110, pattern(110))
+    sdcard.writeblocks(120, pattern(120))
+    assert card.log.count("CMD24") == 1
+    assert image(card, 110) == pattern(110)
+    assert sdcard.flush() == 0
+    assert card.log.count("CMD24") == 2
+    assert image(card, 120) == pattern(120)
+
+
+def test_sync_writes_held_back_blocks(card):
+    sdcard = mount(card, coalesce_blocks=4, coalesce_time=60)
+    sdcard.writeblocks(125, pattern(125))
+    assert image(card, 125) == bytes(BLOCK_SIZE)
+    sdcard.sync()
+    assert image(card, 125) == pattern(125)
+
+
+def test_failed_flush_keeps_blocks(card):
+    sdcard = mount(card, crc=True, retries=0, coalesce_blocks=4, coalesce_time=60)
+    sdcard.writeblocks(130, pattern(130))
+    sdcard.writeblocks(131, pattern(131))
+
+    # Every attempt fails, down to the setup data rate
+    card.corrupt_writes = 1000
+    assert sdcard.flush() == 1
+    assert image(card, 130, 2) == bytes(2 * BLOCK_SIZE)
+
+    card.corrupt_writes = 0
+    assert sdcard.flush() == 0
+    assert image(card, 130, 2) == pattern(130) + pattern(131)
+
+
+def test_block_cache_write_back_time(card, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(block_cache.time, "monotonic", lambda: now[0])
+    cache = block_cache.BlockCache(mount(card), blocks=2, write_back_time=2)
+    buf = bytearray(BLOCK_SIZE)
+    assert cache.writeblocks(0, pattern(0)) == 0
+
+    # Evicting the only dirty block writes it, and stops the write back timer
+    assert cache.readblocks(1, buf) == 0
+    assert cache.readblocks(2, buf) == 0
+    assert cache.writebacks == 1
+    assert image(card, 0) == pattern(0)
+
+    # so a later write waits write_back_time from its own time
+    now[0] = 1.5
+    assert cache.writeblocks(3, pattern(3)) == 0
+    now[0] = 2.5
+    assert cache.readblocks(3, buf) == 0
+    assert cache.writebacks == 1
+    now[0] = 3.5
+    assert cache.readblocks(3, buf) == 0
+    assert cache.writebacks == 2
+    assert image(card, 3) == pattern(3)
+
+
+def test_block_cache_random_trace(card):
+    """Random reads and writes through a BlockCache, with CRC errors injected on the
+    bus, read back what was written and leave it on the card after sync."""
+    sdcard = mount(card, crc=True, defer_busy=True, coalesce_blocks=4)
+    cache = block_cache.BlockCache(sdcard, blocks=8)
+    rng = random.Random(156)
+    span = 48
+    reference = bytearray(image(card, 0, span))
+    for step in range(400):
+        if rng.random() < 0.1:
+            card.corrupt_reads = 1
+        if rng.random() < 0.1:
+            card.corrupt_writes = 1
+        nblocks = rng.choice((1, 1, 1, 2, 3, 6))
+        block = rng.randrange(span - nblocks + 1)
+        window = slice(block * BLOCK_SIZE, (block + nblocks) * BLOCK_SIZE)
+        if rng.random() < 0.5:
+            data = bytes(rng.getrandbits(8) for _ in range(nblocks * BLOCK_SIZE))
+            assert cache.writeblocks(block, data) == 0, step
+            reference[window] = data
+        else:
+            buf = bytearray(nblocks * BLOCK_SIZE)
+            assert cache.readblocks(block, buf) == 0, step
+            assert buf == reference[window], step
+    cache.sync()
+
+    assert image(card, 0, span) == reference
+    assert sdcard.crc_errors > 0
+    assert sdcard.transfer_errors == sdcard.transfers_retried